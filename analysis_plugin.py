@@ -27,6 +27,7 @@
 
 from PyQt4 import QtCore, QtGui
 from analysis_widget import AnalysisWidget
+import pools
 
 class ImageAnalysis(object):
 
@@ -34,6 +35,8 @@ class ImageAnalysis(object):
         # Save reference to the QGIS interface
         self.iface = iface
         self.canvas = iface.mapCanvas()
+        # kernels run in the task threads, never in process pools of QGIS
+        pools.disable()
 
     def initGui(self):
         self.analysiswidget = AnalysisWidget(self.iface)
@@ -48,9 +51,22 @@ class ImageAnalysis(object):
         self.iface.addDockWidget(QtCore.Qt.LeftDockWidgetArea,
                                  self.andockwidget)
 
+        # the steps as Processing algorithms, if the plugin is available
+        try:
+            from processing.core.Processing import Processing
+            from provider import AnalysisProvider
+        except ImportError:
+            self.provider = None
+        else:
+            self.provider = AnalysisProvider()
+            Processing.addProvider(self.provider, True)
+
     def unload(self):
         self.andockwidget.close()
         self.iface.removeDockWidget(self.andockwidget)
+        if self.provider is not None:
+            from processing.core.Processing import Processing
+            Processing.removeProvider(self.provider)
 
 
 if __name__ == '__main__':
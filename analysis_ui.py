@@ -41,11 +41,18 @@ class Ui_AnalysisWidget(object):
         self.tabWidget.setObjectName(_fromUtf8("tabWidget"))
         self.tab_segm = QtGui.QWidget()
         self.tab_segm.setObjectName(_fromUtf8("tab_segm"))
-        self.layoutWidget = QtGui.QWidget(self.tab_segm)
-        self.layoutWidget.setGeometry(QtCore.QRect(10, 10, 291, 71))
+        self.tabWidgetSegm = QtGui.QTabWidget(self.tab_segm)
+        self.tabWidgetSegm.setGeometry(QtCore.QRect(5, 0, 300, 125))
+        self.tabWidgetSegm.setTabPosition(QtGui.QTabWidget.South)
+        self.tabWidgetSegm.setObjectName(_fromUtf8("tabWidgetSegm"))
+        self.tab_segm_ipt = QtGui.QWidget()
+        self.tab_segm_ipt.setObjectName(_fromUtf8("tab_segm_ipt"))
+        self.layoutWidget = QtGui.QWidget(self.tab_segm_ipt)
+        self.layoutWidget.setGeometry(QtCore.QRect(5, 5, 285, 96))
         self.layoutWidget.setObjectName(_fromUtf8("layoutWidget"))
         self.gridLayout_3 = QtGui.QGridLayout(self.layoutWidget)
         self.gridLayout_3.setMargin(0)
+        self.gridLayout_3.setVerticalSpacing(0)
         self.gridLayout_3.setObjectName(_fromUtf8("gridLayout_3"))
         self.label = QtGui.QLabel(self.layoutWidget)
         self.label.setObjectName(_fromUtf8("label"))
@@ -61,29 +68,199 @@ class Ui_AnalysisWidget(object):
         self.segm_clusters_ipt.setMaximum(9999)
         self.segm_clusters_ipt.setObjectName(_fromUtf8("segm_clusters_ipt"))
         self.gridLayout_3.addWidget(self.segm_clusters_ipt, 1, 1, 1, 1)
+        self.segm_filter_label = QtGui.QLabel(self.layoutWidget)
+        self.segm_filter_label.setObjectName(_fromUtf8("segm_filter_label"))
+        self.gridLayout_3.addWidget(self.segm_filter_label, 2, 0, 1, 1)
+        self.segm_filter_ipt = QtGui.QSpinBox(self.layoutWidget)
+        self.segm_filter_ipt.setMinimum(3)
+        self.segm_filter_ipt.setMaximum(15)
+        self.segm_filter_ipt.setSingleStep(2)
+        self.segm_filter_ipt.setProperty("value", 3)
+        self.segm_filter_ipt.setObjectName(_fromUtf8("segm_filter_ipt"))
+        self.gridLayout_3.addWidget(self.segm_filter_ipt, 2, 1, 1, 1)
+        self.segm_overviews_ipt = QtGui.QCheckBox(self.layoutWidget)
+        self.segm_overviews_ipt.setObjectName(_fromUtf8("segm_overviews_ipt"))
+        self.gridLayout_3.addWidget(self.segm_overviews_ipt, 3, 0, 1, 1)
+        self.segm_preview_ipt = QtGui.QCheckBox(self.layoutWidget)
+        self.segm_preview_ipt.setChecked(True)
+        self.segm_preview_ipt.setObjectName(_fromUtf8("segm_preview_ipt"))
+        self.gridLayout_3.addWidget(self.segm_preview_ipt, 3, 1, 1, 1)
         self.gridLayout_3.setColumnMinimumWidth(1, 150)
+        self.tabWidgetSegm.addTab(self.tab_segm_ipt, _fromUtf8(""))
+        self.tab_segm_settings = QtGui.QWidget()
+        self.tab_segm_settings.setObjectName(_fromUtf8("tab_segm_settings"))
+        self.layoutWidget_2 = QtGui.QWidget(self.tab_segm_settings)
+        self.layoutWidget_2.setGeometry(QtCore.QRect(5, 0, 285, 96))
+        self.layoutWidget_2.setObjectName(_fromUtf8("layoutWidget_2"))
+        self.gridLayout_5 = QtGui.QGridLayout(self.layoutWidget_2)
+        self.gridLayout_5.setMargin(0)
+        self.gridLayout_5.setVerticalSpacing(0)
+        self.gridLayout_5.setObjectName(_fromUtf8("gridLayout_5"))
+        self.segm_method_label = QtGui.QLabel(self.layoutWidget_2)
+        self.segm_method_label.setObjectName(_fromUtf8("segm_method_label"))
+        self.gridLayout_5.addWidget(self.segm_method_label, 0, 0, 1, 1)
+        self.segm_method_ipt = QtGui.QComboBox(self.layoutWidget_2)
+        self.segm_method_ipt.setObjectName(_fromUtf8("segm_method_ipt"))
+        self.segm_method_ipt.addItem(_fromUtf8(""))
+        self.segm_method_ipt.addItem(_fromUtf8(""))
+        self.segm_method_ipt.addItem(_fromUtf8(""))
+        self.gridLayout_5.addWidget(self.segm_method_ipt, 0, 1, 1, 1)
+        self.segm_samples_label = QtGui.QLabel(self.layoutWidget_2)
+        self.segm_samples_label.setObjectName(_fromUtf8("segm_samples_label"))
+        self.gridLayout_5.addWidget(self.segm_samples_label, 1, 0, 1, 1)
+        self.segm_samples_ipt = QtGui.QSpinBox(self.layoutWidget_2)
+        self.segm_samples_ipt.setEnabled(False)
+        self.segm_samples_ipt.setMinimum(1000)
+        self.segm_samples_ipt.setMaximum(100000000)
+        self.segm_samples_ipt.setSingleStep(10000)
+        self.segm_samples_ipt.setProperty("value", 100000)
+        self.segm_samples_ipt.setObjectName(_fromUtf8("segm_samples_ipt"))
+        self.gridLayout_5.addWidget(self.segm_samples_ipt, 1, 1, 1, 1)
+        self.segm_ninit_label = QtGui.QLabel(self.layoutWidget_2)
+        self.segm_ninit_label.setObjectName(_fromUtf8("segm_ninit_label"))
+        self.gridLayout_5.addWidget(self.segm_ninit_label, 2, 0, 1, 1)
+        self.segm_ninit_ipt = QtGui.QSpinBox(self.layoutWidget_2)
+        self.segm_ninit_ipt.setMinimum(1)
+        self.segm_ninit_ipt.setMaximum(100)
+        self.segm_ninit_ipt.setProperty("value", 10)
+        self.segm_ninit_ipt.setObjectName(_fromUtf8("segm_ninit_ipt"))
+        self.gridLayout_5.addWidget(self.segm_ninit_ipt, 2, 1, 1, 1)
+        self.segm_tile_label = QtGui.QLabel(self.layoutWidget_2)
+        self.segm_tile_label.setObjectName(_fromUtf8("segm_tile_label"))
+        self.gridLayout_5.addWidget(self.segm_tile_label, 3, 0, 1, 1)
+        self.segm_tile_ipt = QtGui.QSpinBox(self.layoutWidget_2)
+        self.segm_tile_ipt.setMinimum(1)
+        self.segm_tile_ipt.setMaximum(65536)
+        self.segm_tile_ipt.setSingleStep(64)
+        self.segm_tile_ipt.setProperty("value", 256)
+        self.segm_tile_ipt.setObjectName(_fromUtf8("segm_tile_ipt"))
+        self.gridLayout_5.addWidget(self.segm_tile_ipt, 3, 1, 1, 1)
+        self.gridLayout_5.setColumnMinimumWidth(1, 150)
+        self.tabWidgetSegm.addTab(self.tab_segm_settings, _fromUtf8(""))
         self.tabWidget.addTab(self.tab_segm, _fromUtf8(""))
         self.tab_stats = QtGui.QWidget()
         self.tab_stats.setObjectName(_fromUtf8("tab_stats"))
-        self.layoutWidget_5 = QtGui.QWidget(self.tab_stats)
-        self.layoutWidget_5.setGeometry(QtCore.QRect(10, 10, 291, 71))
+        self.tabWidgetStats = QtGui.QTabWidget(self.tab_stats)
+        self.tabWidgetStats.setGeometry(QtCore.QRect(5, 0, 300, 125))
+        self.tabWidgetStats.setTabPosition(QtGui.QTabWidget.South)
+        self.tabWidgetStats.setObjectName(_fromUtf8("tabWidgetStats"))
+        self.tab_stats_ipt = QtGui.QWidget()
+        self.tab_stats_ipt.setObjectName(_fromUtf8("tab_stats_ipt"))
+        self.layoutWidget_5 = QtGui.QWidget(self.tab_stats_ipt)
+        self.layoutWidget_5.setGeometry(QtCore.QRect(5, 5, 285, 91))
         self.layoutWidget_5.setObjectName(_fromUtf8("layoutWidget_5"))
         self.gridLayout_4 = QtGui.QGridLayout(self.layoutWidget_5)
         self.gridLayout_4.setMargin(0)
         self.gridLayout_4.setObjectName(_fromUtf8("gridLayout_4"))
-        self.stats_segm_ipt = QtGui.QComboBox(self.layoutWidget_5)
-        self.stats_segm_ipt.setObjectName(_fromUtf8("stats_segm_ipt"))
-        self.gridLayout_4.addWidget(self.stats_segm_ipt, 1, 1, 1, 1)
         self.input_label = QtGui.QLabel(self.layoutWidget_5)
         self.input_label.setObjectName(_fromUtf8("input_label"))
         self.gridLayout_4.addWidget(self.input_label, 0, 0, 1, 1)
-        self.segm_label_2 = QtGui.QLabel(self.layoutWidget_5)
-        self.segm_label_2.setObjectName(_fromUtf8("segm_label_2"))
-        self.gridLayout_4.addWidget(self.segm_label_2, 1, 0, 1, 1)
         self.stats_raster_ipt = QtGui.QComboBox(self.layoutWidget_5)
         self.stats_raster_ipt.setObjectName(_fromUtf8("stats_raster_ipt"))
         self.gridLayout_4.addWidget(self.stats_raster_ipt, 0, 1, 1, 1)
+        self.segm_label_2 = QtGui.QLabel(self.layoutWidget_5)
+        self.segm_label_2.setObjectName(_fromUtf8("segm_label_2"))
+        self.gridLayout_4.addWidget(self.segm_label_2, 1, 0, 1, 1)
+        self.stats_segm_ipt = QtGui.QComboBox(self.layoutWidget_5)
+        self.stats_segm_ipt.setObjectName(_fromUtf8("stats_segm_ipt"))
+        self.gridLayout_4.addWidget(self.stats_segm_ipt, 1, 1, 1, 1)
+        self.stats_labels_label = QtGui.QLabel(self.layoutWidget_5)
+        self.stats_labels_label.setObjectName(_fromUtf8("stats_labels_label"))
+        self.gridLayout_4.addWidget(self.stats_labels_label, 2, 0, 1, 1)
+        self.stats_labels_ipt = QtGui.QComboBox(self.layoutWidget_5)
+        self.stats_labels_ipt.setObjectName(_fromUtf8("stats_labels_ipt"))
+        self.gridLayout_4.addWidget(self.stats_labels_ipt, 2, 1, 1, 1)
         self.gridLayout_4.setColumnMinimumWidth(1, 150)
+        self.tabWidgetStats.addTab(self.tab_stats_ipt, _fromUtf8(""))
+        self.tab_stats_features = QtGui.QWidget()
+        self.tab_stats_features.setObjectName(_fromUtf8("tab_stats_features"))
+        self.layoutWidget_7 = QtGui.QWidget(self.tab_stats_features)
+        self.layoutWidget_7.setGeometry(QtCore.QRect(5, 0, 285, 96))
+        self.layoutWidget_7.setObjectName(_fromUtf8("layoutWidget_7"))
+        self.gridLayout_7 = QtGui.QGridLayout(self.layoutWidget_7)
+        self.gridLayout_7.setMargin(0)
+        self.gridLayout_7.setVerticalSpacing(0)
+        self.gridLayout_7.setObjectName(_fromUtf8("gridLayout_7"))
+        self.stats_range_ipt = QtGui.QCheckBox(self.layoutWidget_7)
+        self.stats_range_ipt.setObjectName(_fromUtf8("stats_range_ipt"))
+        self.gridLayout_7.addWidget(self.stats_range_ipt, 0, 0, 1, 1)
+        self.stats_pct_ipt = QtGui.QCheckBox(self.layoutWidget_7)
+        self.stats_pct_ipt.setObjectName(_fromUtf8("stats_pct_ipt"))
+        self.gridLayout_7.addWidget(self.stats_pct_ipt, 0, 1, 1, 1)
+        self.stats_shape_ipt = QtGui.QCheckBox(self.layoutWidget_7)
+        self.stats_shape_ipt.setObjectName(_fromUtf8("stats_shape_ipt"))
+        self.gridLayout_7.addWidget(self.stats_shape_ipt, 1, 0, 1, 1)
+        self.stats_texture_ipt = QtGui.QCheckBox(self.layoutWidget_7)
+        self.stats_texture_ipt.setObjectName(_fromUtf8("stats_texture_ipt"))
+        self.gridLayout_7.addWidget(self.stats_texture_ipt, 1, 1, 1, 1)
+        self.stats_levels_label = QtGui.QLabel(self.layoutWidget_7)
+        self.stats_levels_label.setObjectName(_fromUtf8("stats_levels_label"))
+        self.gridLayout_7.addWidget(self.stats_levels_label, 2, 0, 1, 1)
+        self.stats_levels_ipt = QtGui.QSpinBox(self.layoutWidget_7)
+        self.stats_levels_ipt.setEnabled(False)
+        self.stats_levels_ipt.setMinimum(2)
+        self.stats_levels_ipt.setMaximum(256)
+        self.stats_levels_ipt.setProperty("value", 32)
+        self.stats_levels_ipt.setObjectName(_fromUtf8("stats_levels_ipt"))
+        self.gridLayout_7.addWidget(self.stats_levels_ipt, 2, 1, 1, 1)
+        self.stats_error_label = QtGui.QLabel(self.layoutWidget_7)
+        self.stats_error_label.setObjectName(_fromUtf8("stats_error_label"))
+        self.gridLayout_7.addWidget(self.stats_error_label, 3, 0, 1, 1)
+        self.stats_error_ipt = QtGui.QDoubleSpinBox(self.layoutWidget_7)
+        self.stats_error_ipt.setDecimals(1)
+        self.stats_error_ipt.setMaximum(100000.0)
+        self.stats_error_ipt.setSingleStep(0.5)
+        self.stats_error_ipt.setObjectName(_fromUtf8("stats_error_ipt"))
+        self.gridLayout_7.addWidget(self.stats_error_ipt, 3, 1, 1, 1)
+        self.gridLayout_7.setColumnMinimumWidth(1, 150)
+        self.tabWidgetStats.addTab(self.tab_stats_features, _fromUtf8(""))
+        self.tab_stats_settings = QtGui.QWidget()
+        self.tab_stats_settings.setObjectName(_fromUtf8("tab_stats_settings"))
+        self.layoutWidget_6 = QtGui.QWidget(self.tab_stats_settings)
+        self.layoutWidget_6.setGeometry(QtCore.QRect(5, 0, 285, 96))
+        self.layoutWidget_6.setObjectName(_fromUtf8("layoutWidget_6"))
+        self.gridLayout_6 = QtGui.QGridLayout(self.layoutWidget_6)
+        self.gridLayout_6.setMargin(0)
+        self.gridLayout_6.setVerticalSpacing(0)
+        self.gridLayout_6.setObjectName(_fromUtf8("gridLayout_6"))
+        self.stats_batch_label = QtGui.QLabel(self.layoutWidget_6)
+        self.stats_batch_label.setObjectName(_fromUtf8("stats_batch_label"))
+        self.gridLayout_6.addWidget(self.stats_batch_label, 0, 0, 1, 1)
+        self.stats_batch_ipt = QtGui.QSpinBox(self.layoutWidget_6)
+        self.stats_batch_ipt.setMinimum(1)
+        self.stats_batch_ipt.setMaximum(1000000)
+        self.stats_batch_ipt.setSingleStep(1000)
+        self.stats_batch_ipt.setProperty("value", 10000)
+        self.stats_batch_ipt.setObjectName(_fromUtf8("stats_batch_ipt"))
+        self.gridLayout_6.addWidget(self.stats_batch_ipt, 0, 1, 1, 1)
+        self.stats_workers_label = QtGui.QLabel(self.layoutWidget_6)
+        self.stats_workers_label.setObjectName(_fromUtf8("stats_workers_label"))
+        self.gridLayout_6.addWidget(self.stats_workers_label, 1, 0, 1, 1)
+        self.stats_workers_ipt = QtGui.QSpinBox(self.layoutWidget_6)
+        self.stats_workers_ipt.setMinimum(1)
+        self.stats_workers_ipt.setMaximum(64)
+        self.stats_workers_ipt.setProperty("value", 1)
+        self.stats_workers_ipt.setObjectName(_fromUtf8("stats_workers_ipt"))
+        self.gridLayout_6.addWidget(self.stats_workers_ipt, 1, 1, 1, 1)
+        self.stats_tile_label = QtGui.QLabel(self.layoutWidget_6)
+        self.stats_tile_label.setObjectName(_fromUtf8("stats_tile_label"))
+        self.gridLayout_6.addWidget(self.stats_tile_label, 2, 0, 1, 1)
+        self.stats_tile_ipt = QtGui.QSpinBox(self.layoutWidget_6)
+        self.stats_tile_ipt.setMinimum(64)
+        self.stats_tile_ipt.setMaximum(65536)
+        self.stats_tile_ipt.setSingleStep(64)
+        self.stats_tile_ipt.setProperty("value", 1024)
+        self.stats_tile_ipt.setObjectName(_fromUtf8("stats_tile_ipt"))
+        self.gridLayout_6.addWidget(self.stats_tile_ipt, 2, 1, 1, 1)
+        self.stats_incremental_ipt = QtGui.QCheckBox(self.layoutWidget_6)
+        self.stats_incremental_ipt.setObjectName(_fromUtf8("stats_incremental_ipt"))
+        self.gridLayout_6.addWidget(self.stats_incremental_ipt, 3, 0, 1, 1)
+        self.stats_fields_ipt = QtGui.QCheckBox(self.layoutWidget_6)
+        self.stats_fields_ipt.setChecked(True)
+        self.stats_fields_ipt.setObjectName(_fromUtf8("stats_fields_ipt"))
+        self.gridLayout_6.addWidget(self.stats_fields_ipt, 3, 1, 1, 1)
+        self.gridLayout_6.setColumnMinimumWidth(1, 150)
+        self.tabWidgetStats.addTab(self.tab_stats_settings, _fromUtf8(""))
         self.tabWidget.addTab(self.tab_stats, _fromUtf8(""))
         self.tab_class = QtGui.QWidget()
         self.tab_class.setObjectName(_fromUtf8("tab_class"))
@@ -113,6 +290,53 @@ class Ui_AnalysisWidget(object):
         self.segm_label.setGeometry(QtCore.QRect(8, 5, 113, 26))
         self.segm_label.setObjectName(_fromUtf8("segm_label"))
         self.tabWidgetClf.addTab(self.tab_class_ipt, _fromUtf8(""))
+        self.tab_class_samples = QtGui.QWidget()
+        self.tab_class_samples.setObjectName(_fromUtf8("tab_class_samples"))
+        self.layoutWidget_8 = QtGui.QWidget(self.tab_class_samples)
+        self.layoutWidget_8.setGeometry(QtCore.QRect(5, 0, 285, 96))
+        self.layoutWidget_8.setObjectName(_fromUtf8("layoutWidget_8"))
+        self.gridLayout_8 = QtGui.QGridLayout(self.layoutWidget_8)
+        self.gridLayout_8.setMargin(0)
+        self.gridLayout_8.setVerticalSpacing(0)
+        self.gridLayout_8.setObjectName(_fromUtf8("gridLayout_8"))
+        self.class_mode_label = QtGui.QLabel(self.layoutWidget_8)
+        self.class_mode_label.setObjectName(_fromUtf8("class_mode_label"))
+        self.gridLayout_8.addWidget(self.class_mode_label, 0, 0, 1, 1)
+        self.class_mode_ipt = QtGui.QComboBox(self.layoutWidget_8)
+        self.class_mode_ipt.setObjectName(_fromUtf8("class_mode_ipt"))
+        self.class_mode_ipt.addItem(_fromUtf8(""))
+        self.class_mode_ipt.addItem(_fromUtf8(""))
+        self.gridLayout_8.addWidget(self.class_mode_ipt, 0, 1, 1, 1)
+        self.class_majority_label = QtGui.QLabel(self.layoutWidget_8)
+        self.class_majority_label.setObjectName(_fromUtf8("class_majority_label"))
+        self.gridLayout_8.addWidget(self.class_majority_label, 1, 0, 1, 1)
+        self.class_majority_ipt = QtGui.QDoubleSpinBox(self.layoutWidget_8)
+        self.class_majority_ipt.setEnabled(False)
+        self.class_majority_ipt.setDecimals(2)
+        self.class_majority_ipt.setMaximum(1.0)
+        self.class_majority_ipt.setSingleStep(0.05)
+        self.class_majority_ipt.setProperty("value", 0.5)
+        self.class_majority_ipt.setObjectName(_fromUtf8("class_majority_ipt"))
+        self.gridLayout_8.addWidget(self.class_majority_ipt, 1, 1, 1, 1)
+        self.class_overlap_label = QtGui.QLabel(self.layoutWidget_8)
+        self.class_overlap_label.setObjectName(_fromUtf8("class_overlap_label"))
+        self.gridLayout_8.addWidget(self.class_overlap_label, 2, 0, 1, 1)
+        self.class_overlap_ipt = QtGui.QDoubleSpinBox(self.layoutWidget_8)
+        self.class_overlap_ipt.setEnabled(False)
+        self.class_overlap_ipt.setDecimals(2)
+        self.class_overlap_ipt.setMaximum(1.0)
+        self.class_overlap_ipt.setSingleStep(0.05)
+        self.class_overlap_ipt.setProperty("value", 0.0)
+        self.class_overlap_ipt.setObjectName(_fromUtf8("class_overlap_ipt"))
+        self.gridLayout_8.addWidget(self.class_overlap_ipt, 2, 1, 1, 1)
+        self.class_model_label = QtGui.QLabel(self.layoutWidget_8)
+        self.class_model_label.setObjectName(_fromUtf8("class_model_label"))
+        self.gridLayout_8.addWidget(self.class_model_label, 3, 0, 1, 1)
+        self.class_model_ipt = QtGui.QLineEdit(self.layoutWidget_8)
+        self.class_model_ipt.setObjectName(_fromUtf8("class_model_ipt"))
+        self.gridLayout_8.addWidget(self.class_model_ipt, 3, 1, 1, 1)
+        self.gridLayout_8.setColumnMinimumWidth(1, 150)
+        self.tabWidgetClf.addTab(self.tab_class_samples, _fromUtf8(""))
         self.tab_class_svm = QtGui.QWidget()
         self.tab_class_svm.setObjectName(_fromUtf8("tab_class_svm"))
         self.groupBox = QtGui.QGroupBox(self.tab_class_svm)
@@ -134,7 +358,7 @@ class Ui_AnalysisWidget(object):
         font = QtGui.QFont()
         font.setPointSize(11)
         self.svm_kgamma_ipt.setFont(font)
-        self.svm_kgamma_ipt.setDecimals(1)
+        self.svm_kgamma_ipt.setDecimals(3)
         self.svm_kgamma_ipt.setSingleStep(0.1)
         self.svm_kgamma_ipt.setObjectName(_fromUtf8("svm_kgamma_ipt"))
         self.svm_kdegree_ipt = QtGui.QSpinBox(self.groupBox)
@@ -166,26 +390,80 @@ class Ui_AnalysisWidget(object):
         self.svm_kcoeff_ipt.setDecimals(1)
         self.svm_kcoeff_ipt.setSingleStep(0.1)
         self.svm_kcoeff_ipt.setObjectName(_fromUtf8("svm_kcoeff_ipt"))
+        self.engine_label = QtGui.QLabel(self.tab_class_svm)
+        self.engine_label.setGeometry(QtCore.QRect(11, 5, 45, 26))
+        self.engine_label.setObjectName(_fromUtf8("engine_label"))
+        self.svm_engine_ipt = QtGui.QComboBox(self.tab_class_svm)
+        self.svm_engine_ipt.setGeometry(QtCore.QRect(60, 5, 105, 26))
+        self.svm_engine_ipt.setObjectName(_fromUtf8("svm_engine_ipt"))
+        self.svm_engine_ipt.addItem(_fromUtf8(""))
+        self.svm_engine_ipt.addItem(_fromUtf8(""))
+        self.svm_engine_ipt.addItem(_fromUtf8(""))
+        self.svm_engine_ipt.addItem(_fromUtf8(""))
+        self.svm_engine_ipt.addItem(_fromUtf8(""))
         self.kernel_label = QtGui.QLabel(self.tab_class_svm)
-        self.kernel_label.setGeometry(QtCore.QRect(11, 13, 41, 26))
+        self.kernel_label.setGeometry(QtCore.QRect(11, 35, 41, 26))
         self.kernel_label.setObjectName(_fromUtf8("kernel_label"))
         self.svm_c_ipt = QtGui.QDoubleSpinBox(self.tab_class_svm)
-        self.svm_c_ipt.setGeometry(QtCore.QRect(60, 50, 85, 24))
+        self.svm_c_ipt.setGeometry(QtCore.QRect(60, 65, 85, 24))
         self.svm_c_ipt.setDecimals(1)
+        self.svm_c_ipt.setMaximum(10000.0)
         self.svm_c_ipt.setSingleStep(0.1)
         self.svm_c_ipt.setProperty("value", 1.0)
         self.svm_c_ipt.setObjectName(_fromUtf8("svm_c_ipt"))
         self.c_label = QtGui.QLabel(self.tab_class_svm)
-        self.c_label.setGeometry(QtCore.QRect(11, 50, 16, 24))
+        self.c_label.setGeometry(QtCore.QRect(11, 65, 16, 24))
         self.c_label.setObjectName(_fromUtf8("c_label"))
         self.svm_kernel_ipt = QtGui.QComboBox(self.tab_class_svm)
-        self.svm_kernel_ipt.setGeometry(QtCore.QRect(60, 13, 85, 26))
+        self.svm_kernel_ipt.setGeometry(QtCore.QRect(60, 35, 85, 26))
         self.svm_kernel_ipt.setObjectName(_fromUtf8("svm_kernel_ipt"))
         self.svm_kernel_ipt.addItem(_fromUtf8(""))
         self.svm_kernel_ipt.addItem(_fromUtf8(""))
         self.svm_kernel_ipt.addItem(_fromUtf8(""))
         self.svm_kernel_ipt.addItem(_fromUtf8(""))
         self.tabWidgetClf.addTab(self.tab_class_svm, _fromUtf8(""))
+        self.tab_class_settings = QtGui.QWidget()
+        self.tab_class_settings.setObjectName(_fromUtf8("tab_class_settings"))
+        self.layoutWidget_9 = QtGui.QWidget(self.tab_class_settings)
+        self.layoutWidget_9.setGeometry(QtCore.QRect(5, 0, 285, 96))
+        self.layoutWidget_9.setObjectName(_fromUtf8("layoutWidget_9"))
+        self.gridLayout_9 = QtGui.QGridLayout(self.layoutWidget_9)
+        self.gridLayout_9.setMargin(0)
+        self.gridLayout_9.setVerticalSpacing(0)
+        self.gridLayout_9.setObjectName(_fromUtf8("gridLayout_9"))
+        self.class_chunk_label = QtGui.QLabel(self.layoutWidget_9)
+        self.class_chunk_label.setObjectName(_fromUtf8("class_chunk_label"))
+        self.gridLayout_9.addWidget(self.class_chunk_label, 0, 0, 1, 1)
+        self.class_chunk_ipt = QtGui.QSpinBox(self.layoutWidget_9)
+        self.class_chunk_ipt.setMinimum(1000)
+        self.class_chunk_ipt.setMaximum(10000000)
+        self.class_chunk_ipt.setSingleStep(10000)
+        self.class_chunk_ipt.setProperty("value", 50000)
+        self.class_chunk_ipt.setObjectName(_fromUtf8("class_chunk_ipt"))
+        self.gridLayout_9.addWidget(self.class_chunk_ipt, 0, 1, 1, 1)
+        self.class_workers_label = QtGui.QLabel(self.layoutWidget_9)
+        self.class_workers_label.setObjectName(_fromUtf8("class_workers_label"))
+        self.gridLayout_9.addWidget(self.class_workers_label, 1, 0, 1, 1)
+        self.class_workers_ipt = QtGui.QSpinBox(self.layoutWidget_9)
+        self.class_workers_ipt.setMinimum(1)
+        self.class_workers_ipt.setMaximum(64)
+        self.class_workers_ipt.setProperty("value", 1)
+        self.class_workers_ipt.setObjectName(_fromUtf8("class_workers_ipt"))
+        self.gridLayout_9.addWidget(self.class_workers_ipt, 1, 1, 1, 1)
+        self.class_gpkg_ipt = QtGui.QCheckBox(self.layoutWidget_9)
+        self.class_gpkg_ipt.setObjectName(_fromUtf8("class_gpkg_ipt"))
+        self.gridLayout_9.addWidget(self.class_gpkg_ipt, 2, 0, 1, 2)
+        self.class_search_label = QtGui.QLabel(self.layoutWidget_9)
+        self.class_search_label.setObjectName(_fromUtf8("class_search_label"))
+        self.gridLayout_9.addWidget(self.class_search_label, 3, 0, 1, 1)
+        self.class_search_ipt = QtGui.QComboBox(self.layoutWidget_9)
+        self.class_search_ipt.setObjectName(_fromUtf8("class_search_ipt"))
+        self.class_search_ipt.addItem(_fromUtf8(""))
+        self.class_search_ipt.addItem(_fromUtf8(""))
+        self.class_search_ipt.addItem(_fromUtf8(""))
+        self.gridLayout_9.addWidget(self.class_search_ipt, 3, 1, 1, 1)
+        self.gridLayout_9.setColumnMinimumWidth(1, 150)
+        self.tabWidgetClf.addTab(self.tab_class_settings, _fromUtf8(""))
         self.tabWidget.addTab(self.tab_class, _fromUtf8(""))
         self.cancel_btn = QtGui.QPushButton(AnalysisWidget)
         self.cancel_btn.setGeometry(QtCore.QRect(198, 170, 70, 32))
@@ -205,6 +483,8 @@ class Ui_AnalysisWidget(object):
 
         self.retranslateUi(AnalysisWidget)
         self.tabWidget.setCurrentIndex(0)
+        self.tabWidgetSegm.setCurrentIndex(0)
+        self.tabWidgetStats.setCurrentIndex(0)
         self.tabWidgetClf.setCurrentIndex(0)
         self.svm_kernel_ipt.setCurrentIndex(1)
         QtCore.QMetaObject.connectSlotsByName(AnalysisWidget)
@@ -213,18 +493,68 @@ class Ui_AnalysisWidget(object):
         AnalysisWidget.setWindowTitle(_translate("AnalysisWidget", "Frame", None))
         self.label.setText(_translate("AnalysisWidget", "Raster Image", None))
         self.label_2.setText(_translate("AnalysisWidget", "Clusters", None))
+        self.segm_filter_label.setText(_translate("AnalysisWidget", "Filter Size", None))
+        self.segm_filter_ipt.setToolTip(_translate("AnalysisWidget", "Width of the square window of the mode filter applied to the clusters, an odd number of pixels", None))
+        self.segm_overviews_ipt.setText(_translate("AnalysisWidget", "Overviews", None))
+        self.segm_preview_ipt.setText(_translate("AnalysisWidget", "Live preview", None))
+        self.tabWidgetSegm.setTabText(self.tabWidgetSegm.indexOf(self.tab_segm_ipt), _translate("AnalysisWidget", "Inputs", None))
+        self.segm_method_label.setText(_translate("AnalysisWidget", "Clustering", None))
+        self.segm_method_ipt.setItemText(0, _translate("AnalysisWidget", "Full", None))
+        self.segm_method_ipt.setItemText(1, _translate("AnalysisWidget", "Sample", None))
+        self.segm_method_ipt.setItemText(2, _translate("AnalysisWidget", "Mini-batch", None))
+        self.segm_samples_label.setText(_translate("AnalysisWidget", "Fit Samples", None))
+        self.segm_ninit_label.setText(_translate("AnalysisWidget", "Runs (n_init)", None))
+        self.segm_tile_label.setText(_translate("AnalysisWidget", "Tile Rows", None))
+        self.tabWidgetSegm.setTabText(self.tabWidgetSegm.indexOf(self.tab_segm_settings), _translate("AnalysisWidget", "Settings", None))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_segm), _translate("AnalysisWidget", "Segmentation", None))
         self.input_label.setText(_translate("AnalysisWidget", "Raster Image", None))
         self.segm_label_2.setText(_translate("AnalysisWidget", "Segmented Image", None))
+        self.stats_labels_label.setText(_translate("AnalysisWidget", "Segment Raster", None))
+        self.tabWidgetStats.setTabText(self.tabWidgetStats.indexOf(self.tab_stats_ipt), _translate("AnalysisWidget", "Inputs", None))
+        self.stats_range_ipt.setText(_translate("AnalysisWidget", "Min / Max", None))
+        self.stats_pct_ipt.setText(_translate("AnalysisWidget", "Percentiles", None))
+        self.stats_shape_ipt.setText(_translate("AnalysisWidget", "Shape", None))
+        self.stats_texture_ipt.setText(_translate("AnalysisWidget", "Texture", None))
+        self.stats_levels_label.setText(_translate("AnalysisWidget", "Grey Levels", None))
+        self.stats_error_label.setText(_translate("AnalysisWidget", "Quantile Error", None))
+        self.stats_error_ipt.setToolTip(_translate("AnalysisWidget", "Error bound of the medians and percentiles of large segments, in pixel value units; 0 computes them exactly", None))
+        self.tabWidgetStats.setTabText(self.tabWidgetStats.indexOf(self.tab_stats_features), _translate("AnalysisWidget", "Features", None))
+        self.stats_batch_label.setText(_translate("AnalysisWidget", "Write Batch", None))
+        self.stats_workers_label.setText(_translate("AnalysisWidget", "Workers", None))
+        self.stats_workers_ipt.setToolTip(_translate("AnalysisWidget", "Threads computing the statistics strips (processes with pipeline.py)", None))
+        self.stats_tile_label.setText(_translate("AnalysisWidget", "Tile Rows", None))
+        self.stats_incremental_ipt.setToolTip(_translate("AnalysisWidget", "Only recompute segments whose geometry changed since the last run with the same settings", None))
+        self.stats_incremental_ipt.setText(_translate("AnalysisWidget", "Incremental", None))
+        self.stats_fields_ipt.setToolTip(_translate("AnalysisWidget", "Also write the statistics to fields of the segments layer; the classifier reads them from the feature store next to it either way", None))
+        self.stats_fields_ipt.setText(_translate("AnalysisWidget", "Write Fields", None))
+        self.tabWidgetStats.setTabText(self.tabWidgetStats.indexOf(self.tab_stats_settings), _translate("AnalysisWidget", "Settings", None))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_stats), _translate("AnalysisWidget", "Statistics", None))
         self.roi_class_field_label.setText(_translate("AnalysisWidget", "ROI Class Field", None))
         self.roi_label.setText(_translate("AnalysisWidget", "ROI Layer", None))
         self.segm_label.setText(_translate("AnalysisWidget", "Segmented Image", None))
         self.tabWidgetClf.setTabText(self.tabWidgetClf.indexOf(self.tab_class_ipt), _translate("AnalysisWidget", "Inputs", None))
+        self.class_mode_label.setText(_translate("AnalysisWidget", "Extraction", None))
+        self.class_mode_ipt.setToolTip(_translate("AnalysisWidget", "Vector intersects rois and segment polygons; Raster rasterizes the rois on the segment raster written by the segmentation", None))
+        self.class_mode_ipt.setItemText(0, _translate("AnalysisWidget", "Vector", None))
+        self.class_mode_ipt.setItemText(1, _translate("AnalysisWidget", "Raster", None))
+        self.class_majority_label.setText(_translate("AnalysisWidget", "Majority", None))
+        self.class_majority_ipt.setToolTip(_translate("AnalysisWidget", "Least share of the covered pixels of a segment in its majority class", None))
+        self.class_overlap_label.setText(_translate("AnalysisWidget", "Min Overlap", None))
+        self.class_overlap_ipt.setToolTip(_translate("AnalysisWidget", "Least share of the pixels of a segment covered by rois", None))
+        self.class_model_label.setText(_translate("AnalysisWidget", "Saved Model", None))
+        self.class_model_ipt.setToolTip(_translate("AnalysisWidget", "Model file saved by a previous run, applied without training; leave empty to train one on the rois", None))
+        self.tabWidgetClf.setTabText(self.tabWidgetClf.indexOf(self.tab_class_samples), _translate("AnalysisWidget", "Samples", None))
         self.groupBox.setTitle(_translate("AnalysisWidget", "Kernel Settings", None))
         self.kgamma_label.setText(_translate("AnalysisWidget", "Gamma", None))
         self.kdegree_label.setText(_translate("AnalysisWidget", "Degree", None))
         self.kcoeff_label.setText(_translate("AnalysisWidget", "Coefficient", None))
+        self.engine_label.setText(_translate("AnalysisWidget", "Engine", None))
+        self.svm_engine_ipt.setToolTip(_translate("AnalysisWidget", "Linear SVM, SGD and RBF Features scale to large training sets; Random Forest uses the Workers of the Settings tab", None))
+        self.svm_engine_ipt.setItemText(0, _translate("AnalysisWidget", "SVC", None))
+        self.svm_engine_ipt.setItemText(1, _translate("AnalysisWidget", "Linear SVM", None))
+        self.svm_engine_ipt.setItemText(2, _translate("AnalysisWidget", "SGD", None))
+        self.svm_engine_ipt.setItemText(3, _translate("AnalysisWidget", "Random Forest", None))
+        self.svm_engine_ipt.setItemText(4, _translate("AnalysisWidget", "RBF Features", None))
         self.kernel_label.setText(_translate("AnalysisWidget", "Kernel", None))
         self.c_label.setText(_translate("AnalysisWidget", "C", None))
         self.svm_kernel_ipt.setItemText(0, _translate("AnalysisWidget", "Linear", None))
@@ -232,6 +562,17 @@ class Ui_AnalysisWidget(object):
         self.svm_kernel_ipt.setItemText(2, _translate("AnalysisWidget", "Poly", None))
         self.svm_kernel_ipt.setItemText(3, _translate("AnalysisWidget", "Sigmoid", None))
         self.tabWidgetClf.setTabText(self.tabWidgetClf.indexOf(self.tab_class_svm), _translate("AnalysisWidget", "SVM Settings", None))
+        self.class_chunk_label.setText(_translate("AnalysisWidget", "Chunk Size", None))
+        self.class_workers_label.setText(_translate("AnalysisWidget", "Workers", None))
+        self.class_workers_ipt.setToolTip(_translate("AnalysisWidget", "Threads predicting the chunks and cross validating the parameter search (processes with pipeline.py), and Random Forest fit threads", None))
+        self.class_gpkg_ipt.setToolTip(_translate("AnalysisWidget", "Write the classification to a GeoPackage next to the segments layer instead of a memory layer", None))
+        self.class_gpkg_ipt.setText(_translate("AnalysisWidget", "Save as GeoPackage", None))
+        self.class_search_label.setText(_translate("AnalysisWidget", "Search", None))
+        self.class_search_ipt.setToolTip(_translate("AnalysisWidget", "Cross validate parameter sets of the SVM Settings tab on the samples instead of classifying, and set the best one there", None))
+        self.class_search_ipt.setItemText(0, _translate("AnalysisWidget", "None", None))
+        self.class_search_ipt.setItemText(1, _translate("AnalysisWidget", "Grid", None))
+        self.class_search_ipt.setItemText(2, _translate("AnalysisWidget", "Random", None))
+        self.tabWidgetClf.setTabText(self.tabWidgetClf.indexOf(self.tab_class_settings), _translate("AnalysisWidget", "Settings", None))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_class), _translate("AnalysisWidget", "Classification", None))
         self.cancel_btn.setText(_translate("AnalysisWidget", "Cancel", None))
         self.ok_btn.setText(_translate("AnalysisWidget", "OK", None))
@@ -61,12 +61,26 @@ class AnalysisWidget(QWidget, Ui_Widget):
 
         self.tabs = ['segm', 'stats', 'clf']
         self.tab_ipts = {
-            'segm': [self.segm_raster_ipt, self.segm_clusters_ipt],
-            'stats': [self.stats_raster_ipt, self.stats_segm_ipt],
+            'segm': [self.segm_raster_ipt, self.segm_clusters_ipt,
+                     self.segm_filter_ipt, self.segm_overviews_ipt,
+                     self.segm_preview_ipt, self.segm_method_ipt,
+                     self.segm_samples_ipt, self.segm_ninit_ipt,
+                     self.segm_tile_ipt],
+            'stats': [self.stats_raster_ipt, self.stats_segm_ipt,
+                      self.stats_labels_ipt, self.stats_range_ipt,
+                      self.stats_pct_ipt, self.stats_shape_ipt,
+                      self.stats_texture_ipt, self.stats_levels_ipt,
+                      self.stats_error_ipt, self.stats_batch_ipt,
+                      self.stats_workers_ipt, self.stats_tile_ipt,
+                      self.stats_incremental_ipt, self.stats_fields_ipt],
             'clf': [self.class_segm_ipt, self.class_roi_ipt,
-                    self.class_roi_field, self.svm_kernel_ipt, self.svm_c_ipt,
-                    self.svm_kgamma_ipt, self.svm_kdegree_ipt,
-                    self.svm_kcoeff_ipt],
+                    self.class_roi_field, self.class_mode_ipt,
+                    self.class_majority_ipt, self.class_overlap_ipt,
+                    self.class_model_ipt, self.svm_engine_ipt,
+                    self.svm_kernel_ipt, self.svm_c_ipt, self.svm_kgamma_ipt,
+                    self.svm_kdegree_ipt, self.svm_kcoeff_ipt,
+                    self.class_chunk_ipt, self.class_workers_ipt,
+                    self.class_gpkg_ipt, self.class_search_ipt],
         }
         self.modules = {
             'segm': segmenter,
@@ -77,11 +91,17 @@ class AnalysisWidget(QWidget, Ui_Widget):
         self.ok_btn.pressed.connect(self.run)
 
         self.tabWidget.currentChanged['int'].connect(self.update_tab_focus)
+        self.tabWidgetSegm.currentChanged['int'].connect(self.update_subfocus_segm)
+        self.tabWidgetStats.currentChanged['int'].connect(self.update_subfocus_stats)
         self.tabWidgetClf.currentChanged['int'].connect(self.update_subfocus_clf)
         self.update_tab_focus(self.tabWidget.currentIndex())
 
         self.class_roi_ipt.currentIndexChanged['QString'].connect(self.update_roi_field)
         self.svm_kernel_ipt.currentIndexChanged.connect(self.update_svm_attr)
+        self.svm_engine_ipt.currentIndexChanged.connect(self.update_svm_attr)
+        self.segm_method_ipt.currentIndexChanged.connect(self.update_segm_attr)
+        self.class_mode_ipt.currentIndexChanged.connect(self.update_clf_attr)
+        self.stats_texture_ipt.toggled.connect(self.stats_levels_ipt.setEnabled)
 
     def log(self, msg, level='info'):
         level_dict = {
@@ -120,14 +140,26 @@ class AnalysisWidget(QWidget, Ui_Widget):
     def update_focus_segm(self):
         # update combo boxes
         self.update_combo_box(RasterLayer, self.segm_raster_ipt)
-        # tab order
-        self.update_tab_order(self.tab_ipts['segm'])
+        self.update_subfocus_segm()
+
+    def update_subfocus_segm(self):
+        idx = self.tabWidgetSegm.currentIndex() and [5, None] or [None, 5]
+        ipts = self.tab_ipts['segm'][slice(*idx)] + [self.tabWidgetSegm]
+        self.update_tab_order(ipts)
 
     def update_focus_stats(self):
         self.update_combo_box(RasterLayer, self.stats_raster_ipt)
         self.update_combo_box(VectorLayer, self.stats_segm_ipt)
-        # tab order
-        self.update_tab_order(self.tab_ipts['stats'])
+        self.update_combo_box(RasterLayer, self.stats_labels_ipt)
+        self.update_subfocus_stats()
+
+    def update_subfocus_stats(self):
+        # inputs, features and settings sub tabs
+        bounds = [None, 3, 9, None]
+        idx = self.tabWidgetStats.currentIndex()
+        ipts = self.tab_ipts['stats'][bounds[idx]:bounds[idx+1]]
+        ipts += [self.tabWidgetStats]
+        self.update_tab_order(ipts)
 
     def update_focus_clf(self):
         self.update_combo_box(0, self.class_segm_ipt)
@@ -135,8 +167,11 @@ class AnalysisWidget(QWidget, Ui_Widget):
         self.update_subfocus_clf()
 
     def update_subfocus_clf(self):
-        idx = self.tabWidgetClf.currentIndex() and [3, None] or [None, 3]
-        ipts = self.tab_ipts['clf'][slice(*idx)] + [self.tabWidgetClf]
+        # inputs, samples, svm settings and settings sub tabs
+        bounds = [None, 3, 7, 13, None]
+        idx = self.tabWidgetClf.currentIndex()
+        ipts = self.tab_ipts['clf'][bounds[idx]:bounds[idx+1]]
+        ipts += [self.tabWidgetClf]
         self.update_tab_order(ipts)
 
     def update_roi_field(self, layer_name):
@@ -147,18 +182,39 @@ class AnalysisWidget(QWidget, Ui_Widget):
             self.class_roi_field.addItems(fields)
 
     def update_svm_attr(self, item_index):
+        engine = self.svm_engine_ipt.currentText()
         kernel = self.svm_kernel_ipt.currentText().lower()
-        ipts = self.tab_ipts['clf'][5:]
+        ipts = self.tab_ipts['clf'][10:13]
         attr_list = {
             'linear': [],
             'poly': ipts[1:],
             'rbf': ipts[0:1],
             'sigmoid': ipts[2:3],
         }
+        # kernel settings only apply to SVC, gamma also to RBF Features
+        if engine != 'SVC':
+            attr_list[kernel] = engine == 'RBF Features' and ipts[0:1] or []
         for ipt in ipts:
             ipt.setEnabled(ipt in attr_list[kernel])
+        self.svm_kernel_ipt.setEnabled(engine == 'SVC')
+        self.svm_c_ipt.setEnabled(engine != 'Random Forest')
+
+    def update_segm_attr(self, item_index):
+        # the whole image is used to fit the full k-means
+        method = self.segm_method_ipt.currentText().lower()
+        self.segm_samples_ipt.setEnabled(method != 'full')
+
+    def update_clf_attr(self, item_index):
+        # thresholds only apply to the raster extraction
+        raster = self.class_mode_ipt.currentText().lower() == 'raster'
+        self.class_majority_ipt.setEnabled(raster)
+        self.class_overlap_ipt.setEnabled(raster)
 
     def get_text(self, ipt):
+        if isinstance(ipt, QtGui.QCheckBox):
+            return ipt.isChecked()
+        if isinstance(ipt, QtGui.QLineEdit):
+            return ipt.text()
         try:
             return ipt.currentText()
         except AttributeError:
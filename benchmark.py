@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Micro-benchmarks for the array kernels, runnable outside of QGIS
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# usage: python benchmark.py <name> [options], from the plugin folder
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from osgeo import gdal
+from osgeo import gdal_array
+from osgeo import ogr
+
+import clustering
+import filters
+import models
+import spatial
+import store
+import tiles
+import vectorize
+import zonal
+
+
+def timeit(fn, *args, **kwargs):
+    start = time.time()
+    result = fn(*args, **kwargs)
+    return time.time() - start, result
+
+
+def synthetic_labels(rows, cols, n_clusters, seed=0):
+    """Blobby label raster, similar to a k-means output of a real scene."""
+    from scipy import ndimage
+    rng = np.random.RandomState(seed)
+    noise = ndimage.gaussian_filter(rng.rand(rows, cols), 2)
+    noise += rng.rand(rows, cols) * 0.05
+    edges = np.percentile(noise, np.linspace(0, 100, n_clusters + 1)[1:-1])
+    return np.digitize(noise, edges).astype(np.int32)
+
+
+def per_pixel_mode_filter(clusters):
+    # original segmenter.Worker loop
+    from scipy import stats
+    rows, cols = clusters.shape
+    for i in range(1, rows-1):
+        for j in range(1, cols-1):
+            retorno = stats.mode(clusters[i-1:i+2, j-1:j+2], axis=None)
+            clusters[i][j] = retorno[0]
+    return clusters
+
+
+def bench_mode(args):
+    print('%12s %10s %10s %10s  %s' % ('size', 'per-pixel', 'sequential',
+                                      'majority', 'identical'))
+    for side in args.sizes:
+        labels = synthetic_labels(side, side, args.clusters)
+        t_seq, seq = timeit(filters.mode_filter, labels.copy())
+        t_maj, _ = timeit(filters.mode_filter, labels.copy(), 3, False)
+        if side <= args.max_reference:
+            t_ref, ref = timeit(per_pixel_mode_filter, labels.copy())
+            same = str(bool((ref == seq).all()))
+            t_ref = '%.3f' % t_ref
+        else:
+            t_ref, same = '-', '-'
+        print('%12s %10s %10.3f %10.3f  %s' % ('%sx%s' % (side, side), t_ref,
+                                              t_seq, t_maj, same))
+
+
+def per_cluster_labelling(clusters):
+    # original segmenter.Worker loop, one ndimage.label per cluster
+    from scipy import ndimage
+    segments = np.zeros(clusters.shape, dtype=np.int32)
+    components = 0
+    for i in np.unique(clusters):
+        lbl, comp = ndimage.label(np.where(clusters == i, 1, 0))
+        segments += np.ma.masked_equal(lbl, 0) + components
+        components += comp
+    return segments, components
+
+
+def same_partition(a, b):
+    """Whether two label arrays describe the same regions (up to ids)."""
+    ids = a.astype(np.int64) * (int(b.max()) + 1) + b
+    n_pairs = len(np.unique(ids))
+    return n_pairs == len(np.unique(a)) == len(np.unique(b))
+
+
+def bench_label(args):
+    print('%12s %8s %10s %11s %10s  %s' % ('size', 'clusters', 'segments',
+                                          'per-cluster', 'one-pass',
+                                          'same partition'))
+    for side in args.sizes:
+        for n_clusters in args.clusters:
+            clusters = synthetic_labels(side, side, n_clusters)
+            filters.mode_filter(clusters)
+            t_old, (old, n) = timeit(per_cluster_labelling, clusters)
+            t_new, (new, _) = timeit(filters.label_components, clusters,
+                                     4, args.rows)
+            print('%12s %8s %10s %11.3f %10.3f  %s' % (
+                '%sx%s' % (side, side), n_clusters, n, t_old, t_new,
+                same_partition(old, new)))
+
+
+def synthetic_image(rows, cols, bands, n_classes, seed=0):
+    """(pixels, bands) matrix of a noisy piecewise constant image."""
+    rng = np.random.RandomState(seed)
+    labels = synthetic_labels(rows, cols, n_classes, seed).ravel()
+    centers = rng.rand(n_classes, bands) * 255
+    pixels = centers[labels] + rng.randn(labels.size, bands) * 8
+    return pixels.astype(np.float32)
+
+
+def bench_kmeans(args):
+    pixels = synthetic_image(args.side, args.side, args.bands, args.clusters)
+    print('%s pixels, %s bands, %s clusters' % (len(pixels), args.bands,
+                                                args.clusters))
+    print('%10s %10s %8s %8s %10s %14s' % ('method', 'samples', 'fit', 'predict',
+                                          'total', 'mean inertia'))
+    for method in clustering.METHODS:
+        for n_samples in (method == 'full' and [None] or args.samples):
+            index = clustering.sample_index(len(pixels), n_samples, seed=0)
+            fit_data = pixels if index is None else pixels[index]
+            kmeans = clustering.make_kmeans(args.clusters, method,
+                                            args.n_init, seed=0)
+            t_fit, _ = timeit(kmeans.fit, fit_data)
+            t_pred, labels = timeit(kmeans.predict, pixels)
+            # inertia over the full image, comparable between methods
+            inertia = ((pixels - kmeans.cluster_centers_[labels]) ** 2).sum()
+            print('%10s %10s %8.2f %8.2f %10.2f %14.4g' % (
+                method, len(fit_data), t_fit, t_pred, t_fit + t_pred,
+                inertia / len(pixels)))
+
+
+def synthetic_segments(rows, cols, n_segments, seed=0):
+    """Label raster with about n_segments compact segments (voronoi cells)."""
+    from scipy import ndimage
+    rng = np.random.RandomState(seed)
+    seeds = np.zeros((rows, cols), dtype=np.int32)
+    pos = rng.randint(0, rows * cols, n_segments)
+    seeds.flat[pos] = np.arange(1, n_segments + 1)
+    _, (iy, ix) = ndimage.distance_transform_edt(seeds == 0,
+                                                 return_indices=True)
+    segments = seeds[iy, ix]
+    # renumber 1..n, some seeds may have collided
+    _, segments = np.unique(segments, return_inverse=True)
+    return segments.reshape(rows, cols) + 1
+
+
+def per_feature_stats(img_vector, indices, segment_id):
+    # original statistics.Worker computation for a single feature
+    mat = np.multiply(img_vector.T, (indices == segment_id-1))
+    mat = (mat.T[np.all(mat.T > 0, axis=1)]).T
+    return np.array([np.apply_over_axes(f, mat, [1]).flatten()
+                     for f in [np.average, np.median, np.std]]).T.flatten()
+
+
+def bench_zonal(args):
+    rng = np.random.RandomState(0)
+    n_pixels = args.side * args.side
+    img_vector = rng.randint(1, 255, (n_pixels, args.bands))
+    print('%sx%s pixels, %s bands' % (args.side, args.side, args.bands))
+    print('%10s %16s %10s  %s' % ('segments', 'per-feature(est)', 'grouped',
+                                  'identical'))
+    for n_segments in args.segments:
+        zones = synthetic_segments(args.side, args.side, n_segments).ravel()
+        n_zones = int(zones.max())
+        t_new, (_, stats) = timeit(zonal.zonal_stats, img_vector, zones,
+                                   n_zones)
+        # time a few features of the old path and extrapolate
+        indices = zones - 1
+        sample = range(1, n_zones + 1, max(n_zones // args.probe, 1))
+        start = time.time()
+        same = True
+        for segment_id in sample:
+            old = per_feature_stats(img_vector, indices, segment_id)
+            same &= np.allclose(old, stats[segment_id].ravel())
+        t_old = (time.time() - start) / len(sample) * n_zones
+        print('%10s %16.2f %10.3f  %s' % (n_zones, t_old, t_new, same))
+
+
+def bench_features(args):
+    rng = np.random.RandomState(0)
+    segments = synthetic_segments(args.side, args.side, args.segments)
+    zones = segments.ravel()
+    n_zones = int(zones.max())
+    values = rng.randint(1, 255, (zones.size, args.bands))
+    print('%sx%s pixels, %s bands, %s segments' % (args.side, args.side,
+                                                   args.bands, n_zones))
+    print('%-24s %7s %8s  %s' % ('families', 'fields', 'total', 'breakdown'))
+    runs = [['basic']] + [['basic', f] for f in zonal.FAMILIES[1:]]
+    for families in runs + [zonal.FAMILIES]:
+        timings = {}
+        elapsed, (_, table) = timeit(zonal.zonal_features, values, zones,
+                                     n_zones, families, segments.shape,
+                                     levels=args.levels, timings=timings)
+        breakdown = zonal.timing_report(timings)
+        label = families == zonal.FAMILIES and 'all' or '+'.join(families)
+        print('%-24s %7s %8.3f  %s' % (label, table.shape[1], elapsed,
+                                       breakdown))
+
+
+def bench_quantiles(args):
+    rng = np.random.RandomState(0)
+    zones = synthetic_segments(args.side, args.side, args.segments).ravel()
+    n_zones = int(zones.max())
+    values = rng.normal(2000, 500, (zones.size, 1)).clip(1, None)
+    if not args.float:
+        values = values.astype(np.uint16)
+    families = ['basic', 'range', 'percentiles']
+    print('%sx%s pixels, %s segments, %s values, exact below %s pixels' % (
+            args.side, args.side, n_zones, values.dtype, args.exact))
+    print('%8s %8s %12s %12s' % ('error', 'time', 'hist MB', 'max error'))
+    reference = None
+    for error in [0] + args.errors:
+        elapsed, (_, table) = timeit(zonal.zonal_features, values, zones,
+                                     n_zones, families, error=error,
+                                     exact=args.exact)
+        hist = zonal.partial_features(values, zones, families,
+                                      (zones.size, 1), error=error,
+                                      exact=args.exact)['hist'][0]
+        size = sum(a.nbytes for a in hist) / 1024.0 / 1024.0
+        if reference is None:
+            reference = table
+        worst = np.nanmax(np.abs(table[:, 1:] - reference[:, 1:]))
+        print('%8s %8.2f %12.1f %12.3f' % (error, elapsed, size, worst))
+
+
+def write_raster(filename, array):
+    """Write a (bands, rows, cols) or (rows, cols) array as a tiled GTiff."""
+    array = array.reshape((-1,) + array.shape[-2:])
+    gdal_type = gdal_array.NumericTypeCodeToGDALTypeCode(array.dtype)
+    ds = gdal.GetDriverByName('GTiff').Create(
+        filename, array.shape[2], array.shape[1], array.shape[0], gdal_type,
+        tiles.creation_options(gdal_type))
+    for b, band in enumerate(array):
+        ds.GetRasterBand(b + 1).WriteArray(band)
+    ds = None
+
+
+def bench_parallel(args):
+    rng = np.random.RandomState(0)
+    segments = synthetic_segments(args.side, args.side, args.segments)
+    image = rng.randint(1, 255, (args.bands, args.side, args.side))
+    folder = tempfile.mkdtemp()
+    try:
+        image_file = os.path.join(folder, 'image.tif')
+        labels_file = os.path.join(folder, 'segments.tif')
+        write_raster(image_file, image.astype(np.uint8))
+        write_raster(labels_file, segments.astype(np.uint32))
+        print('%sx%s pixels, %s bands, %s segments, %s, strips of %s rows' % (
+                args.side, args.side, args.bands, int(segments.max()),
+                '+'.join(args.families), args.rows))
+        print('%8s %8s %8s  %s' % ('workers', 'time', 'speedup',
+                                   'identical'))
+        base = reference = None
+        for workers in args.workers:
+            elapsed, (_, table) = timeit(zonal.tiled_features, image_file,
+                                         labels_file, args.families,
+                                         rows=args.rows, workers=workers)
+            if base is None:
+                base, reference = elapsed, table
+            same = np.allclose(table, reference, equal_nan=True)
+            print('%8s %8.2f %7.2fx  %s' % (workers, elapsed,
+                                            base / elapsed, same))
+    finally:
+        shutil.rmtree(folder)
+
+
+def square(x, y, size):
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for px, py in [(x, y), (x + size, y), (x + size, y + size),
+                   (x, y + size), (x, y)]:
+        ring.AddPoint_2D(px, py)
+    geom = ogr.Geometry(ogr.wkbPolygon)
+    geom.AddGeometry(ring)
+    return geom
+
+
+def bench_intersect(args):
+    rng = np.random.RandomState(0)
+    segments = synthetic_segments(args.side, args.side, args.segments)
+    folder = tempfile.mkdtemp()
+    try:
+        labels_file = os.path.join(folder, 'segments.tif')
+        write_raster(labels_file, segments.astype(np.uint32))
+        vector_file = vectorize.vector_filename(labels_file)
+        vectorize.polygonize(labels_file, vector_file)
+        ds = ogr.Open(vector_file)
+        layer = ds.GetLayer(0)
+        fid_column = layer.GetFIDColumn()
+        # index pass, as classifier.Worker.load_segments
+        fids, boxes, cache = [], [], {}
+        for feat in layer:
+            geom = feat.GetGeometryRef()
+            xmin, xmax, ymin, ymax = geom.GetEnvelope()
+            fids.append(feat.GetFID())
+            boxes.append((xmin, ymin, xmax, ymax))
+            cache[feat.GetFID()] = geom.Clone()
+        index = spatial.BoxIndex(boxes)
+        rois = [square(x, y, args.roi_size) for x, y in
+                rng.rand(args.rois, 2) * (args.side - args.roi_size)]
+        candidates = []
+        for roi in rois:
+            xmin, xmax, ymin, ymax = roi.GetEnvelope()
+            candidates.append([fids[r] for r in
+                               index.intersects(xmin, ymin, xmax, ymax)])
+        n_pairs = sum(len(c) for c in candidates)
+
+        def refetch(roi, fid_list):
+            # one request per candidate, the former classifier loop
+            return sum(roi.Intersects(layer.GetFeature(fid).GetGeometryRef())
+                       for fid in fid_list)
+
+        def batch(roi, fid_list):
+            layer.SetAttributeFilter('"%s" IN (%s)' % (
+                fid_column, ','.join(str(f) for f in fid_list)))
+            hits = sum(roi.Intersects(f.GetGeometryRef()) for f in layer)
+            layer.SetAttributeFilter(None)
+            return hits
+
+        def cached(roi, fid_list):
+            return sum(roi.Intersects(cache[fid]) for fid in fid_list)
+
+        print('%s segments, %s rois of %s pixels, %s candidate pairs' % (
+                len(fids), args.rois, args.roi_size, n_pairs))
+        print('%10s %8s %12s %10s' % ('method', 'time', 'pairs/s',
+                                      'intersects'))
+        for name, fn in [('refetch', refetch), ('batch', batch),
+                         ('cache', cached)]:
+            start = time.time()
+            hits = sum(fn(roi, c) for roi, c in zip(rois, candidates) if c)
+            elapsed = max(time.time() - start, 1e-6)
+            print('%10s %8.2f %12.0f %10s' % (name, elapsed,
+                                              n_pairs / elapsed, hits))
+        layer = ds = None
+    finally:
+        shutil.rmtree(folder)
+
+
+def synthetic_samples(args, seed=0):
+    """Training samples, their labels and segment features of gaussian
+    classes."""
+    rng = np.random.RandomState(seed)
+    centres = rng.rand(args.classes, args.features) * 4
+    labels = rng.randint(0, args.classes, args.train)
+    samples = centres[labels] + rng.randn(args.train, args.features)
+    data = centres[rng.randint(0, args.classes, args.segments)]
+    data += rng.randn(args.segments, args.features)
+    return samples, labels, data
+
+
+def bench_predict(args):
+    samples, labels, data = synthetic_samples(args)
+    params = {'kernel': 'rbf', 'C': 1.0, 'gamma': 1.0 / args.features}
+    fit_time, model = timeit(models.Model(params, []).fit, samples, labels)
+    print('%s segments, %s features, %s training samples, %s support '
+          'vectors, fit in %.2fs' % (args.segments, args.features,
+                                     args.train,
+                                     len(model.classifier.support_),
+                                     fit_time))
+    print('%10s %8s %8s %8s  %s' % ('chunk', 'workers', 'time', 'speedup',
+                                    'identical'))
+    base, reference = timeit(model.predict, data)
+    print('%10s %8s %8.2f %7.2fx  %s' % ('all', 1, base, 1, True))
+
+    def chunked(chunk_size, workers):
+        out = np.empty(len(data), dtype=reference.dtype)
+        for start, chunk in models.predict_chunks(model, data, chunk_size,
+                                                  workers):
+            out[start:start+len(chunk)] = chunk
+        return out
+
+    for chunk_size in args.chunks:
+        for workers in args.workers:
+            elapsed, out = timeit(chunked, chunk_size, workers)
+            print('%10s %8s %8.2f %7.2fx  %s' % (
+                    chunk_size, workers, elapsed, base / elapsed,
+                    np.array_equal(out, reference)))
+
+
+def bench_engines(args):
+    samples, labels, data = synthetic_samples(args)
+    params = {'kernel': 'rbf', 'C': 1.0, 'gamma': 0.0, 'degree': 3,
+              'coef0': 0.0}
+    print('%s training samples, %s segments, %s features, %s classes' % (
+            args.train, args.segments, args.features, args.classes))
+    print('%14s %8s %8s %8s' % ('engine', 'fit', 'predict', 'accuracy'))
+    for engine in args.engines:
+        model = models.Model(params, [], engine=engine)
+        fit_time, _ = timeit(model.fit, samples, labels, args.jobs)
+        # by chunks, as the plugin does
+        predict_time, _ = timeit(lambda: [c for _, c in models.predict_chunks(
+                                            model, data, args.chunk)])
+        accuracy = (model.predict(samples) == labels).mean()
+        print('%14s %8.2f %8.2f %8.3f' % (engine, fit_time, predict_time,
+                                          accuracy))
+
+
+def bench_search(args):
+    args.segments = 0
+    samples, labels, _ = synthetic_samples(args)
+    params = {'kernel': args.kernel, 'C': 1.0, 'gamma': 0.0, 'degree': 3,
+              'coef0': 0.0}
+    names = models.search_params('svc', params)
+    candidates = models.search_candidates(params, names, args.mode)
+    print('%s %s search of %s on %s samples, %s parameter sets, %s folds' % (
+            args.mode, args.kernel, ', '.join(names), args.train,
+            len(candidates), models.SEARCH_FOLDS))
+    print('%8s %10s %8s %6s %8s  %s' % ('workers', 'tolerance', 'time',
+                                         'fits', 'best', 'params'))
+    for workers in args.workers:
+        for tolerance in args.tolerances:
+            elapsed, results = timeit(models.search, samples, labels, 'svc',
+                                      candidates, workers=workers,
+                                      tolerance=tolerance)
+            best = results[0]
+            print('%8s %10s %8.2f %6s %8.3f  %s' % (
+                    workers, tolerance, elapsed,
+                    sum(len(r['scores']) for r in results), best['score'],
+                    ', '.join('%s %s' % (n, best['params'][n])
+                              for n in names)))
+
+
+def bench_store(args):
+    rng = np.random.RandomState(0)
+    stats = rng.rand(args.segments + 1, args.features)
+    names = ['f%s' % i for i in range(args.features)]
+    # segment ids in layer order, as a shapefile written by the
+    # segmentation keeps them
+    ids = np.arange(1, args.segments + 1, dtype=np.float64)
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, 'segments.shp.0.features')
+        save_time, _ = timeit(store.save, path, stats, names, {})
+        rows = [[i] + r for i, r in zip(ids.tolist(), stats[1:].tolist())]
+        print('%s segments, %s features, store written in %.2fs' % (
+                args.segments, args.features, save_time))
+        print('%15s %8s  %s' % ('source', 'time', 'identical'))
+        elapsed, attributes = timeit(spatial.float_columns, rows)
+        print('%15s %8.2f  %s' % ('attributes', elapsed, True))
+
+        def mapped(segment_ids):
+            data, _ = store.load(path)
+            return store.lookup(data, segment_ids)
+
+        elapsed, data = timeit(mapped, ids)
+        print('%15s %8.2f  %s' % ('store', elapsed,
+                                  np.array_equal(data, attributes[:, 1:])))
+        shuffled = rng.permutation(ids)
+        elapsed, data = timeit(mapped, shuffled)
+        print('%15s %8.2f  %s' % ('store, shuffled', elapsed,
+                                  np.array_equal(data,
+                                                 stats[shuffled.astype(int)])))
+    finally:
+        shutil.rmtree(folder)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers()
+
+    p = sub.add_parser('mode', help='mode filter vs the per-pixel loop')
+    p.set_defaults(func=bench_mode)
+    p.add_argument('--sizes', type=int, nargs='+', default=[64, 128, 256, 1024])
+    p.add_argument('--clusters', type=int, default=8)
+    p.add_argument('--max-reference', type=int, default=256,
+                   help='largest side to run the per-pixel loop on')
+
+    p = sub.add_parser('kmeans', help='full vs sampled vs mini-batch k-means')
+    p.set_defaults(func=bench_kmeans)
+    p.add_argument('--side', type=int, default=1000)
+    p.add_argument('--bands', type=int, default=6)
+    p.add_argument('--clusters', type=int, default=8)
+    p.add_argument('--n-init', type=int, default=10)
+    p.add_argument('--samples', type=int, nargs='+',
+                   default=[10000, 100000])
+
+    p = sub.add_parser('label', help='one-pass vs per-cluster labelling')
+    p.set_defaults(func=bench_label)
+    p.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000])
+    p.add_argument('--clusters', type=int, nargs='+', default=[8, 32])
+    p.add_argument('--rows', type=int, default=1024)
+
+    p = sub.add_parser('zonal', help='grouped vs per-feature statistics')
+    p.set_defaults(func=bench_zonal)
+    p.add_argument('--side', type=int, default=1000)
+    p.add_argument('--bands', type=int, default=6)
+    p.add_argument('--segments', type=int, nargs='+',
+                   default=[1000, 10000, 100000])
+    p.add_argument('--probe', type=int, default=20,
+                   help='features timed to estimate the per-feature path')
+
+    p = sub.add_parser('features', help='cost of each zonal feature family')
+    p.set_defaults(func=bench_features)
+    p.add_argument('--side', type=int, default=1000)
+    p.add_argument('--bands', type=int, default=6)
+    p.add_argument('--segments', type=int, default=10000)
+    p.add_argument('--levels', type=int, default=32)
+
+    p = sub.add_parser('quantiles', help='exact vs approximate medians and '
+                                         'percentiles of large segments')
+    p.set_defaults(func=bench_quantiles)
+    p.add_argument('--side', type=int, default=2000)
+    p.add_argument('--segments', type=int, default=100)
+    p.add_argument('--errors', type=float, nargs='+', default=[1, 5, 25])
+    p.add_argument('--exact', type=int, default=zonal.EXACT_PIXELS)
+    p.add_argument('--float', action='store_true',
+                   help='floating point instead of 16 bit values')
+
+    p = sub.add_parser('parallel', help='speedup of the strip-wise zonal '
+                                        'features over worker processes')
+    p.set_defaults(func=bench_parallel)
+    p.add_argument('--side', type=int, default=4000)
+    p.add_argument('--bands', type=int, default=6)
+    p.add_argument('--segments', type=int, default=100000)
+    p.add_argument('--rows', type=int, default=512)
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--families', nargs='+', default=['basic'],
+                   choices=zonal.FAMILIES)
+
+    p = sub.add_parser('intersect', help='roi/segment pairs tested per second '
+                       'refetching, batching or caching segment geometries')
+    p.set_defaults(func=bench_intersect)
+    p.add_argument('--side', type=int, default=2000)
+    p.add_argument('--segments', type=int, default=20000)
+    p.add_argument('--rois', type=int, default=200)
+    p.add_argument('--roi-size', type=float, default=50)
+
+    p = sub.add_parser('predict', help='single call vs chunked, parallel '
+                       'svm prediction')
+    p.set_defaults(func=bench_predict)
+    p.add_argument('--segments', type=int, default=200000)
+    p.add_argument('--features', type=int, default=18)
+    p.add_argument('--classes', type=int, default=5)
+    p.add_argument('--train', type=int, default=5000)
+    p.add_argument('--chunks', type=int, nargs='+', default=[10000, 50000])
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+
+    p = sub.add_parser('engines', help='fit and predict time of each '
+                       'classifier engine')
+    p.set_defaults(func=bench_engines)
+    p.add_argument('--segments', type=int, default=1000000)
+    p.add_argument('--features', type=int, default=18)
+    p.add_argument('--classes', type=int, default=5)
+    p.add_argument('--train', type=int, default=100000)
+    p.add_argument('--jobs', type=int, default=multiprocessing.cpu_count())
+    p.add_argument('--chunk', type=int, default=50000)
+    p.add_argument('--engines', nargs='+',
+                   default=['linear', 'sgd', 'forest', 'rff'],
+                   choices=[name for name, _ in models.ENGINES])
+
+    p = sub.add_parser('search', help='parallel parameter search, with and '
+                       'without early stopping')
+    p.set_defaults(func=bench_search)
+    p.add_argument('--train', type=int, default=5000)
+    p.add_argument('--features', type=int, default=18)
+    p.add_argument('--classes', type=int, default=5)
+    p.add_argument('--kernel', default='rbf',
+                   choices=['linear', 'rbf', 'poly', 'sigmoid'])
+    p.add_argument('--mode', default='grid', choices=['grid', 'random'])
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--tolerances', type=float, nargs='+',
+                   default=[1.0, models.SEARCH_TOLERANCE],
+                   help='1 evaluates every set on every fold')
+
+    p = sub.add_parser('store', help='segment features read from the feature '
+                       'store vs converted from attribute rows')
+    p.set_defaults(func=bench_store)
+    p.add_argument('--segments', type=int, default=1000000)
+    p.add_argument('--features', type=int, default=18)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
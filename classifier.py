@@ -25,68 +25,204 @@
 #
 #***********************************************************************
 
-import pickle
+import os
+import tempfile
 import time
 
 from qgis.core import *
 
 import numpy as np
-from sklearn import svm
-from sklearn import preprocessing
-
+from osgeo import ogr
+import models
+import pipeline
+import pools
+import spatial
+import store
 import util
+import vectorize
+
+# segments labelled by the roi raster checked against the vector path
+AGREEMENT_SAMPLE = 1000
+
+
+def prepared(geom):
+    """intersects(other) predicate of a geometry, prepared once (GEOS
+    prepared geometry) when this QGIS version supports it."""
+    try:
+        engine = QgsGeometry.createGeometryEngine(geom.geometry())
+        engine.prepareGeometry()
+    except AttributeError:
+        return geom.intersects
+    return lambda other: engine.intersects(other.geometry())
+
+
+def segment_id(value):
+    return None if np.isnan(value) else int(value)
+
+
+def class_value(value):
+    return None if value is None else int(value)
+
+
+def model_dir():
+    """Folder of the models saved by previous runs."""
+    return os.path.join(QgsApplication.qgisSettingsDirPath(),
+                        'image_analysis', 'models')
+
+
+class MemoryOutput(object):
+    """Predictions added to a memory layer, a batch of features at a time.
+    The layer is created by the task, on the GUI thread, and only reaches
+    the registry once complete."""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.provider = layer.dataProvider()
+
+    def add(self, items):
+        feats = []
+        for segment_id, geom, label in items:
+            feat = QgsFeature()
+            feat.setGeometry(geom)
+            feat.setAttributes([segment_id, label])
+            feats.append(feat)
+        self.provider.addFeatures(feats)
+
+    def close(self):
+        return ''
+
+
+class GeoPackageOutput(object):
+    """Predictions written to a GeoPackage, in transactions of a batch of
+    features."""
+
+    def __init__(self, filename, srs_wkt, max_id, batch_size=10000):
+        self.filename = filename
+        self.ds, self.layer = vectorize.create_layer(
+            filename, srs_wkt, 'GPKG', max_id, [('Class', ogr.OFTInteger)],
+            ogr.wkbMultiPolygon)
+        self.defn = self.layer.GetLayerDefn()
+        self.batch = vectorize.Batch(self.layer, batch_size)
+
+    def add(self, items):
+        for segment_id, geom, label in items:
+            feat = ogr.Feature(self.defn)
+            feat.SetField(0, segment_id)
+            if label is not None:
+                feat.SetField(1, label)
+            wkb = ogr.CreateGeometryFromWkb(geom.asWkb())
+            feat.SetGeometry(ogr.ForceToMultiPolygon(wkb))
+            self.layer.CreateFeature(feat)
+        self.batch.add(len(items))
+
+    def close(self):
+        self.batch.close()
+        self.layer = self.ds = None
+        return self.filename
+
+
+def output_filename(seg_layer, layer_name):
+    """GeoPackage next to the segments layer file, or in the temporary
+    folder if it has none."""
+    vector_file, _ = vectorize.split_source(seg_layer.source())
+    folder = os.path.dirname(vector_file)
+    if not os.path.isdir(folder):
+        folder = tempfile.gettempdir()
+    return os.path.join(folder, layer_name + '.gpkg')
 
 
 class Task(util.Task):
     def setup(self, *args):
         # unpack arguments
         class_segm, class_roi, class_roi_field = args[0:3]
-        svm_kernel, svm_c, svm_kgamma, svm_kdegree, svm_kcoeff = args[3:]
+        class_mode, class_majority, class_overlap = args[3:6]
+        class_model = str(args[6]).strip()
+        svm_engine = dict((label, name) for name, label in
+                          models.ENGINES)[str(args[7])]
+        svm_kernel, svm_c, svm_kgamma, svm_kdegree, svm_kcoeff = args[8:13]
+        class_chunk, class_workers, class_gpkg = args[13:16]
+        self.search = str(args[16]).lower()
+        if self.search == 'none':
+            self.search = None
         try:
             self.seg_layer = self.parent.get_layer(QgsMapLayer.VectorLayer,
                                                    class_segm)
-            self.roi_layer = self.parent.get_layer(QgsMapLayer.VectorLayer,
-                                                   class_roi)
+            self.roi_layer = None
+            if class_roi or not class_model:
+                self.roi_layer = self.parent.get_layer(
+                    QgsMapLayer.VectorLayer, class_roi)
         except IndexError:
             self.valid = False
             self.invalid = 'Please, set segmented and roi images.'
             return
+        if class_model and not os.path.isfile(class_model):
+            self.valid = False
+            self.invalid = 'Saved model %s not found.' % class_model
+            return
+        if self.search and class_model:
+            self.valid = False
+            self.invalid = 'A saved model has no parameters to search.'
+            return
         self.svm_dict = {
             'kernel': str(svm_kernel.lower()),
             'C': float(svm_c),
             'gamma': float(svm_kgamma),
-            'degree': float(svm_kdegree),
+            'degree': int(svm_kdegree),
             'coef0': float(svm_kcoeff),
         }
+        if self.search and not models.search_params(svm_engine,
+                                                    self.svm_dict):
+            self.valid = False
+            self.invalid = ('%s has no parameters to search.' %
+                            args[7])
+            return
+        self.layer_name = 'classification_%s_C%s_%s' % (
+                            svm_engine == 'svc' and self.svm_dict['kernel']
+                            or svm_engine,
+                            self.svm_dict['C'],
+                            int(time.time())
+                        )
+        # output, filled by the worker
+        if self.search:
+            output = None
+        elif class_gpkg:
+            output = output_filename(self.seg_layer, self.layer_name)
+        else:
+            layer_crs = self.seg_layer.crs().authid()
+            layer_uri = ('MultiPolygon?crs=%s&'
+                         + 'field=ID:integer&field=Class:integer') % layer_crs
+            output = QgsVectorLayer(layer_uri, self.layer_name, 'memory')
+        self.target = output
         # setup worker
         self.worker = Worker(self.seg_layer,
                              self.roi_layer,
                              class_roi_field,
-                             self.svm_dict)
-
-    def post_run(self, obj):
-        predictions = pickle.loads(obj)
-        # create a new layer
-        layer_crs = self.seg_layer.crs().authid()
-        layer_uri = ('MultiPolygon?crs=%s&'
-                     + 'field=ID:integer&field=Class:integer') % layer_crs
-        layer_name = 'classification_%s_C%s_%s' % (
-                        self.svm_dict['kernel'],
-                        self.svm_dict['C'],
-                        int(time.time())
-                    )
-        prediction_layer = QgsVectorLayer(layer_uri, layer_name, 'memory')
-        prediction_dp = prediction_layer.dataProvider()
-        # copy features
-        for seg_feat in self.seg_layer.dataProvider().getFeatures():
-            feat = QgsFeature()
-            feat.setGeometry(seg_feat.geometry())
-            feat.setAttributes([seg_feat.attributes()[0], predictions.pop(0)])
-            prediction_dp.addFeatures([feat])
-        self.parent.log('features: %s' % feat.attributes())
+                             self.svm_dict,
+                             str(class_mode).lower(),
+                             float(class_majority),
+                             float(class_overlap),
+                             class_model,
+                             model_dir(),
+                             int(class_chunk),
+                             int(class_workers),
+                             output,
+                             engine=svm_engine,
+                             search=self.search)
+
+    def post_run(self, filename):
+        if self.search:
+            self.show_search(self.worker.search_results)
+            return
+        if filename:
+            prediction_layer = QgsVectorLayer(filename, self.layer_name,
+                                              'ogr')
+        else:
+            prediction_layer = self.target
+            prediction_layer.updateExtents()
         # set same style as roi layer
-        renderer = self.roi_layer.rendererV2()
-        prediction_layer.setRendererV2(renderer)
+        if self.roi_layer is not None:
+            renderer = self.roi_layer.rendererV2()
+            prediction_layer.setRendererV2(renderer)
         # add layer to canvas and refresh gui
         QgsMapLayerRegistry.instance().addMapLayer(prediction_layer)
         iface = self.parent.iface
@@ -94,76 +230,402 @@ class Task(util.Task):
         iface.mapCanvas().refresh()
 
         self.completed = ('completed successfully. '
-                          + 'Layer <b>%s</b> added to the canvas.' % layer_name)
+                          + 'Layer <b>%s</b> added to the canvas.' %
+                          self.layer_name)
+
+    def show_search(self, results):
+        """Set the best parameters on the SVM tab and list the scores of
+        every parameter set."""
+        names = models.search_params(self.worker.engine, self.svm_dict)
+        ipts = {
+            'C': self.parent.svm_c_ipt,
+            'gamma': self.parent.svm_kgamma_ipt,
+            'degree': self.parent.svm_kdegree_ipt,
+            'coef0': self.parent.svm_kcoeff_ipt,
+        }
+        best = results[0]
+        for name in names:
+            ipts[name].setValue(best['params'][name])
+        rows = [[r['params'][name] for name in names] +
+                ['%.3f' % r['score'], '%.3f' % r['std'], len(r['scores']),
+                 '%.2f' % r['fit_time']] for r in results]
+        util.show_table(self.parent, 'Parameter search',
+                        names + ['Accuracy', 'Std', 'Folds', 'Fit (s)'], rows)
+        self.completed = ('completed successfully. Best of %s parameter '
+                          'sets, accuracy %.3f, set on the SVM tab.' % (
+                            len(results), best['score']))
 
 
 class Worker(util.Worker):
-    def __init__(self, seg_layer, roi_layer, roi_field, svm_dict):
+    def __init__(self, seg_layer, roi_layer, roi_field, svm_dict,
+                 sampling='vector', majority=0.5, overlap=0.0,
+                 model_file='', model_dir=None, chunk_size=50000, workers=1,
+                 target=None, engine='svc', search=None,
+                 cache_size=spatial.CACHE_SIZE):
         util.Worker.__init__(self)
         self.seg_layer = seg_layer
         self.roi_layer = roi_layer
         self.roi_field = roi_field
         self.svm_dict = svm_dict
+        self.sampling = sampling
+        self.majority = majority
+        self.overlap = overlap
+        self.model_file = model_file
+        self.model_dir = model_dir
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.target = target
+        self.engine = engine
+        self.search = search
+        self.search_results = None
+        self.cache = spatial.GeometryCache(cache_size)
 
-    @util.error_handler
-    def run(self):
-        roi_data = []
-        seg_data = []
+    def load_segments(self):
+        """Read the segments layer once: fids, segment ids (first attribute),
+        the features as a float matrix with their names, and a bulk loaded
+        index of the bounding boxes, all in layer order. Geometries are kept
+        in the geometry cache, up to its size.
 
-        provider_roi = self.roi_layer.dataProvider()
+        Features come from the feature store written by the statistics,
+        when there is one, or else from the other attributes.
+        """
         provider_seg = self.seg_layer.dataProvider()
+        feat_count = max(provider_seg.featureCount(), 1)
+        step = max(feat_count // 100, 1)
+        stored = store.load(store.store_path(self.seg_layer.source()))
+        request = QgsFeatureRequest()
+        if stored is not None:
+            request.setSubsetOfAttributes([0])
+        fids, rows, boxes = [], [], []
+        for n_iter, feat in enumerate(provider_seg.getFeatures(request)):
+            fids.append(feat.id())
+            attributes = feat.attributes()
+            if stored is not None:
+                # the segment id only
+                attributes = attributes[:1]
+            rows.append(attributes)
+            geom = feat.geometry()
+            if geom is None or geom.isGeosEmpty():
+                boxes.append((np.nan,) * 4)
+            else:
+                box = geom.boundingBox()
+                boxes.append((box.xMinimum(), box.yMinimum(),
+                              box.xMaximum(), box.yMaximum()))
+                # copy, the feature owns its geometry
+                self.cache.put(feat.id(), QgsGeometry(geom))
+            if n_iter % step == 0:
+                self.calculate_progress(n_iter, feat_count, 0, 15)
+        fids = np.array(fids, dtype=np.int64)
+        attributes = spatial.float_columns(rows)
+        index = spatial.BoxIndex(boxes)
+        if stored is None:
+            names = [f.name() for f in provider_seg.fields()][1:]
+            return fids, attributes[:, 0], attributes[:, 1:], index, names
+        data, manifest = stored
+        ids = attributes[:, 0]
+        start = time.time()
+        seg_data = store.lookup(data, ids)
+        provenance = manifest['provenance']
+        self.log.emit('features of %s segments read from the feature store '
+                      'in %.2fs (%s, written %s)' % (
+                        len(ids), time.time() - start,
+                        os.path.basename(provenance.get('raster', '')),
+                        time.strftime('%Y-%m-%d %H:%M',
+                                      time.localtime(manifest['written']))))
+        return fids, ids, seg_data, index, manifest['names']
 
-        feat_seg = QgsFeature()
+    def load_rois(self):
+        """(geometry, class) of every roi with a geometry."""
+        provider_roi = self.roi_layer.dataProvider()
+        # -1, the last attribute, when no class field is set
+        field = provider_roi.fieldNameIndex(self.roi_field)
+        rois = []
+        for feat in provider_roi.getFeatures():
+            geom = feat.geometry()
+            if geom is not None:
+                rois.append((QgsGeometry(geom), feat.attributes()[field]))
+        return rois
 
-        self.status.emit('building spatial index')
-        time.sleep(0.3)
-        index = QgsSpatialIndex()
-        piter = 0
-        feat_count = provider_seg.featureCount()
-        for f in provider_seg.getFeatures():
-            seg_data.append(f.attributes()[1:])
-            index.insertFeature(f)
-            piter += 1
-            self.progress.emit(piter * 15 / feat_count)
-
-
-        self.status.emit('extracting attributes')
-        self.log.emit('extracting attributes from roi segments intersection')
-        time.sleep(0.3)
-        # intersect roi with segments and extract attributes
-        piter = 0
-        feat_count = provider_roi.featureCount()
-        for feat_roi in provider_roi.getFeatures():
-            geom = feat_roi.geometry()
-            attr_roi = feat_roi.attributes()
-            intersects = index.intersects(geom.boundingBox())
-            for fid in intersects:
-                ffilter = QgsFeatureRequest().setFilterFid(int(fid))
-                provider_seg.getFeatures(ffilter).nextFeature(feat_seg)
+    def candidates(self, rows, fids):
+        """Yield (row, geometry) of the segments at `rows`, from the cache
+        or, for those missing, from a single request."""
+        missing = {}
+        for row in rows:
+            fid = int(fids[row])
+            geom = self.cache.get(fid)
+            if geom is None:
+                missing[fid] = row
+            else:
+                yield row, geom
+        if not missing:
+            return
+        request = QgsFeatureRequest().setFilterFids(missing.keys())
+        request.setSubsetOfAttributes([])
+        for feat in self.seg_layer.dataProvider().getFeatures(request):
+            geom = feat.geometry()
+            if geom is not None:
+                geom = QgsGeometry(geom)
+                self.cache.put(feat.id(), geom)
+                yield missing[feat.id()], geom
+
+    def vector_samples(self, rois, fids, index):
+        """(segment rows, classes) of every roi/segment pair whose
+        geometries intersect."""
+        rows, labels = [], []
+        n_pairs = 0
+        start = time.time()
+        for piter, (geom, label) in enumerate(rois):
+            intersects = prepared(geom)
+            box = geom.boundingBox()
+            candidates = index.intersects(box.xMinimum(), box.yMinimum(),
+                                          box.xMaximum(), box.yMaximum())
+            for row, seg_geom in self.candidates(candidates, fids):
                 # filter geometries that does not intersect
-                if geom.intersects(feat_seg.geometry()):
-                    attr_seg = feat_seg.attributes()
-                    roi_data.append(attr_seg[1:] + attr_roi)
-            # emit progress
-            piter += 1
-            self.progress.emit(15 + (piter * 55 / feat_count))
-
-        # read train data
-        roi_data = np.array(roi_data)
-        samples = roi_data[:,:-1]
-        labels = roi_data[:,-1].astype(int)
-        # svm fit and predict
-        self.status.emit('svm: fitting data')
-        time.sleep(0.3)
-        classifier = svm.SVC(**self.svm_dict)
-        classifier.fit(preprocessing.scale(samples), labels)
+                if intersects(seg_geom):
+                    rows.append(row)
+                    labels.append(label)
+            n_pairs += len(candidates)
+            self.calculate_progress(piter + 1, len(rois), 15, 55)
+        elapsed = max(time.time() - start, 1e-6)
+        self.log.emit('%s roi/segment pairs tested in %.2fs (%.0f/s), '
+                      'geometry cache: %s hits, %s misses' % (
+                        n_pairs, elapsed, n_pairs / elapsed,
+                        self.cache.hits, self.cache.misses))
+        return rows, labels
+
+    def raster_samples(self, rois, fids, ids):
+        """(segment rows, classes) of the segments whose pixels are mostly
+        covered by rois of one class, from the rois rasterized on the grid
+        of the segment label raster. None if there is no such raster or if
+        aborted."""
+        vector_file, layer = vectorize.split_source(self.seg_layer.source())
+        labels_file = vectorize.sibling_raster(vector_file, layer=layer)
+        if labels_file is None or not rois:
+            return None
+
+        def progress(fraction):
+            self.calculate_progress(int(fraction * 100), 100, 15, 45)
+            return not self.abort
+
+        start = time.time()
+        result = pipeline.roi_labels(labels_file,
+                                     [(g.asWkb(), label) for g, label in rois],
+                                     self.majority, self.overlap,
+                                     self.roi_layer.crs().toWkt(),
+                                     progress=progress)
+        if result is None:
+            return None
+        zones, labels, share, cover = result
+        # rows of the segments, by id
+        order = np.argsort(ids, kind='mergesort')
+        pos = np.minimum(np.searchsorted(ids[order], zones),
+                         max(len(ids) - 1, 0))
+        found = ids[order][pos] == zones
+        rows = order[pos[found]]
+        labels = labels[found]
+        self.log.emit('%s segments labelled from %s in %.2fs, majority share '
+                      '%.2f, roi cover %.2f on average' % (
+                        len(rows), os.path.basename(labels_file),
+                        time.time() - start, share.mean() if len(share) else 0,
+                        cover.mean() if len(cover) else 0))
+        self.agreement(rois, fids, rows, labels)
+        self.progress.emit(70)
+        return rows.tolist(), labels.tolist()
+
+    def agreement(self, rois, fids, rows, labels):
+        """Log how many of (a sample of) the segments labelled by the roi
+        raster intersect a roi of the same class."""
+        if not len(rows):
+            return
+        step = max(len(rows) // AGREEMENT_SAMPLE, 1)
+        sample = dict(zip(rows[::step], labels[::step]))
+        roi_index = spatial.BoxIndex([
+            (b.xMinimum(), b.yMinimum(), b.xMaximum(), b.yMaximum())
+            for b in (geom.boundingBox() for geom, _ in rois)])
+        agree = 0
+        for row, seg_geom in self.candidates(sorted(sample), fids):
+            box = seg_geom.boundingBox()
+            hits = roi_index.intersects(box.xMinimum(), box.yMinimum(),
+                                        box.xMaximum(), box.yMaximum())
+            agree += any(rois[i][1] == sample[row] and
+                         rois[i][0].intersects(seg_geom) for i in hits)
+        self.log.emit('agreement with the vector path: %.1f%% of %s '
+                      'sampled segments' % (100.0 * agree / len(sample),
+                                            len(sample)))
+
+    @util.error_handler
+    def run(self):
+        self.status.emit('building spatial index')
+        start = time.time()
+        fids, ids, seg_data, index, names = self.load_segments()
+        self.log.emit('%s segments loaded and indexed in %.2fs' % (
+                        len(fids), time.time() - start))
+        self.progress.emit(15)
+
+        if self.search:
+            self.search_results = self.tune(fids, ids, seg_data, index)
+            if self.search_results is None:
+                self.finished.emit(False, 'Terminated.')
+                return
+            self.progress.emit(100)
+            self.output = ''
+            return
+        if self.model_file:
+            model = models.load(self.model_file)
+            model.check(names)
+            self.log.emit('applying saved model %s' % self.model_file)
+        else:
+            model = self.train(fids, ids, seg_data, index, names)
+            if model is None:
+                self.finished.emit(False, 'Terminated.')
+                return
         self.progress.emit(85)
 
-        self.status.emit('svm: predicting labels')
-        time.sleep(0.3)
-        seg_data = preprocessing.scale(seg_data)
-        predictions = classifier.predict(seg_data).tolist()
+        self.status.emit('%s: predicting labels' % model.engine)
+        if isinstance(self.target, basestring):
+            max_id = len(ids) and np.nanmax(ids) or 0
+            output = GeoPackageOutput(self.target,
+                                      self.seg_layer.crs().toWkt(), max_id)
+        else:
+            output = MemoryOutput(self.target)
+
+        def write(rows, chunk):
+            # geometries of the chunk, cached or in a single request
+            labels = dict(zip(rows, chunk))
+            output.add([(segment_id(ids[row]), geom, class_value(labels[row]))
+                        for row, geom in self.candidates(rows, fids)])
+
+        try:
+            if not self.predict(model, seg_data, write):
+                self.finished.emit(False, 'Terminated.')
+                return
+        finally:
+            filename = output.close()
         self.progress.emit(100)
 
-        self.output = pickle.dumps(predictions)
+        self.output = filename
+
+    def predict(self, model, seg_data, write):
+        """Predict the segments by chunks in the worker pool, handing each
+        chunk to write(rows, predictions) as soon as it is done, in order.
+        Segments without features (no valid pixels, NULL fields) are not
+        predicted: they are handed over last, with None predictions. False
+        if aborted."""
+        start = time.time()
+        valid = np.isfinite(seg_data).all(axis=1)
+        rows = np.flatnonzero(valid)
+        features = seg_data
+        if len(rows) < len(seg_data):
+            features = seg_data[rows]
+        chunks = models.predict_chunks(model, features, self.chunk_size,
+                                       self.workers)
+        try:
+            for first, chunk in chunks:
+                write(rows[first:first+len(chunk)], chunk)
+                done = first + len(chunk)
+                self.calculate_progress(done, max(len(rows), 1), 85, 15)
+                if self.abort:
+                    return False
+        finally:
+            chunks.close()
+        self.log.emit('%s segments predicted by %s in %.2fs, %s workers' % (
+                        len(rows), model.engine, time.time() - start,
+                        pools.workers(self.workers, threads=True)))
+        missing = np.flatnonzero(~valid)
+        if len(missing):
+            self.log.emit('%s segments without features left unclassified'
+                          % len(missing))
+        for first in range(0, len(missing), self.chunk_size):
+            rows = missing[first:first+self.chunk_size]
+            write(rows, [None] * len(rows))
+        return True
+
+    def samples(self, fids, ids, seg_data, index):
+        """(samples, labels) of the segments under the rois. None if
+        aborted."""
+        rois = self.load_rois()
+        samples = None
+        if self.sampling == 'raster':
+            self.status.emit('rasterizing rois')
+            samples = self.raster_samples(rois, fids, ids)
+            if self.abort:
+                return None
+            if samples is None:
+                self.log.emit('no segment raster matching the segments '
+                              'layer next to it, extracting samples by '
+                              'vector intersection')
+        if samples is None:
+            self.status.emit('extracting attributes')
+            self.log.emit('extracting attributes from roi segments '
+                          'intersection')
+            samples = self.vector_samples(rois, fids, index)
+
+        # read train data, without the segments lacking features (no valid
+        # pixels, NULL fields)
+        rows, labels = samples
+        data = seg_data[rows]
+        valid = np.isfinite(data).all(axis=1)
+        if not valid.all():
+            self.log.emit('%s samples without features left out' %
+                          (len(valid) - valid.sum()))
+        return data[valid], np.array(labels).astype(int)[valid]
+
+    def train(self, fids, ids, seg_data, index, names):
+        """Model of the roi samples, the one saved by a previous run with
+        the same samples and parameters if any. None if aborted."""
+        samples = self.samples(fids, ids, seg_data, index)
+        if samples is None:
+            return None
+        samples, labels = samples
+        # svm fit
+        self.status.emit('%s: fitting data' % self.engine)
+        model, reused = models.fit_or_load(samples, labels, self.svm_dict,
+                                           names, self.model_dir,
+                                           self.engine, self.workers)
+        if reused:
+            self.log.emit('training samples unchanged, reusing model %s' %
+                          models.model_filename(self.model_dir, model.key))
+        else:
+            self.log.emit('%s fit on %s samples in %.2fs' % (
+                            self.engine, len(samples), model.fit_time))
+            if self.model_dir:
+                self.log.emit('model saved as %s' % models.model_filename(
+                                self.model_dir, model.key))
+        return model
+
+    def tune(self, fids, ids, seg_data, index):
+        """Cross validated accuracy of the parameter sets of the search,
+        best first (see models.search). None if aborted."""
+        samples = self.samples(fids, ids, seg_data, index)
+        if samples is None:
+            return None
+        samples, labels = samples
+        names = models.search_params(self.engine, self.svm_dict)
+        candidates = models.search_candidates(self.svm_dict, names,
+                                              self.search)
+        self.status.emit('%s: searching %s' % (self.engine, ', '.join(names)))
+
+        def progress(fraction):
+            self.calculate_progress(int(fraction * 100), 100, 70, 30)
+            return not self.abort
 
+        start = time.time()
+        results = models.search(samples, labels, self.engine, candidates,
+                                workers=self.workers, progress=progress)
+        if results is None:
+            return None
+        n_fits = sum(len(r['scores']) for r in results)
+        n_folds = len(results[0]['scores'])
+        self.log.emit('%s parameter sets cross validated on %s samples in '
+                      '%.2fs, %s of %s fits stopped early, %s workers' % (
+                        len(results), len(samples), time.time() - start,
+                        len(results) * n_folds - n_fits,
+                        len(results) * n_folds,
+                        pools.workers(self.workers, threads=True)))
+        for r in results:
+            self.log.emit('%s: accuracy %.3f (%.3f), %s folds, fit %.2fs' % (
+                            ', '.join('%s %s' % (name, r['params'][name])
+                                      for name in names),
+                            r['score'], r['std'], len(r['scores']),
+                            r['fit_time']))
+        return results
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# K-Means fitting on the whole image, on a pixel sample or by mini-batches
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+import tiles
+
+# full: k-means over every pixel (original behaviour)
+# sample: k-means over a random pixel sample
+# minibatch: mini-batch k-means over a random pixel sample
+METHODS = ['full', 'sample', 'minibatch']
+
+
+def sample_index(n_pixels, n_samples, seed=None):
+    """Sorted random pixel indices to fit on, or None to use every pixel.
+
+    Indices are drawn with replacement and deduplicated, so slightly less
+    than `n_samples` may be returned, without ever allocating an array the
+    size of the image.
+    """
+    if not n_samples or n_samples >= n_pixels:
+        return None
+    rng = np.random.RandomState(seed)
+    return np.unique(rng.randint(0, n_pixels, int(n_samples)))
+
+
+def iter_samples(ds, rows, index=None, dtype=np.float32):
+    """Yield, strip by strip, the (pixels, bands) matrix of the pixels in
+    `index` (all of them if None)."""
+    cols = ds.RasterXSize
+    for yoff, ysize, pixels in tiles.iter_pixels(ds, rows, dtype):
+        if index is not None:
+            lo, hi = np.searchsorted(index, [yoff*cols, (yoff+ysize)*cols])
+            pixels = pixels[index[lo:hi] - yoff*cols]
+        yield pixels
+
+
+def make_kmeans(n_clusters, method='full', n_init=10, seed=None):
+    if method not in METHODS:
+        raise ValueError('unknown clustering method: %s' % method)
+    cls = method == 'minibatch' and MiniBatchKMeans or KMeans
+    return cls(n_clusters=int(n_clusters), init='k-means++',
+               n_init=int(n_init), random_state=seed)
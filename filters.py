@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Array level filters for label rasters
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis, so it can be used (and
+# benchmarked) outside of QGIS.
+
+import numpy as np
+from scipy import ndimage
+
+
+def _row_modes(values):
+    """Mode of each row of a 2d array, ties resolved to the smallest value
+    (same as scipy.stats.mode)."""
+    s = np.sort(values, axis=1)
+    n, m = s.shape
+    k = np.arange(m)
+    # first and last position of the run each element belongs to
+    starts = np.ones((n, m), dtype=bool)
+    starts[:, 1:] = s[:, 1:] != s[:, :-1]
+    ends = np.ones((n, m), dtype=bool)
+    ends[:, :-1] = s[:, :-1] != s[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, k, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, k, m-1)[:, ::-1],
+                                 axis=1)[:, ::-1]
+    # argmax returns the first maximum, i.e. the smallest value
+    best = np.argmax(last - first, axis=1)
+    return s[np.arange(n), best]
+
+
+def iter_mode_filter(labels, size=3):
+    """Sequential (in place) mode filter, as a generator.
+
+    Reproduces exactly a raster scan that replaces each interior pixel by
+    the mode of its size x size window, where pixels above and to the left
+    were already replaced. Pixels are processed in wavefronts
+    (r+1)*i + j = t, which have no dependency among themselves, so each
+    wavefront is a single array operation.
+
+    `labels` is modified in place. Yields (step, total_steps) after each
+    wavefront, so the caller can report progress or stop early.
+    """
+    r = size // 2
+    rows, cols = labels.shape
+    if rows <= 2*r or cols <= 2*r:
+        return
+    flat = labels.reshape(-1)
+    if not np.may_share_memory(flat, labels):
+        raise ValueError('labels must be a contiguous array')
+    dy, dx = np.mgrid[-r:r+1, -r:r+1]
+    offsets = (dy * cols + dx).ravel()
+    first = (r+1) * r + r
+    last = (r+1) * (rows-r-1) + (cols-r-1)
+    total = last - first + 1
+    for t in range(first, last + 1):
+        i_lo = max(r, (t - cols + r) // (r+1) + 1)
+        i_hi = min(rows - r - 1, (t - r) // (r+1))
+        if i_lo <= i_hi:
+            i = np.arange(i_lo, i_hi + 1)
+            center = i * cols + (t - (r+1) * i)
+            flat[center] = _row_modes(flat[center[:, None] + offsets])
+        yield t - first + 1, total
+
+
+def iter_mode_filter_strip(above, strip, below, size=3):
+    """iter_mode_filter of a strip of rows, as a generator.
+
+    The raster scan only looks r = size // 2 rows around each pixel, so
+    given the r rows `above` the strip, already filtered, and the r rows
+    `below` it, not yet filtered (fewer at the image borders only),
+    filtering the strips of an image top to bottom reproduces
+    iter_mode_filter of the whole image exactly.
+
+    `strip` is modified in place. Yields (step, total_steps).
+    """
+    buf = np.concatenate([above, strip, below])
+    for step in iter_mode_filter(buf, size):
+        yield step
+    strip[:] = buf[len(above):len(above)+len(strip)]
+
+
+def iter_majority_filter(labels, size=3):
+    """Simultaneous mode filter, as a generator.
+
+    Every interior pixel is replaced by the mode of its size x size window
+    on the *input* array, computed from per class neighbourhood counts, one
+    box sum per class. Ties are resolved to the smallest class. Border
+    pixels are left untouched.
+
+    `labels` is modified in place. Yields (step, total_steps) after each
+    class.
+    """
+    r = size // 2
+    rows, cols = labels.shape
+    if rows <= 2*r or cols <= 2*r:
+        return
+    classes = np.unique(labels)
+    best = labels.copy()
+    best_count = np.zeros(labels.shape, dtype=np.int32)
+    weights = np.ones((size, size), dtype=np.int32)
+    for step, c in enumerate(classes):
+        count = ndimage.correlate((labels == c).astype(np.int32), weights,
+                                  mode='constant', cval=0)
+        better = count > best_count
+        best[better] = c
+        best_count[better] = count[better]
+        yield step + 1, len(classes)
+    labels[r:-r, r:-r] = best[r:-r, r:-r]
+
+
+def mode_filter(labels, size=3, sequential=True):
+    """Apply a size x size mode filter on `labels`, in place.
+
+    With `sequential` set, replicates the original per pixel raster scan
+    (already filtered pixels feed the following windows), otherwise every
+    window is computed on the unfiltered input.
+    """
+    fn = sequential and iter_mode_filter or iter_majority_filter
+    for _ in fn(labels, size):
+        pass
+    return labels
+
+
+def segment_dtype(n_segments):
+    """Smallest signed integer type holding `n_segments` segment ids."""
+    return n_segments < 2**31 and np.int32 or np.int64
+
+
+def _neighbour_pairs(a, b, connectivity):
+    """Flat indices (ia, ib) of equal valued neighbours between row blocks a
+    and b, where b is a shifted one row below a (same shape)."""
+    idx = np.arange(a.size).reshape(a.shape)
+    pairs = [(idx, idx, a == b)]
+    if connectivity == 8:
+        pairs.append((idx[:, :-1], idx[:, 1:], a[:, :-1] == b[:, 1:]))
+        pairs.append((idx[:, 1:], idx[:, :-1], a[:, 1:] == b[:, :-1]))
+    ia = np.concatenate([i[m] for i, _, m in pairs])
+    ib = np.concatenate([j[m] for _, j, m in pairs])
+    return ia, ib
+
+
+def _components(n, ia, ib):
+    """Connected components of the graph with n nodes and edges ia-ib."""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    graph = coo_matrix((np.ones(len(ia), dtype=bool), (ia, ib)),
+                       shape=(n, n))
+    return connected_components(graph, directed=False)
+
+
+def _strip_components(strip, connectivity):
+    """(n, components) of a strip: its regions of equal value, numbered
+    0..n-1."""
+    # edges inside the strip: right neighbour + row below (+ diagonals)
+    ia, ib = _neighbour_pairs(strip[:-1], strip[1:], connectivity)
+    ib += strip.shape[1]
+    right = strip[:, :-1] == strip[:, 1:]
+    idx = np.arange(strip.size).reshape(strip.shape)
+    ia = np.concatenate([ia, idx[:, :-1][right]])
+    ib = np.concatenate([ib, idx[:, 1:][right]])
+    n, comp = _components(strip.size, ia, ib)
+    return n, comp.reshape(strip.shape)
+
+
+def iter_label_components(labels, out, connectivity=4, rows=1024):
+    """Label connected regions of equal value, as a generator.
+
+    Every connected region of pixels sharing the same label gets a unique
+    id, 1..n, written in `out` (see segment_dtype). This gives the same
+    partition as running ndimage.label once per label value, in a single
+    pass: strips of `rows` rows are labelled as a graph of equal valued
+    neighbours, and regions crossing strip seams are merged at the end.
+
+    Yields (step, total_steps).
+    """
+    if connectivity not in (4, 8):
+        raise ValueError('connectivity must be 4 or 8')
+    n_rows = labels.shape[0]
+    n_strips = (n_rows + rows - 1) // rows
+    total = n_strips + 1
+    seam_a = []
+    seam_b = []
+    offset = 0
+    for step, yoff in enumerate(range(0, n_rows, rows)):
+        strip = labels[yoff:yoff+rows]
+        n, comp = _strip_components(strip, connectivity)
+        out[yoff:yoff+rows] = comp + (offset + 1)
+        # edges across the seam with the previous strip
+        if yoff:
+            ia, ib = _neighbour_pairs(labels[yoff-1:yoff], strip[:1],
+                                      connectivity)
+            seam_a.append(out[yoff-1][ia])
+            seam_b.append(out[yoff][ib])
+        offset += n
+        yield step + 1, total
+    if seam_a:
+        # merge regions split by the seams, renumbering 1..n
+        n, roots = _components(offset, np.concatenate(seam_a) - 1,
+                               np.concatenate(seam_b) - 1)
+        lut = np.zeros(offset + 1, dtype=out.dtype)
+        lut[1:] = roots + 1
+        for yoff in range(0, n_rows, rows):
+            out[yoff:yoff+rows] = lut[out[yoff:yoff+rows]]
+    yield total, total
+
+
+class StripLabels(object):
+    """Connected regions of equal value of an image read strip by strip, top
+    to bottom, as iter_label_components finds them without holding the
+    image: add() numbers the regions of each strip, provisional ids unique
+    across strips, and lut() then maps those to the final ids 1..n,
+    merging the regions split by the seams."""
+
+    def __init__(self, connectivity=4):
+        if connectivity not in (4, 8):
+            raise ValueError('connectivity must be 4 or 8')
+        self.connectivity = connectivity
+        # provisional ids given so far
+        self.count = 0
+        # last row of the previous strip, and its ids
+        self.last = None
+        self.seam_a = []
+        self.seam_b = []
+
+    def add(self, strip, dtype=np.int64):
+        """Provisional ids of the pixels of the next strip."""
+        n, comp = _strip_components(strip, self.connectivity)
+        ids = comp.astype(dtype) + (self.count + 1)
+        if self.last is not None:
+            values, last_ids = self.last
+            ia, ib = _neighbour_pairs(values, strip[:1], self.connectivity)
+            self.seam_a.append(last_ids[ia])
+            self.seam_b.append(ids[0][ib])
+        self.last = strip[-1:].copy(), ids[-1].copy()
+        self.count += n
+        return ids
+
+    def lut(self, dtype=np.int64):
+        """(lut, n): the final id of each provisional one, 0 kept as 0, and
+        the number of regions."""
+        lut = np.zeros(self.count + 1, dtype=dtype)
+        if not self.seam_a:
+            lut[1:] = np.arange(1, self.count + 1)
+            return lut, self.count
+        n, roots = _components(self.count, np.concatenate(self.seam_a) - 1,
+                               np.concatenate(self.seam_b) - 1)
+        lut[1:] = roots + 1
+        return lut, n
+
+
+def label_components(labels, connectivity=4, rows=1024):
+    """Returns (segments, n_segments), see iter_label_components."""
+    out = np.empty(labels.shape, dtype=segment_dtype(labels.size))
+    for _ in iter_label_components(labels, out, connectivity, rows):
+        pass
+    return out, out.size and int(out.max()) or 0
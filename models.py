@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Fitted classifiers, with their scaler, saved across runs
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+import hashlib
+import os
+import pickle
+import time
+from collections import deque
+
+import numpy as np
+import sklearn
+from sklearn import ensemble
+from sklearn import kernel_approximation
+from sklearn import linear_model
+from sklearn import pipeline
+from sklearn import preprocessing
+from sklearn import svm
+
+import pools
+
+# classifier engines, by name as shown on the SVM tab:
+# - svc: kernel SVM (libsvm), fit time about quadratic in the samples
+# - linear: linear SVM (liblinear)
+# - sgd: linear SVM fit by stochastic gradient descent
+# - forest: random forest, fit and predicted on n_jobs cores
+# - rff: linear SVM on random Fourier features approximating the RBF
+#   kernel
+ENGINES = [('svc', 'SVC'), ('linear', 'Linear SVM'), ('sgd', 'SGD'),
+           ('forest', 'Random Forest'), ('rff', 'RBF Features')]
+# parameters of each engine, the rest are ignored
+ENGINE_PARAMS = {
+    'svc': ['kernel', 'C', 'gamma', 'degree', 'coef0'],
+    'linear': ['C'],
+    'sgd': ['C'],
+    'forest': ['n_estimators'],
+    'rff': ['C', 'gamma', 'n_components'],
+}
+FOREST_TREES = 100
+RFF_COMPONENTS = 1000
+
+# parameters the search varies, those set on the SVM tab; for SVC they
+# depend on the kernel
+SEARCH_PARAMS = {
+    'svc': {'linear': ['C'], 'rbf': ['C', 'gamma'],
+            'poly': ['C', 'degree', 'coef0'], 'sigmoid': ['C', 'coef0']},
+    'linear': ['C'],
+    'sgd': ['C'],
+    'forest': [],
+    'rff': ['C', 'gamma'],
+}
+# values of the grid search, a gamma of 0 being 1 / n_features
+SEARCH_GRID = {
+    'C': [0.1, 1.0, 10.0, 100.0, 1000.0],
+    'gamma': [0.0, 0.01, 0.1, 1.0, 10.0],
+    'degree': [2, 3, 4],
+    'coef0': [0.0, 0.5, 1.0],
+}
+# log10 range of C and gamma in the random search; values are rounded to
+# the decimals of the SVM tab inputs, so the best can be written back
+SEARCH_RANGES = {'C': (-1, 3), 'gamma': (-2, 1)}
+SEARCH_DECIMALS = {'C': 1, 'gamma': 3, 'coef0': 1}
+SEARCH_FOLDS = 5
+SEARCH_ITERATIONS = 20
+# candidates whose mean accuracy falls this far behind the best one are
+# not evaluated on the remaining folds
+SEARCH_TOLERANCE = 0.05
+
+
+def engine_params(engine, params):
+    """The parameters of `params` that `engine` uses, with defaults."""
+    defaults = {'n_estimators': FOREST_TREES, 'n_components': RFF_COMPONENTS}
+    return dict((k, params.get(k, defaults.get(k)))
+                for k in ENGINE_PARAMS[engine])
+
+
+def make_classifier(engine, params, n_samples, n_features, n_jobs=1):
+    """Unfitted scikit-learn classifier of an engine. A gamma of 0 is
+    1 / n_features."""
+    gamma = params.get('gamma') or 1.0 / max(n_features, 1)
+    if engine == 'svc':
+        return svm.SVC(**dict(params, gamma=gamma))
+    if engine == 'linear':
+        return svm.LinearSVC(C=params['C'], dual=n_samples <= n_features)
+    if engine == 'sgd':
+        alpha = 1.0 / (params['C'] * max(n_samples, 1))
+        return linear_model.SGDClassifier(loss='hinge', alpha=alpha,
+                                          random_state=0)
+    if engine == 'forest':
+        return ensemble.RandomForestClassifier(
+            n_estimators=params['n_estimators'], n_jobs=n_jobs,
+            random_state=0)
+    if engine == 'rff':
+        return pipeline.make_pipeline(
+            kernel_approximation.RBFSampler(
+                gamma=gamma, n_components=params['n_components'],
+                random_state=0),
+            svm.LinearSVC(C=params['C'], dual=False))
+    raise ValueError('unknown classifier engine %s' % engine)
+
+
+def training_key(samples, labels, params, names, engine='svc'):
+    """Hash of the training samples, their labels, the classifier engine
+    and parameters and the feature names: models with the same key are the
+    same fit."""
+    digest = hashlib.sha1()
+    for a in (samples, labels):
+        a = np.ascontiguousarray(a)
+        digest.update(repr((a.dtype.str, a.shape)).encode('utf-8'))
+        digest.update(a.tobytes())
+    digest.update(repr((engine, sorted(params.items()))).encode('utf-8'))
+    digest.update(repr(list(names)).encode('utf-8'))
+    digest.update(sklearn.__version__.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Model(object):
+    """A classifier with the scaler of its training samples, applied the
+    same way to any segments with the same features."""
+
+    def __init__(self, params, names, key=None, engine='svc'):
+        self.engine = engine
+        self.params = engine_params(engine, params)
+        self.names = list(names)
+        self.key = key
+        self.scaler = None
+        self.classifier = None
+        self.fit_time = None
+
+    def fit(self, samples, labels, n_jobs=1):
+        start = time.time()
+        self.scaler = preprocessing.StandardScaler().fit(samples)
+        self.classifier = make_classifier(self.engine, self.params,
+                                          len(samples), samples.shape[1],
+                                          n_jobs)
+        self.classifier.fit(self.scaler.transform(samples), labels)
+        self.fit_time = time.time() - start
+        return self
+
+    def check(self, names):
+        """Raise ValueError unless `names` are the training features."""
+        if list(names) != self.names:
+            raise ValueError('segment fields %s do not match the fields the '
+                             'model was trained on, %s' % (list(names),
+                                                           self.names))
+
+    def predict(self, data):
+        return self.classifier.predict(self.scaler.transform(data))
+
+
+def model_filename(model_dir, key):
+    return os.path.join(model_dir, 'model_%s.pkl' % key)
+
+
+def save(model, filename):
+    """Pickle a model, through a temporary file so readers never see a
+    partial one. Its state is saved as a dict, so the file does not depend
+    on the name this module is imported as (within the plugin package or
+    not)."""
+    folder = os.path.dirname(filename)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    part = filename + '.part'
+    with open(part, 'wb') as f:
+        pickle.dump(model.__dict__, f, pickle.HIGHEST_PROTOCOL)
+    if os.path.exists(filename):
+        os.remove(filename)
+    os.rename(part, filename)
+
+
+def from_state(state):
+    model = Model(state['params'], state['names'],
+                  engine=state.get('engine', 'svc'))
+    model.__dict__.update(state)
+    return model
+
+
+def load(filename):
+    with open(filename, 'rb') as f:
+        return from_state(pickle.load(f))
+
+
+def fit_or_load(samples, labels, params, names, model_dir=None,
+                engine='svc', n_jobs=1):
+    """(model, reused): the model saved in `model_dir` for these samples,
+    engine and parameters or, if there is none, a new fit, saved there."""
+    params = engine_params(engine, params)
+    key = training_key(samples, labels, params, names, engine)
+    filename = model_dir and model_filename(model_dir, key)
+    if filename and os.path.isfile(filename):
+        return load(filename), True
+    model = Model(params, names, key, engine).fit(samples, labels, n_jobs)
+    if filename:
+        save(model, filename)
+    return model, False
+
+
+# model of each prediction pool process
+_model = None
+
+
+def _init_predict(state):
+    global _model
+    _model = from_state(state)
+    if hasattr(_model.classifier, 'n_jobs'):
+        # parallel over the pool already
+        _model.classifier.n_jobs = 1
+
+
+def _predict_chunk(data):
+    return _model.predict(data)
+
+
+def predict_chunks(model, data, chunk_size=50000, workers=1):
+    """Yield (start, predictions) for consecutive chunks of `chunk_size`
+    rows of `data`, in order, as soon as each is done.
+
+    Chunks are predicted in a pool of `workers` processes, each holding a
+    copy of the model, or threads inside QGIS (libsvm and liblinear release
+    the GIL while predicting, see pools); in this thread when 1. At most two
+    chunks per worker are queued at a time, so memory stays bounded by the
+    chunk size, and closing the generator stops the pool.
+    """
+    starts = range(0, len(data), max(int(chunk_size), 1))
+    pool = pools.pool(workers, _init_predict, (model.__dict__,),
+                      threads=True)
+    if pool is None:
+        for start in starts:
+            yield start, model.predict(data[start:start+chunk_size])
+        return
+    pending = deque()
+    try:
+        for start in starts:
+            chunk = np.ascontiguousarray(data[start:start+chunk_size])
+            pending.append((start, pool.apply_async(_predict_chunk,
+                                                    (chunk,))))
+            if len(pending) >= 2 * workers:
+                start, result = pending.popleft()
+                yield start, result.get()
+        while pending:
+            start, result = pending.popleft()
+            yield start, result.get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def search_params(engine, params):
+    """Names of the parameters of `params` the search varies."""
+    names = SEARCH_PARAMS[engine]
+    if engine == 'svc':
+        names = names[params['kernel']]
+    return list(names)
+
+
+def search_candidates(params, names, mode='grid', n_iter=SEARCH_ITERATIONS,
+                      seed=0):
+    """Parameter sets varying `names`, the rest of `params` fixed: every
+    combination of the SEARCH_GRID values (grid), or `n_iter` of them drawn
+    at random, log uniformly for C and gamma (random)."""
+    if mode == 'grid':
+        combinations = [[]]
+        for name in names:
+            combinations = [c + [(name, v)] for c in combinations
+                            for v in SEARCH_GRID[name]]
+        return [dict(params, **dict(c)) for c in combinations]
+    rng = np.random.RandomState(seed)
+    candidates = []
+    for _ in range(n_iter):
+        candidate = dict(params)
+        for name in names:
+            if name in SEARCH_RANGES:
+                value = 10 ** rng.uniform(*SEARCH_RANGES[name])
+                decimals = SEARCH_DECIMALS[name]
+                value = max(round(value, decimals), 10 ** -decimals)
+            elif name == 'coef0':
+                value = round(rng.uniform(0, 1), SEARCH_DECIMALS[name])
+            else:
+                value = SEARCH_GRID[name][rng.randint(len(SEARCH_GRID[name]))]
+            candidate[name] = value
+        candidates.append(candidate)
+    return candidates
+
+
+def scaled_folds(samples, labels, n_folds=SEARCH_FOLDS, seed=0):
+    """(train samples, train labels, test samples, test labels) of each of
+    `n_folds` stratified folds, scaled by a StandardScaler fit on the train
+    samples of the fold, as the Model does."""
+    labels = np.asarray(labels)
+    rng = np.random.RandomState(seed)
+    fold_of = np.empty(len(labels), dtype=np.int64)
+    for label in np.unique(labels):
+        rows = rng.permutation(np.flatnonzero(labels == label))
+        # class rows dealt in turn to the folds, from a random one
+        fold_of[rows] = (np.arange(len(rows)) + rng.randint(n_folds)) % n_folds
+    folds = []
+    for fold in range(n_folds):
+        test = fold_of == fold
+        if test.all() or not test.any():
+            continue
+        scaler = preprocessing.StandardScaler().fit(samples[~test])
+        folds.append((scaler.transform(samples[~test]), labels[~test],
+                      scaler.transform(samples[test]), labels[test]))
+    return folds
+
+
+# folds of each search pool process
+_folds = None
+
+
+def _init_search(folds):
+    global _folds
+    _folds = folds
+
+
+def _fit_fold(job):
+    index, fold, engine, params = job
+    train, train_labels, test, test_labels = _folds[fold]
+    start = time.time()
+    classifier = make_classifier(engine, engine_params(engine, params),
+                                 len(train), train.shape[1])
+    classifier.fit(train, train_labels)
+    fit_time = time.time() - start
+    return index, (classifier.predict(test) == test_labels).mean(), fit_time
+
+
+def search(samples, labels, engine, candidates, n_folds=SEARCH_FOLDS,
+           workers=1, tolerance=SEARCH_TOLERANCE, progress=None):
+    """Cross validated accuracy of each candidate parameter set.
+
+    The scaled folds are computed once and handed to a pool of `workers`
+    processes, or threads inside QGIS (the SVM fits release the GIL, see
+    pools); this thread when 1. All the candidates still running are
+    evaluated on a fold before the next one, and those whose mean accuracy
+    falls more than `tolerance` behind the best stop there. progress is
+    called with the fraction done after each fit; the search stops,
+    returning None, when it returns False.
+
+    Returns a dict per candidate, best first: params, scores (of the folds
+    evaluated), score (their mean), std and fit_time (mean, in seconds).
+    Candidates evaluated on every fold rank first.
+    """
+    folds = scaled_folds(samples, labels, n_folds)
+    if not folds:
+        raise ValueError('not enough samples for %s folds' % n_folds)
+    results = [{'params': params, 'scores': [], 'fit_times': []}
+               for params in candidates]
+    running = list(range(len(results)))
+    pool = pools.pool(workers, _init_search, (folds,), threads=True)
+    if pool is not None:
+        fit = lambda jobs: pool.imap_unordered(_fit_fold, jobs)
+    else:
+        _init_search(folds)
+        fit = lambda jobs: (_fit_fold(job) for job in jobs)
+    try:
+        for fold in range(len(folds)):
+            jobs = [(i, fold, engine, results[i]['params']) for i in running]
+            for done, (i, score, fit_time) in enumerate(fit(jobs)):
+                results[i]['scores'].append(score)
+                results[i]['fit_times'].append(fit_time)
+                fraction = (fold + (done + 1.0) / len(jobs)) / len(folds)
+                if progress is not None and progress(fraction) is False:
+                    return None
+            means = dict((i, np.mean(results[i]['scores'])) for i in running)
+            best = max(means.values())
+            running = [i for i in running if means[i] >= best - tolerance]
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        _init_search(None)
+    for result in results:
+        result['score'] = np.mean(result['scores'])
+        result['std'] = np.std(result['scores'])
+        result['fit_time'] = np.mean(result.pop('fit_times'))
+    return sorted(results, key=lambda r: (-len(r['scores']), -r['score'],
+                                          r['fit_time']))
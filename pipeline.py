@@ -0,0 +1,996 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Segmentation, statistics and classification of raster files, without
+# QGIS, and a command line batch over a folder of rasters
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+# The plugin tabs and the Processing algorithms run these steps, which
+# take and write files:
+#
+#   labels, vector, n = segment('tile.tif', 8)
+#   statistics('tile.tif', labels, vector)
+#   samples, labels, names = roi_samples(labels, vector,
+#                                        *read_rois('rois.shp'))
+#   model, _ = models.fit_or_load(samples, labels, params, names, 'models')
+#   models.save(model, 'model.pkl')
+#   classify(vector, 'model.pkl')
+#
+# or, over every raster of a folder:
+#
+#   python pipeline.py tiles/ --clusters 8 --roi rois.shp --field class
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+
+import numpy as np
+from osgeo import gdal
+from osgeo import ogr
+
+import clustering
+import filters
+import models
+import pools
+import store
+import tiles
+import vectorize
+import zonal
+
+
+def _timed(timings, stage, start):
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.time() - start
+
+
+def open_layer(source):
+    """(dataset, layer) of a vector file or a QGIS OGR layer source."""
+    vector_file, layer = vectorize.split_source(source)
+    ds = ogr.Open(vector_file)
+    if ds is None:
+        raise IOError('cannot open %s' % vector_file)
+    if isinstance(layer, int):
+        return ds, ds.GetLayer(layer)
+    return ds, ds.GetLayerByName(layer)
+
+
+def _say(callback, message):
+    if callback is not None:
+        callback(message)
+
+
+def _stopped(progress, fraction):
+    """Report `fraction` to a progress callback; True if it asked to
+    stop."""
+    return progress is not None and progress(fraction) is False
+
+
+def _scaled(progress, offset, weight):
+    """progress callback of a stage spanning [offset, offset + weight)."""
+    if progress is None:
+        return None
+    return lambda fraction: progress(offset + weight * fraction)
+
+
+def _log_memory(log, stage):
+    rss = tiles.peak_rss()
+    if rss is not None:
+        _say(log, '%s: peak memory %.1f MB' % (stage, rss))
+
+
+def _scratch_file(created):
+    """Name of a new temporary raster, appended to `created`."""
+    fd, filename = tempfile.mkstemp('.tif', 'segment_')
+    os.close(fd)
+    created.append(filename)
+    return filename
+
+
+def _fit_kmeans(ds, rows, n_clusters, method, n_samples, n_init,
+                progress=None, status=None, log=None):
+    """k-means fit on the pixels of a raster, read by strips of `rows`
+    rows; None if stopped."""
+    # gather the clustering samples strip by strip, avoiding the copies
+    # of a whole image ReadAsArray + reshape; every pixel with 'full'
+    _say(status, 'reading data... ')
+    n_pixels = ds.RasterXSize * ds.RasterYSize
+    index = None
+    if method != 'full':
+        index = clustering.sample_index(n_pixels, n_samples)
+    samples = np.empty((n_pixels if index is None else len(index),
+                        ds.RasterCount), dtype=np.float32)
+    offset = 0
+    for pixels in clustering.iter_samples(ds, rows, index):
+        samples[offset:offset+len(pixels)] = pixels
+        offset += len(pixels)
+        if _stopped(progress, 0.5 * offset / len(samples)):
+            return None
+    _log_memory(log, 'reading')
+
+    _say(status, 'clustering data... ')
+    kmeans = clustering.make_kmeans(n_clusters, method, n_init)
+    start = time.time()
+    kmeans.fit(samples)
+    _say(log, '%s k-means: fit %s pixels in %.2fs, mean inertia %.4g' % (
+                method, len(samples), time.time() - start,
+                kmeans.inertia_ / len(samples)))
+    if _stopped(progress, 1.0):
+        return None
+    return kmeans
+
+
+def _predict_strips(ds, clusters_ds, kmeans, rows, progress=None,
+                    preview=None):
+    """Write the cluster of every pixel of a raster to `clusters_ds`, strip
+    by strip, so the pixels x clusters distance matrix stays within a
+    strip; False if stopped."""
+    n_rows = ds.RasterYSize
+    for yoff, ysize, pixels in tiles.iter_pixels(ds, rows):
+        tiles.write_rows(clusters_ds, kmeans.predict(pixels).reshape(
+                            ysize, ds.RasterXSize), yoff)
+        if preview is not None:
+            clusters_ds.FlushCache()
+            preview(yoff, yoff + ysize, False)
+        if _stopped(progress, float(yoff + ysize) / n_rows):
+            return False
+    return True
+
+
+def _filter_strips(clusters_ds, ids_ds, rows, filter_size, connectivity,
+                   timings=None, progress=None, preview=None):
+    """Mode filter `clusters_ds` in place and number the regions of each
+    strip in `ids_ds`, strip by strip; the filters.StripLabels mapping
+    those ids to segments, or None if stopped.
+
+    The filtered rows are final once their strip is done: only the
+    filter_size // 2 rows above the next strip are kept, and as many rows
+    below it are read ahead.
+    """
+    r = filter_size // 2
+    n_rows = clusters_ds.RasterYSize
+    labels = filters.StripLabels(connectivity)
+    above = None
+    for yoff, ysize, _, _ in tiles.strips(n_rows, rows):
+        start = time.time()
+        strip = tiles.read_rows(clusters_ds, yoff, ysize)
+        n_below = min(r, n_rows - yoff - ysize)
+        below = strip[:0]
+        if n_below:
+            below = tiles.read_rows(clusters_ds, yoff + ysize, n_below)
+        if above is None:
+            above = strip[:0]
+        for step, total in filters.iter_mode_filter_strip(above, strip,
+                                                          below, filter_size):
+            if _stopped(progress, (yoff + ysize * float(step) / total) /
+                                  n_rows):
+                return None
+        tiles.write_rows(clusters_ds, strip, yoff)
+        above = np.concatenate([above, strip])[-r:]
+        _timed(timings, 'mode filter', start)
+        if preview is not None:
+            clusters_ds.FlushCache()
+            preview(yoff, yoff + ysize, False)
+
+        start = time.time()
+        tiles.write_rows(ids_ds, labels.add(strip), yoff)
+        _timed(timings, 'labelling', start)
+        if _stopped(progress, float(yoff + ysize) / n_rows):
+            return None
+    if preview is not None:
+        # rows held back by the preview
+        preview(0, 0, True)
+    return labels
+
+
+def segment(raster_file, n_clusters, filename=None, method='full',
+            n_samples=100000, n_init=10, tile_rows=256, filter_size=3,
+            connectivity=4, compress='DEFLATE', overviews=False,
+            vector_driver='GPKG', polygonize_workers=1, vector_file=None,
+            timings=None, clusters_file=None, progress=None, status=None,
+            log=None, preview=None):
+    """Segment a raster, as the Segmentation tab, the command line and the
+    Processing algorithm do: k-means clusters of its pixels, mode filtered
+    and labelled as connected components, written as a label raster and,
+    unless vector_driver is None, polygonized to `vector_file` or else next
+    to it. Returns (label raster, vector file, number of segments), or None
+    if stopped.
+
+    Every stage runs by strips of `tile_rows` rows. The clusters are
+    written to `clusters_file`, an uncompressed raster (a temporary one
+    when not set), and mode filtered in place; the regions of each strip
+    are numbered in a temporary raster until those split by strip seams
+    are merged, then written as segment ids. Memory thus grows with the
+    strip size and the number of segments, not with the image, except
+    with the 'full' method, which fits the k-means on every pixel.
+
+    The callbacks are optional: progress(fraction) as each stage advances,
+    returning False to stop; status(message) as each stage starts;
+    log(message) with the details of each stage; preview(yoff, yend,
+    force) once rows [yoff, yend) of `clusters_file` changed, force being
+    set on the last call (with no rows).
+    """
+    if filename is None:
+        filename = '%s_kmeans_c%s.tif' % (os.path.splitext(raster_file)[0],
+                                          n_clusters)
+    ds = gdal.Open(raster_file, gdal.GA_ReadOnly)
+    rows = tiles.tile_rows(ds, tile_rows)
+    n_rows = ds.RasterYSize
+    _say(log, 'reading by strips of %s rows' % rows)
+
+    start = time.time()
+    kmeans = _fit_kmeans(ds, rows, n_clusters, method, n_samples, n_init,
+                         _scaled(progress, 0.0, 0.10), status, log)
+    if kmeans is None:
+        return None
+    scratch = []
+    if clusters_file is None:
+        clusters_file = _scratch_file(scratch)
+    clusters_ds = ids_ds = None
+    try:
+        clusters_ds = tiles.create_raster(clusters_file, ds, int(n_clusters),
+                                          None, False)
+        if not _predict_strips(ds, clusters_ds, kmeans, rows,
+                               _scaled(progress, 0.10, 0.05), preview):
+            return None
+        _log_memory(log, 'clustering')
+        _timed(timings, 'clustering', start)
+
+        _say(status, 'applying mode filter and labelling...')
+        ids_ds = tiles.create_raster(_scratch_file(scratch), ds,
+                                     ds.RasterXSize * n_rows, None, False)
+        labels = _filter_strips(clusters_ds, ids_ds, rows, filter_size,
+                                connectivity, timings,
+                                _scaled(progress, 0.15, 0.55), preview)
+        if labels is None:
+            return None
+        clusters_ds = None
+        _log_memory(log, 'mode filter and labelling')
+
+        _say(status, 'writing output raster')
+        start = time.time()
+        lut, n_segments = labels.lut()
+        dst_ds = tiles.create_raster(filename, ds, n_segments, compress)
+        for yoff, ysize, _, _ in tiles.strips(n_rows, rows):
+            ids = tiles.read_rows(ids_ds, yoff, ysize, np.int64)
+            tiles.write_rows(dst_ds, lut[ids], yoff)
+            if _stopped(progress, 0.70 + 0.15 * (yoff + ysize) / n_rows):
+                return None
+        if overviews:
+            _say(log, 'overviews: %s' % tiles.build_overviews(dst_ds))
+        dst_ds = None
+        _say(log, '%s written in %.2fs' % (filename, time.time() - start))
+        _timed(timings, 'labelling', start)
+    finally:
+        clusters_ds = ids_ds = None
+        for name in scratch:
+            if os.path.exists(name):
+                os.remove(name)
+
+    if not vector_driver:
+        return filename, None, n_segments
+    _say(status, 'polygonizing segments')
+    start = time.time()
+    if vector_file is None:
+        vector_file = vectorize.vector_filename(filename, vector_driver)
+    if pools.workers(polygonize_workers) > 1:
+        count = vectorize.polygonize_tiles(filename, vector_file,
+                                           vector_driver, connectivity,
+                                           n_segments, rows=rows * 4,
+                                           workers=polygonize_workers,
+                                           progress=_scaled(progress, 0.85,
+                                                            0.15))
+    else:
+        count = vectorize.polygonize(filename, vector_file, vector_driver,
+                                     connectivity, n_segments,
+                                     progress=_scaled(progress, 0.85, 0.15))
+    elapsed = time.time() - start
+    _say(log, 'polygonize: %s features in %.2fs (%.0f features/s)' % (
+                count, elapsed, count / max(elapsed, 1e-6)))
+    # lets the statistics read the raster instead of rasterizing
+    vectorize.sync_mtime(filename, vector_file)
+    _timed(timings, 'polygonize', start)
+    if _stopped(progress, 1.0):
+        return None
+    return filename, vector_file, n_segments
+
+
+def segment_raster(ds, vector_file=None, labels_file=None):
+    """Label raster of the segments on the grid of the raster dataset `ds`,
+    as (dataset, file name, origin).
+
+    `labels_file`, when given, or else the raster the segmentation wrote
+    next to the segments layer `vector_file`, is read as is. Otherwise the
+    polygons are rasterized, and the result cached until they change; the
+    file name is None when the layer is not file based.
+    """
+    if labels_file:
+        labels_ds = gdal.Open(labels_file, gdal.GA_ReadOnly)
+        if not vectorize.same_grid(labels_ds, ds):
+            raise ValueError('segment raster and raster image grids '
+                             'differ.')
+        return labels_ds, labels_file, 'given'
+    source, layer = vectorize.split_source(vector_file)
+    filename = vectorize.sibling_raster(source, ds, layer)
+    origin = 'segmentation'
+    if not filename:
+        filename = vectorize.cache_filename(source, layer, ds)
+        origin = 'cache'
+    if not filename:
+        # not file based, nothing to cache
+        return vectorize.rasterize(source, layer, ds), None, 'rasterized'
+    if not os.path.exists(filename):
+        # one cache per layer: those of its previous versions go
+        vectorize.clear_cache(filename)
+        # write aside and rename, so an interrupted run leaves no cache
+        partial = filename + '.part'
+        labels_ds = vectorize.rasterize(source, layer, ds, partial)
+        labels_ds = None
+        os.rename(partial, filename)
+        origin = 'rasterized'
+    return gdal.Open(filename, gdal.GA_ReadOnly), filename, origin
+
+
+def keep_segment_raster(ds, vector_file, filename, origin):
+    """Writing fields changes the modification time of the polygons, not
+    their geometry: keep their label raster, from segment_raster, current."""
+    source, layer = vectorize.split_source(vector_file)
+    if origin == 'segmentation':
+        vectorize.sync_mtime(filename, source)
+    elif origin in ('cache', 'rasterized'):
+        current = vectorize.cache_filename(source, layer, ds)
+        if current != filename and not os.path.exists(current):
+            os.rename(filename, current)
+
+
+def all_features(raster_file, labels_ds, labels_file, families, pixel_size,
+                 levels=32, error=0.0, tile_rows=1024, workers=1,
+                 timings=None, progress=None):
+    """(counts, stats, ranges) of every segment of a label raster on the
+    grid of a raster (see zonal.zonal_features), by strips in `workers`
+    processes, or at once from `labels_ds` when it is not a file. None if
+    stopped."""
+    ranges = None
+    if labels_file:
+        if 'texture' in families:
+            ranges = zonal.tiled_ranges(raster_file, labels_file, tile_rows,
+                                        workers)
+        result = zonal.tiled_features(raster_file, labels_file, families,
+                                      pixel_size, levels, tile_rows, workers,
+                                      progress, timings, error, ranges=ranges)
+        if result is None:
+            return None
+        return result + (ranges,)
+
+    ds = gdal.Open(raster_file, gdal.GA_ReadOnly)
+    data_img = ds.ReadAsArray()
+    data_seg = labels_ds.ReadAsArray()
+    # transpose img information into a vector of band-dimensional vectors
+    img_vector = data_img.reshape(ds.RasterCount, data_seg.size).T
+    zones = data_seg.ravel()
+    if zones.dtype.kind not in 'iu':
+        # ids beyond 2**32 come as Float64
+        zones = zones.astype(np.int64)
+    if 'texture' in families:
+        ranges = zonal.value_ranges(img_vector, zones)
+    counts, stats = zonal.zonal_features(img_vector, zones, int(zones.max()),
+                                         families, data_seg.shape, pixel_size,
+                                         levels, timings, error,
+                                         ranges=ranges)
+    return counts, stats, ranges
+
+
+def window_features(raster_file, vector_file, boxes, families, pixel_size,
+                    levels=32, error=0.0, ranges=None, timings=None):
+    """(counts, stats) of the segments within the extent of `boxes`
+    (xmin, ymin, xmax, ymax), rasterizing the polygons of that window
+    only."""
+    if not boxes:
+        return np.zeros(1), np.full((1, 1), np.nan)
+    ds = gdal.Open(raster_file, gdal.GA_ReadOnly)
+    boxes = np.array(boxes)
+    window = tiles.pixel_window(ds, boxes[:, 0].min(), boxes[:, 1].min(),
+                                boxes[:, 2].max(), boxes[:, 3].max())
+    xoff, yoff, xsize, ysize = window
+    if not xsize or not ysize:
+        return np.zeros(1), np.full((1, 1), np.nan)
+    source, layer = vectorize.split_source(vector_file)
+    labels_ds = vectorize.rasterize(source, layer,
+                                    tiles.window_grid(ds, *window))
+    zones = labels_ds.ReadAsArray().ravel()
+    if zones.dtype.kind not in 'iu':
+        zones = zones.astype(np.int64)
+    data_img = ds.ReadAsArray(xoff, yoff, xsize, ysize)
+    img_vector = data_img.reshape(ds.RasterCount, zones.size).T
+    return zonal.zonal_features(img_vector, zones, int(zones.max()),
+                                families, (ysize, xsize), pixel_size, levels,
+                                timings, error, ranges=ranges)
+
+
+def scan_geometries(vector_file, progress=None):
+    """{fid: segment id}, {fid: geometry hash} and {fid: bounding box
+    (xmin, ymin, xmax, ymax)} of every feature of a segments layer."""
+    ds, layer = open_layer(vector_file)
+    n_features = max(layer.GetFeatureCount(), 1)
+    every = max(n_features // 100, 1)
+    ids, hashes, boxes = {}, {}, {}
+    for n_iter, feat in enumerate(layer):
+        fid = feat.GetFID()
+        geom = feat.GetGeometryRef()
+        ids[fid] = feat.GetField(0)
+        if geom is None:
+            hashes[fid] = None
+            continue
+        hashes[fid] = hashlib.md5(geom.ExportToWkb()).hexdigest()
+        xmin, xmax, ymin, ymax = geom.GetEnvelope()
+        boxes[fid] = (xmin, ymin, xmax, ymax)
+        if progress is not None and n_iter % every == 0:
+            progress(float(n_iter) / n_features)
+    return ids, hashes, boxes
+
+
+def write_fields(vector_file, names, stats, changed=None, ids=None,
+                 progress=None):
+    """Write the statistics of each segment to fields of its feature,
+    creating the missing ones; those of the `changed` fids only, if set,
+    `ids` mapping them to segment ids. Returns the features written."""
+    ds, layer = open_layer(vector_file)
+    defn = layer.GetLayerDefn()
+    for name in names:
+        if defn.GetFieldIndex(name) < 0:
+            layer.CreateField(ogr.FieldDefn(name, ogr.OFTReal))
+    field_idx = [defn.GetFieldIndex(name) for name in names]
+    n_zones = len(stats) - 1
+    missing = [None] * len(names)
+    if changed is None:
+        n_features = layer.GetFeatureCount()
+        features = iter(layer)
+    else:
+        n_features = len(changed)
+        features = (layer.GetFeature(fid) for fid in changed)
+    every = max(n_features // 100, 1)
+    batch = vectorize.Batch(layer)
+    n_iter = 0
+    for feat in features:
+        if feat is None:
+            continue
+        segment_id = feat.GetField(0)
+        if segment_id is not None and 0 < segment_id <= n_zones:
+            values = stats[segment_id].tolist()
+        else:
+            # not rasterized (smaller than a pixel)
+            values = missing
+        for index, value in zip(field_idx, values):
+            if value is None or value != value:
+                feat.UnsetField(index)
+            else:
+                feat.SetField(index, value)
+        layer.SetFeature(feat)
+        batch.add()
+        n_iter += 1
+        if progress is not None and n_iter % every == 0:
+            progress(float(n_iter) / n_features)
+    batch.close()
+    return n_iter
+
+
+def has_fields(vector_file, names):
+    """Whether a segments layer has a field of every name."""
+    ds, layer = open_layer(vector_file)
+    defn = layer.GetLayerDefn()
+    return all(defn.GetFieldIndex(name) >= 0 for name in names)
+
+
+def signature(raster_file, names, levels, error):
+    """Settings stored statistics were computed with."""
+    mtime = os.path.isfile(raster_file) and \
+        os.path.getmtime(raster_file) or None
+    return {'raster': raster_file, 'mtime': mtime, 'fields': names,
+            'levels': levels, 'error': error}
+
+
+def write_store(path, names, stats, provenance, changed=None, ids=None,
+                log=None):
+    """Keep the feature store of a segments layer current: written anew
+    after a full run, updated in place for the `changed` fids (`ids`
+    mapping them to segment ids), removed if it cannot be."""
+    if changed is None:
+        store.save(path, stats, names, provenance)
+        return
+    n_zones = len(stats) - 1
+    segment_ids, values = [], []
+    for fid in changed:
+        if ids[fid] is None:
+            continue
+        segment_id = int(ids[fid])
+        segment_ids.append(segment_id)
+        if 0 < segment_id <= n_zones:
+            values.append(stats[segment_id])
+        else:
+            values.append(np.full(len(names), np.nan))
+    values = np.array(values).reshape(-1, len(names))
+    if not store.update(path, segment_ids, values, provenance):
+        if os.path.isdir(path):
+            _say(log, 'edited segments are not in the feature store, '
+                      'removed: run the statistics without Incremental to '
+                      'write it again.')
+        store.remove(path)
+
+
+def state_filename(source):
+    """File keeping the geometry hashes of the last statistics run, next to
+    the segments layer; None if it is not file based."""
+    vector_file, layer = vectorize.split_source(source)
+    if not os.path.isfile(vector_file):
+        return None
+    return '%s.%s.stats.json' % (vector_file, layer)
+
+
+def load_state(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def save_state(filename, state):
+    with open(filename, 'w') as f:
+        json.dump(state, f)
+
+
+def statistics(raster_file, labels_file=None, vector_file=None,
+               families=zonal.DEFAULT_FAMILIES, levels=32, error=0.0,
+               tile_rows=1024, workers=1, timings=None, incremental=False,
+               fields=None, progress=None, status=None, log=None):
+    """Features of the segments of a raster, as the Statistics tab, the
+    command line and the Processing algorithm compute them, by strips in
+    `workers` processes. Returns (stats, names), with a row of stats per
+    segment id, or None if stopped.
+
+    Segments are read from `labels_file`, a label raster on the grid of the
+    raster, or else from the segments layer `vector_file` (see
+    segment_raster). The features are written to the feature store of
+    `vector_file`, if file based, and to its fields with `fields`: True
+    writes them with OGR (write_fields), a function is called instead as
+    fields(names, stats, changed, ids). With `incremental`, a later run
+    with the same settings only computes the segments whose geometry
+    changed since, `changed` being their fids and `ids` mapping fids to
+    segment ids (both None after a full run), and returns their stats.
+
+    progress, status and log are optional callbacks, as in segment.
+    """
+    if not labels_file and not vector_file:
+        raise ValueError('please set a segment raster or segments layer')
+    ds = gdal.Open(raster_file, gdal.GA_ReadOnly)
+    gt = ds.GetGeoTransform()
+    pixel_size = (abs(gt[1]), abs(gt[5]))
+    names = zonal.field_names(ds.RasterCount, families)
+    settings = signature(raster_file, names, levels, error)
+    store_dir = vector_file and store.store_path(vector_file)
+    if fields is True:
+        fields = lambda names, stats, changed, ids: write_fields(
+                        vector_file, names, stats, changed, ids,
+                        _scaled(progress, 0.65, 0.35))
+
+    # features whose geometry changed since the last run, None for all
+    changed = ids = hashes = None
+    state_file = vector_file and state_filename(vector_file)
+    if state_file and not incremental:
+        # the fields will no longer match the stored geometries
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        state_file = None
+    if state_file:
+        _say(status, 'looking for edited segments.')
+        ids, hashes, boxes = scan_geometries(vector_file,
+                                             _scaled(progress, 0.05, 0.10))
+        state = load_state(state_file)
+        # previous features, where this run writes them
+        if fields:
+            present = has_fields(vector_file, names)
+        else:
+            manifest = store_dir and store.load_manifest(store_dir)
+            present = bool(manifest) and manifest['names'] == names
+        if state and state['signature'] == settings and present:
+            stored = state['hashes']
+            changed = [fid for fid, h in hashes.items()
+                       if h is None or stored.get(str(fid)) != h]
+            ranges = state['ranges'] and np.array(state['ranges'])
+        else:
+            _say(log, 'no previous statistics with these settings, '
+                      'computing all segments.')
+
+    start = time.time()
+    detail = {}
+    labels = origin = None
+    if changed is None:
+        # label raster of the segments, rasterized only when none is at hand
+        _say(status, 'looking up segment raster.')
+        labels_ds, labels, origin = segment_raster(ds, vector_file,
+                                                   labels_file)
+        _say(log, 'segment raster (%s) in %.2fs' % (origin,
+                                                    time.time() - start))
+        if _stopped(progress, 0.15):
+            return None
+        _say(status, 'calculating...')
+        result = all_features(raster_file, labels_ds, labels, families,
+                              pixel_size, levels, error, tile_rows, workers,
+                              detail, _scaled(progress, 0.15, 0.45))
+        labels_ds = None
+        if result is None:
+            return None
+        counts, stats, ranges = result
+    else:
+        boxes = [boxes[fid] for fid in changed if fid in boxes]
+        _say(status, 'rasterizing edited segments.')
+        counts, stats = window_features(raster_file, vector_file, boxes,
+                                        families, pixel_size, levels, error,
+                                        ranges, detail)
+    if changed is None or changed:
+        _say(log, 'features of %s segments in %.2fs (%s)' % (
+                    len(counts) - 1, time.time() - start,
+                    zonal.timing_report(detail)))
+    _timed(timings, 'statistics', start)
+    if _stopped(progress, 0.65):
+        return None
+
+    if store_dir:
+        _say(status, 'storing features.')
+        start = time.time()
+        write_store(store_dir, names, stats,
+                    dict(settings, families=list(families), labels=labels,
+                         segments=vector_file),
+                    changed, ids, log)
+        _say(log, 'feature store %s written in %.2fs' % (
+                    os.path.basename(store_dir), time.time() - start))
+        _timed(timings, 'store', start)
+    if fields:
+        _say(status, 'writing statistics.')
+        start = time.time()
+        fields(names, stats, changed, ids)
+        _timed(timings, 'fields', start)
+    if changed is not None:
+        _say(log, '%s segments reused, %s recomputed' % (
+                    len(hashes) - len(changed), len(changed)))
+    if labels and vector_file:
+        keep_segment_raster(ds, vector_file, labels, origin)
+    if state_file:
+        save_state(state_file, {
+            'signature': settings,
+            'ranges': ranges is not None and ranges.tolist() or None,
+            'hashes': dict((str(fid), h) for fid, h in hashes.items()),
+        })
+    _stopped(progress, 1.0)
+    return stats, names
+
+
+def read_rois(roi_file, field=None):
+    """(wkb, class) of every feature of the first layer of a vector file
+    with a geometry, the class from `field` or else the last field, and the
+    projection WKT of the layer: (rois, srs_wkt)."""
+    ds, layer = open_layer(roi_file)
+    defn = layer.GetLayerDefn()
+    index = defn.GetFieldCount() - 1
+    if field:
+        index = defn.GetFieldIndex(field)
+        if index < 0:
+            raise ValueError('%s has no field %s' % (roi_file, field))
+    rois = []
+    for feat in layer:
+        geom = feat.GetGeometryRef()
+        if geom is not None:
+            rois.append((geom.ExportToWkb(), feat.GetField(index)))
+    srs = layer.GetSpatialRef()
+    return rois, srs and srs.ExportToWkt() or ''
+
+
+def roi_labels(labels_file, rois, majority=0.5, overlap=0.0, srs_wkt='',
+               progress=None):
+    """(segment ids, classes, majority share, roi cover) of the segments of
+    a label raster whose pixels are mostly covered by rois of one class,
+    the (wkb, class) rois, in projection `srs_wkt` (that of the raster if
+    empty), being rasterized on its grid (see zonal.zone_majority). None
+    if stopped by progress."""
+    classes, codes = np.unique([label for _, label in rois],
+                               return_inverse=True)
+    lut = np.concatenate([[0], codes + 1])
+    ds = gdal.Open(labels_file, gdal.GA_ReadOnly)
+    raster_wkt = ds.GetProjection()
+    ds = None
+    wkbs = vectorize.reproject([wkb for wkb, _ in rois], srs_wkt, raster_wkt)
+    burn_ds, layer = vectorize.burn_layer(wkbs, raster_wkt)
+    result = zonal.burn_counts(labels_file, layer, progress=progress)
+    if result is None:
+        return None
+    zones, values, share, cover = zonal.zone_majority(
+        result[1], result[0], lut, majority, overlap)
+    return zones, classes[values - 1], share, cover
+
+
+def roi_samples(labels_file, vector_file, rois, srs_wkt='', majority=0.5,
+                overlap=0.0):
+    """(samples, labels, names) of the segments labelled by the rois (see
+    roi_labels), their features read from the feature store of
+    `vector_file`."""
+    stored = store.load(store.store_path(vector_file))
+    if stored is None:
+        raise ValueError('no feature store for %s, compute its statistics '
+                         'first' % vector_file)
+    data, manifest = stored
+    names = manifest['names']
+    if not rois:
+        return np.zeros((0, len(names))), np.zeros(0, dtype=int), names
+    zones, labels = roi_labels(labels_file, rois, majority, overlap,
+                               srs_wkt)[:2]
+    samples = store.lookup(data, zones)
+    # segments without features (no valid pixels)
+    valid = np.isfinite(samples).all(axis=1)
+    return samples[valid], labels[valid].astype(int), names
+
+
+def classify(vector_file, model_file, filename=None, chunk_size=50000,
+             workers=1, timings=None, driver='GPKG'):
+    """Classify the segments of a polygonized layer with a saved model, on
+    their features from its feature store. Written as a layer (a GeoPackage
+    by default) of the segment ids, classes and geometries; segments
+    without features are left out. Returns (file name, number of segments
+    classified)."""
+    if filename is None:
+        base = os.path.splitext(vectorize.split_source(vector_file)[0])[0]
+        filename = base + '_classification.gpkg'
+    stored = store.load(store.store_path(vector_file))
+    if stored is None:
+        raise ValueError('no feature store for %s, compute its statistics '
+                         'first' % vector_file)
+    data, manifest = stored
+    model = models.load(model_file)
+    model.check(manifest['names'])
+
+    start = time.time()
+    ids = np.flatnonzero(np.isfinite(data).all(axis=1))
+    ids = ids[ids > 0]
+    classes = np.zeros(len(data), dtype=np.int64)
+    classified = np.zeros(len(data), dtype=bool)
+    classified[ids] = True
+    features = data[ids]
+    for first, chunk in models.predict_chunks(model, features, chunk_size,
+                                              workers):
+        classes[ids[first:first+len(chunk)]] = chunk
+    _timed(timings, 'predict', start)
+
+    start = time.time()
+    src_ds, src = open_layer(vector_file)
+    srs = src.GetSpatialRef()
+    dst_ds, dst = vectorize.create_layer(
+        filename, srs and srs.ExportToWkt() or '', driver, len(data),
+        [('Class', ogr.OFTInteger)], ogr.wkbMultiPolygon)
+    defn = dst.GetLayerDefn()
+    batch = vectorize.Batch(dst)
+    count = 0
+    for feat in src:
+        segment_id = feat.GetField(0)
+        geom = feat.GetGeometryRef()
+        if segment_id is None or geom is None or \
+                not 0 < segment_id < len(data) or \
+                not classified[segment_id]:
+            continue
+        out = ogr.Feature(defn)
+        out.SetField(0, segment_id)
+        out.SetField(1, int(classes[segment_id]))
+        out.SetGeometry(ogr.ForceToMultiPolygon(geom.Clone()))
+        dst.CreateFeature(out)
+        batch.add()
+        count += 1
+    batch.close()
+    dst = dst_ds = src = src_ds = None
+    _timed(timings, 'write', start)
+    return filename, count
+
+
+def _prepare(job):
+    """segment and statistics of a raster of the batch, in a pool process;
+    (raster, result or None, error or None)."""
+    raster_file, out_dir, opts = job
+    try:
+        timings = {}
+        base = os.path.splitext(os.path.basename(raster_file))[0]
+        labels_file, vector_file, n_segments = segment(
+            raster_file, opts['clusters'],
+            os.path.join(out_dir, base + '_segments.tif'),
+            opts['method'], opts['samples'], opts['n_init'],
+            opts['tile_rows'], opts['filter_size'],
+            polygonize_workers=opts['inner_workers'], timings=timings)
+        statistics(raster_file, labels_file, vector_file, opts['families'],
+                   opts['levels'], opts['error'], opts['tile_rows'],
+                   opts['inner_workers'], timings,
+                   fields=opts.get('write_fields', False))
+        return raster_file, {'labels': labels_file, 'vector': vector_file,
+                             'segments': n_segments,
+                             'timings': timings}, None
+    except Exception:
+        return raster_file, None, traceback.format_exc()
+
+
+def _classify(job):
+    """classify a prepared raster of the batch, in a pool process."""
+    raster_file, result, model_file, opts = job
+    try:
+        timings = {}
+        filename, count = classify(result['vector'], model_file,
+                                   chunk_size=opts['chunk'],
+                                   workers=opts['inner_workers'],
+                                   timings=timings)
+        return raster_file, {'output': filename, 'classified': count,
+                             'timings': timings}, None
+    except Exception:
+        return raster_file, None, traceback.format_exc()
+
+
+def _report(raster_file, result, error, keys):
+    if error:
+        print('%s: failed\n%s' % (raster_file, error))
+        return
+    timings = ', '.join('%s %.2fs' % item
+                        for item in sorted(result['timings'].items()))
+    print('%s: %s (%s)' % (os.path.basename(raster_file),
+                           ', '.join('%s %s' % (k, result[k]) for k in keys),
+                           timings))
+
+
+def run_batch(rasters, out_dir, opts, workers=1):
+    """Segment, compute the statistics of and, with a model or rois,
+    classify every raster, each in one of `workers` processes (the stages
+    of a single raster use them instead). Returns {raster: outputs} of the
+    rasters that did not fail."""
+    opts = dict(opts, inner_workers=len(rasters) == 1 and workers or 1)
+    pool = len(rasters) > 1 and pools.pool(workers) or None
+    imap = pool and pool.imap_unordered or (lambda fn, jobs: map(fn, jobs))
+    prepared = {}
+    try:
+        jobs = [(raster, out_dir, opts) for raster in rasters]
+        for raster, result, error in imap(_prepare, jobs):
+            _report(raster, result, error, ['segments'])
+            if result is not None:
+                prepared[raster] = result
+
+        model_file = opts.get('model')
+        if not model_file and opts.get('roi'):
+            model_file = train(prepared, opts, out_dir, workers)
+        if not model_file:
+            return prepared
+
+        jobs = [(raster, result, model_file, opts)
+                for raster, result in sorted(prepared.items())]
+        for raster, result, error in imap(_classify, jobs):
+            _report(raster, result, error, ['classified', 'output'])
+            if result is not None:
+                prepared[raster].update(result)
+            else:
+                del prepared[raster]
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return prepared
+
+
+def train(prepared, opts, out_dir, workers=1):
+    """Fit a model on the roi samples of every prepared raster, saved in
+    `out_dir`; its file name, or None if there are no samples."""
+    rois, srs_wkt = read_rois(opts['roi'], opts.get('field'))
+    parts = [roi_samples(r['labels'], r['vector'], rois, srs_wkt,
+                         opts['majority'], opts['overlap'])
+             for _, r in sorted(prepared.items())]
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        print('no segment under the rois, nothing to classify')
+        return None
+    samples = np.concatenate([p[0] for p in parts])
+    labels = np.concatenate([p[1] for p in parts])
+    names = parts[0][2]
+    model, reused = models.fit_or_load(samples, labels, opts['params'],
+                                       names, out_dir, opts['engine'],
+                                       workers)
+    print('%s on %s samples: %s' % (
+            model.engine, len(samples),
+            reused and 'reused' or 'fit in %.2fs' % model.fit_time))
+    return models.model_filename(out_dir, model.key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Segment, compute the statistics of and classify every '
+                    'raster of a folder.')
+    parser.add_argument('folder')
+    parser.add_argument('--out', help='output folder, analysis in the '
+                        'input one if not set')
+    parser.add_argument('--pattern', default='*.tif')
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count())
+    g = parser.add_argument_group('segmentation')
+    g.add_argument('--clusters', type=int, default=8)
+    g.add_argument('--method', default='full', choices=clustering.METHODS)
+    g.add_argument('--samples', type=int, default=100000)
+    g.add_argument('--n-init', type=int, default=10)
+    g.add_argument('--filter-size', type=int, default=3,
+                   help='odd width of the mode filter window')
+    g.add_argument('--tile-rows', type=int, default=1024)
+    g = parser.add_argument_group('statistics')
+    g.add_argument('--families', nargs='+', default=zonal.DEFAULT_FAMILIES,
+                   choices=zonal.FAMILIES)
+    g.add_argument('--levels', type=int, default=32)
+    g.add_argument('--error', type=float, default=0.0)
+    g.add_argument('--write-fields', action='store_true',
+                   help='also write the features to fields of the segments')
+    g = parser.add_argument_group('classification, with --model or --roi')
+    g.add_argument('--model', help='model saved by the plugin or a '
+                   'previous batch')
+    g.add_argument('--roi', help='vector file of rois')
+    g.add_argument('--field', help='class field of the rois, the last one '
+                   'if not set')
+    g.add_argument('--majority', type=float, default=0.5)
+    g.add_argument('--overlap', type=float, default=0.0)
+    g.add_argument('--engine', default='svc',
+                   choices=[name for name, _ in models.ENGINES])
+    g.add_argument('--kernel', default='rbf',
+                   choices=['linear', 'rbf', 'poly', 'sigmoid'])
+    g.add_argument('--C', type=float, default=1.0)
+    g.add_argument('--gamma', type=float, default=0.0)
+    g.add_argument('--degree', type=int, default=3)
+    g.add_argument('--coef0', type=float, default=0.0)
+    g.add_argument('--chunk', type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    if args.filter_size < 3 or args.filter_size % 2 == 0:
+        parser.error('--filter-size must be an odd number from 3')
+    gdal.UseExceptions()
+    rasters = sorted(glob.glob(os.path.join(args.folder, args.pattern)))
+    if not rasters:
+        parser.error('no %s in %s' % (args.pattern, args.folder))
+    # not the input folder, whose pattern may match the outputs
+    out_dir = args.out or os.path.join(args.folder, 'analysis')
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    opts = vars(args)
+    opts['params'] = {'kernel': args.kernel, 'C': args.C,
+                      'gamma': args.gamma, 'degree': args.degree,
+                      'coef0': args.coef0}
+    start = time.time()
+    done = run_batch(rasters, out_dir, opts, args.workers)
+    print('%s of %s rasters in %.2fs' % (len(done), len(rasters),
+                                         time.time() - start))
+    return len(done) < len(rasters) and 1 or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Process pools of the kernels, disabled inside QGIS
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+# multiprocessing is unreliable inside the QGIS process: on Windows a pool
+# starts copies of sys.executable, the QGIS program, and elsewhere it forks
+# the multi-threaded Qt and GDAL process from a worker thread (python 2 has
+# no other start method). The plugin calls disable() when QGIS loads it;
+# from then on, kernels whose work releases the GIL (libsvm and liblinear,
+# GDAL reads, numpy sorts) ask for threads instead, and the others run in
+# the task thread. pipeline.py and benchmark.py, run by a python
+# interpreter, keep their process pools.
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+_enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def workers(n, threads=False):
+    """Processes (or, with `threads`, threads once process pools are
+    disabled) a kernel asked for `n` may use: 1 when it may not run in
+    parallel."""
+    return (_enabled or threads) and max(int(n), 1) or 1
+
+
+def pool(n, initializer=None, initargs=(), threads=False):
+    """Pool of `n` processes, or with `threads` a pool of threads once
+    process pools are disabled; None to run in the calling thread when
+    that is 1 (see workers)."""
+    n = workers(n, threads)
+    if n <= 1:
+        return None
+    if not _enabled:
+        return ThreadPool(n, initializer, initargs)
+    return multiprocessing.Pool(n, initializer, initargs)
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Processing provider of the segmentation, statistics and classification
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+import os
+import time
+
+from PyQt4.QtGui import QIcon
+from osgeo import gdal
+
+from processing.core.AlgorithmProvider import AlgorithmProvider
+from processing.core.GeoAlgorithm import GeoAlgorithm
+from processing.core.GeoAlgorithmExecutionException import \
+    GeoAlgorithmExecutionException
+from processing.core.parameters import ParameterBoolean
+from processing.core.parameters import ParameterFile
+from processing.core.parameters import ParameterNumber
+from processing.core.parameters import ParameterRaster
+from processing.core.parameters import ParameterSelection
+from processing.core.parameters import ParameterTableField
+from processing.core.parameters import ParameterVector
+from processing.core.outputs import OutputHTML
+from processing.core.outputs import OutputRaster
+from processing.core.outputs import OutputVector
+
+import classifier
+import clustering
+import models
+import pipeline
+import vectorize
+import zonal
+
+ICON = os.path.join(os.path.dirname(__file__), 'resources', 'icon.png')
+KERNELS = ['linear', 'rbf', 'poly', 'sigmoid']
+
+
+class AnalysisAlgorithm(GeoAlgorithm):
+    """Base of the algorithms: a step of the pipeline module, timed, with
+    an HTML report of the time of each stage."""
+
+    REPORT = 'REPORT'
+
+    def getIcon(self):
+        return QIcon(ICON)
+
+    def addReport(self):
+        self.addOutput(OutputHTML(self.REPORT, 'Timings'))
+
+    def callbacks(self, progress):
+        """progress, status and log callbacks of the pipeline functions,
+        shown in the algorithm dialog."""
+        return {'progress': lambda fraction: progress.setPercentage(
+                                int(fraction * 100)),
+                'status': progress.setText, 'log': progress.setInfo}
+
+    def processAlgorithm(self, progress):
+        timings = {}
+        start = time.time()
+        try:
+            lines = self.process(progress, timings)
+        except (IOError, ValueError), e:
+            raise GeoAlgorithmExecutionException(str(e))
+        timings['total'] = time.time() - start
+        progress.setPercentage(100)
+        for stage, seconds in sorted(timings.items()):
+            progress.setInfo('%s: %.2fs' % (stage, seconds))
+        self.write_report(timings, lines)
+
+    def process(self, progress, timings):
+        """Run the step, adding the time of each stage to `timings`;
+        returns lines for the report."""
+        return []
+
+    def write_report(self, timings, lines):
+        rows = ''.join('<tr><td>%s</td><td>%.2f</td></tr>' % item
+                       for item in sorted(timings.items()))
+        with open(self.getOutputValue(self.REPORT), 'w') as f:
+            f.write('<html><body><h3>%s</h3>%s'
+                    '<table><tr><th>stage</th><th>seconds</th></tr>%s'
+                    '</table></body></html>' % (
+                        self.name, ''.join('<p>%s</p>' % l for l in lines),
+                        rows))
+
+
+class SegmentationAlgorithm(AnalysisAlgorithm):
+
+    INPUT = 'INPUT'
+    CLUSTERS = 'CLUSTERS'
+    METHOD = 'METHOD'
+    SAMPLES = 'SAMPLES'
+    N_INIT = 'N_INIT'
+    TILE_ROWS = 'TILE_ROWS'
+    FILTER_SIZE = 'FILTER_SIZE'
+    OUTPUT = 'OUTPUT'
+    OUTPUT_VECTOR = 'OUTPUT_VECTOR'
+
+    def defineCharacteristics(self):
+        self.name = 'K-means segmentation'
+        self.group = 'Image Analysis'
+        self.addParameter(ParameterRaster(self.INPUT, 'Raster image'))
+        self.addParameter(ParameterNumber(self.CLUSTERS, 'Clusters', 1, 9999,
+                                          8))
+        self.addParameter(ParameterSelection(self.METHOD, 'K-means method',
+                                             clustering.METHODS, 0))
+        self.addParameter(ParameterNumber(self.SAMPLES, 'Samples', 1000,
+                                          100000000, 100000))
+        self.addParameter(ParameterNumber(self.N_INIT, 'Initializations', 1,
+                                          100, 10))
+        self.addParameter(ParameterNumber(self.TILE_ROWS, 'Tile rows', 1,
+                                          65536, 256))
+        self.addParameter(ParameterNumber(self.FILTER_SIZE, 'Filter size '
+                                          '(odd)', 3, 15, 3))
+        self.addOutput(OutputRaster(self.OUTPUT, 'Segment raster'))
+        self.addOutput(OutputVector(self.OUTPUT_VECTOR, 'Segments'))
+        self.addReport()
+
+    def process(self, progress, timings):
+        vector_file = self.getOutputValue(self.OUTPUT_VECTOR)
+        filter_size = int(self.getParameterValue(self.FILTER_SIZE))
+        if filter_size % 2 == 0:
+            raise ValueError('the filter size must be odd')
+        progress.setText('segmenting')
+        _, _, n_segments = pipeline.segment(
+            self.getParameterValue(self.INPUT),
+            int(self.getParameterValue(self.CLUSTERS)),
+            self.getOutputValue(self.OUTPUT),
+            clustering.METHODS[self.getParameterValue(self.METHOD)],
+            int(self.getParameterValue(self.SAMPLES)),
+            int(self.getParameterValue(self.N_INIT)),
+            int(self.getParameterValue(self.TILE_ROWS)), filter_size,
+            vector_driver=vectorize.vector_driver(vector_file),
+            vector_file=vector_file, timings=timings,
+            **self.callbacks(progress))
+        return ['%s segments' % n_segments]
+
+
+class StatisticsAlgorithm(AnalysisAlgorithm):
+
+    INPUT = 'INPUT'
+    SEGMENTS = 'SEGMENTS'
+    SEGMENTS_VECTOR = 'SEGMENTS_VECTOR'
+    LEVELS = 'LEVELS'
+    ERROR = 'ERROR'
+    TILE_ROWS = 'TILE_ROWS'
+    WORKERS = 'WORKERS'
+    INCREMENTAL = 'INCREMENTAL'
+    WRITE_FIELDS = 'WRITE_FIELDS'
+    OUTPUT = 'OUTPUT'
+
+    def defineCharacteristics(self):
+        self.name = 'Segment statistics'
+        self.group = 'Image Analysis'
+        self.addParameter(ParameterRaster(self.INPUT, 'Raster image'))
+        self.addParameter(ParameterRaster(
+            self.SEGMENTS, 'Segment raster (next to the segments if not set)',
+            True))
+        self.addParameter(ParameterVector(
+            self.SEGMENTS_VECTOR, 'Segments, storing the features',
+            [ParameterVector.VECTOR_TYPE_POLYGON]))
+        for family in zonal.FAMILIES[1:]:
+            self.addParameter(ParameterBoolean(family.upper(),
+                                               family.capitalize(), False))
+        self.addParameter(ParameterNumber(self.LEVELS, 'Texture grey levels',
+                                          2, 256, 32))
+        self.addParameter(ParameterNumber(self.ERROR, 'Quantile error', 0.0,
+                                          100.0, 0.0))
+        self.addParameter(ParameterNumber(self.TILE_ROWS, 'Tile rows', 64,
+                                          65536, 1024))
+        self.addParameter(ParameterNumber(self.WORKERS, 'Workers', 1, 64, 1))
+        self.addParameter(ParameterBoolean(self.INCREMENTAL, 'Incremental',
+                                           False))
+        self.addParameter(ParameterBoolean(self.WRITE_FIELDS, 'Write fields',
+                                           False))
+        # the input layer itself, so the classification can take it in the
+        # modeler once its features are stored
+        self.addOutput(OutputVector(self.OUTPUT, 'Segments with features'))
+        self.addReport()
+
+    def process(self, progress, timings):
+        families = zonal.FAMILIES[:1] + [
+            f for f in zonal.FAMILIES[1:]
+            if self.getParameterValue(f.upper())]
+        vector_file = self.getParameterValue(self.SEGMENTS_VECTOR)
+        progress.setText('computing statistics')
+        _, names = pipeline.statistics(
+            self.getParameterValue(self.INPUT),
+            self.getParameterValue(self.SEGMENTS), vector_file,
+            families, int(self.getParameterValue(self.LEVELS)),
+            float(self.getParameterValue(self.ERROR)),
+            int(self.getParameterValue(self.TILE_ROWS)),
+            int(self.getParameterValue(self.WORKERS)), timings,
+            incremental=self.getParameterValue(self.INCREMENTAL),
+            fields=self.getParameterValue(self.WRITE_FIELDS),
+            **self.callbacks(progress))
+        self.setOutputValue(self.OUTPUT, vector_file)
+        return ['%s features stored: %s' % (len(names), ', '.join(names))]
+
+
+class ClassificationAlgorithm(AnalysisAlgorithm):
+
+    SEGMENTS_VECTOR = 'SEGMENTS_VECTOR'
+    SEGMENTS = 'SEGMENTS'
+    ROIS = 'ROIS'
+    FIELD = 'FIELD'
+    MODEL = 'MODEL'
+    MAJORITY = 'MAJORITY'
+    OVERLAP = 'OVERLAP'
+    ENGINE = 'ENGINE'
+    KERNEL = 'KERNEL'
+    C = 'C'
+    GAMMA = 'GAMMA'
+    DEGREE = 'DEGREE'
+    COEF0 = 'COEF0'
+    CHUNK = 'CHUNK'
+    WORKERS = 'WORKERS'
+    OUTPUT = 'OUTPUT'
+
+    def defineCharacteristics(self):
+        self.name = 'Segment classification'
+        self.group = 'Image Analysis'
+        self.addParameter(ParameterVector(
+            self.SEGMENTS_VECTOR, 'Segments, with stored features',
+            [ParameterVector.VECTOR_TYPE_POLYGON]))
+        self.addParameter(ParameterRaster(
+            self.SEGMENTS, 'Segment raster (next to the segments if not set)',
+            True))
+        self.addParameter(ParameterVector(
+            self.ROIS, 'ROIs', [ParameterVector.VECTOR_TYPE_POLYGON], True))
+        self.addParameter(ParameterTableField(
+            self.FIELD, 'Class field (the last one if not set)', self.ROIS,
+            ParameterTableField.DATA_TYPE_ANY, True))
+        self.addParameter(ParameterFile(
+            self.MODEL, 'Saved model (instead of ROIs)', False, True))
+        self.addParameter(ParameterNumber(self.MAJORITY, 'Majority', 0.0,
+                                          1.0, 0.5))
+        self.addParameter(ParameterNumber(self.OVERLAP, 'Min overlap', 0.0,
+                                          1.0, 0.0))
+        self.addParameter(ParameterSelection(
+            self.ENGINE, 'Engine', [label for _, label in models.ENGINES],
+            0))
+        self.addParameter(ParameterSelection(self.KERNEL, 'Kernel', KERNELS,
+                                             1))
+        self.addParameter(ParameterNumber(self.C, 'C', 0.0, 10000.0, 1.0))
+        self.addParameter(ParameterNumber(self.GAMMA, 'Gamma (0 for 1 / '
+                                          'features)', 0.0, 100.0, 0.0))
+        self.addParameter(ParameterNumber(self.DEGREE, 'Degree', 1, 10, 3))
+        self.addParameter(ParameterNumber(self.COEF0, 'Coefficient', 0.0,
+                                          100.0, 0.0))
+        self.addParameter(ParameterNumber(self.CHUNK, 'Chunk size', 1000,
+                                          10000000, 50000))
+        self.addParameter(ParameterNumber(self.WORKERS, 'Workers', 1, 64, 1))
+        self.addOutput(OutputVector(self.OUTPUT, 'Classification'))
+        self.addReport()
+
+    def train(self, vector_file, progress, timings):
+        """File of the model fit on the ROI samples, the one saved by a
+        previous run with the same samples and parameters if any."""
+        labels_file = self.getParameterValue(self.SEGMENTS)
+        source, layer = vectorize.split_source(vector_file)
+        if not labels_file:
+            labels_file = vectorize.sibling_raster(source, layer=layer)
+            if not labels_file:
+                raise ValueError('no segment raster of %s next to it, please '
+                                 'set it' % vector_file)
+        elif not vectorize.matches_layer(
+                gdal.Open(labels_file, gdal.GA_ReadOnly), source, layer):
+            raise ValueError('the extent or projection of %s does not match '
+                             '%s' % (labels_file, vector_file))
+        roi_file = self.getParameterValue(self.ROIS)
+        if not roi_file:
+            raise ValueError('please set ROIs or a saved model')
+        progress.setText('extracting samples')
+        start = time.time()
+        rois, srs_wkt = pipeline.read_rois(roi_file,
+                                           self.getParameterValue(self.FIELD))
+        samples, labels, names = pipeline.roi_samples(
+            labels_file, vector_file, rois, srs_wkt,
+            float(self.getParameterValue(self.MAJORITY)),
+            float(self.getParameterValue(self.OVERLAP)))
+        timings['samples'] = time.time() - start
+        if not len(samples):
+            raise ValueError('no segment under the ROIs')
+        engine = models.ENGINES[self.getParameterValue(self.ENGINE)][0]
+        params = {
+            'kernel': KERNELS[self.getParameterValue(self.KERNEL)],
+            'C': float(self.getParameterValue(self.C)),
+            'gamma': float(self.getParameterValue(self.GAMMA)),
+            'degree': int(self.getParameterValue(self.DEGREE)),
+            'coef0': float(self.getParameterValue(self.COEF0)),
+        }
+        progress.setText('%s: fitting %s samples' % (engine, len(samples)))
+        start = time.time()
+        model, reused = models.fit_or_load(
+            samples, labels, params, names, classifier.model_dir(), engine,
+            int(self.getParameterValue(self.WORKERS)))
+        timings[reused and 'model reused' or 'fit'] = time.time() - start
+        return models.model_filename(classifier.model_dir(), model.key)
+
+    def process(self, progress, timings):
+        vector_file = self.getParameterValue(self.SEGMENTS_VECTOR)
+        model_file = self.getParameterValue(self.MODEL)
+        if not model_file:
+            model_file = self.train(vector_file, progress, timings)
+        progress.setPercentage(50)
+        progress.setText('predicting')
+        filename = self.getOutputValue(self.OUTPUT)
+        _, count = pipeline.classify(
+            vector_file, model_file, filename,
+            int(self.getParameterValue(self.CHUNK)),
+            int(self.getParameterValue(self.WORKERS)), timings,
+            vectorize.vector_driver(filename))
+        return ['%s segments classified with %s' % (count, model_file)]
+
+
+class AnalysisProvider(AlgorithmProvider):
+
+    def __init__(self):
+        AlgorithmProvider.__init__(self)
+        self.alglist = [SegmentationAlgorithm(), StatisticsAlgorithm(),
+                        ClassificationAlgorithm()]
+        for alg in self.alglist:
+            alg.provider = self
+
+    def getName(self):
+        return 'imageanalysis'
+
+    def getDescription(self):
+        return 'Image Analysis'
+
+    def getIcon(self):
+        return QIcon(ICON)
+
+    def getSupportedOutputVectorLayerExtensions(self):
+        return ['gpkg', 'shp']
+
+    def _loadAlgorithms(self):
+        self.algs = self.alglist
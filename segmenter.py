@@ -26,32 +26,24 @@
 #
 #***********************************************************************
 
-try:
-    import cPickle as pickle
-except:
-    import pickle
 import os
-import subprocess
-import sys
 import tempfile
 import time
 
 from PyQt4 import QtCore
 from qgis.core import *
 
-import numpy as np
 from osgeo import gdal
-from sklearn.cluster import KMeans
-from scipy import ndimage
-from scipy import stats
 
+import pipeline
 import util
 
 class Task(util.Task):
     def setup(self, *args):
         gdal.UseExceptions()
         # unpack arguments
-        raster_ipt, n_clusters = args
+        raster_ipt, n_clusters, filter_size, overviews, preview = args[0:5]
+        method, n_samples, n_init, tile_rows = args[5:]
         try:
             rst_layer = self.parent.get_layer(QgsMapLayer.RasterLayer,
                                                    raster_ipt)
@@ -59,105 +51,134 @@ class Task(util.Task):
             self.valid = False
             self.invalid = 'Please, set raster image.'
             return
-        # open raster images
-        rst_ds = gdal.Open(rst_layer.source(), gdal.GA_ReadOnly)
-        # create temp output raster
-        # tmp_rst = tempfile.NamedTemporaryFile()
+        if int(filter_size) % 2 == 0:
+            self.valid = False
+            self.invalid = 'Please, set an odd filter size.'
+            return
+        # output raster, created by the worker once segments are known
         filename = '%s/kmeans_c%s_%s.tif' % (
                         os.path.dirname(rst_layer.source()),
                         n_clusters,
                         int(time.time())
                     )
-        # calling gdal directly was crashing qgis
-        subprocess.call("""%s -c "from osgeo import gdal
-driver = gdal.GetDriverByName('GTiff')
-dst_ds = driver.Create('%s', %s, %s, 1, gdal.GDT_UInt32)
-dst_ds.SetGeoTransform(%s)
-dst_ds.SetProjection('%s')
-dst_ds = None"
-""" % (sys.executable, filename, rst_ds.RasterXSize, rst_ds.RasterYSize,
-       rst_ds.GetGeoTransform(), rst_ds.GetProjection().replace('"', '\\"')),
-                        shell=True)
-        self.dst_ds = gdal.Open(filename, gdal.GA_Update)
-
-        self.worker = Worker(rst_ds, n_clusters)
+        # the uncompressed cluster raster the worker filters in place,
+        # shown as the live preview
+        self.preview_file = None
+        if preview:
+            self.preview_file = os.path.join(tempfile.gettempdir(),
+                                'preview_%s' % os.path.basename(filename))
+
+        self.worker = Worker(rst_layer.source(), filename, n_clusters,
+                             method=str(method).lower().replace('-', ''),
+                             n_samples=int(n_samples),
+                             n_init=int(n_init),
+                             tile_rows=int(tile_rows),
+                             filter_size=int(filter_size),
+                             overviews=overviews,
+                             clusters_file=self.preview_file,
+                             preview_interval=preview and 2.0 or 0)
         self.worker.update_raster.connect(self.update_raster)
         self.filename = filename
         self.rlayer = None
+        self.preview_time = 0.0
+        self.preview_count = 0
 
-    def update_raster(self, obj):
-        band = self.dst_ds.GetRasterBand(1)
-        band.WriteArray(pickle.loads(str(obj)), 0, 0)
-        band.FlushCache()
-        band = None
+    def show_raster(self, filename):
         # remove/add output raster to canvas
         if self.rlayer:
             self.parent.layer_registry.removeMapLayer(self.rlayer.id())
-        self.rlayer = QgsRasterLayer(self.filename,
-                                     os.path.basename(self.filename))
+        self.rlayer = QgsRasterLayer(filename, os.path.basename(filename))
         self.parent.layer_registry.addMapLayer(self.rlayer)
 
+    def update_raster(self, yoff, ysize):
+        # the worker flushed the changed rows to the preview file
+        start = time.time()
+        self.show_raster(self.preview_file)
+        self.preview_time += time.time() - start
+        self.preview_count += 1
 
     def post_run(self, obj):
-        # polygonize
-        self.completed = ('completed successfully. ')
+        self.show_raster(self.filename)
+        if self.worker.vector_file:
+            vector_file = self.worker.vector_file
+            vlayer = QgsVectorLayer(vector_file,
+                                    os.path.basename(vector_file), 'ogr')
+            self.parent.layer_registry.addMapLayer(vlayer)
+        if self.preview_file:
+            self.parent.log('preview: %s updates in %.2fs' % (
+                                self.preview_count, self.preview_time))
+            gdal.GetDriverByName('GTiff').Delete(self.preview_file)
+        self.completed = ('completed successfully. '
+                          + '<i>%s</i> segments found.' % obj)
 
 
 class Worker(util.Worker):
-    update_raster = QtCore.pyqtSignal(str)
-
-    def __init__(self, rst_ds, n_clusters):
+    # rows (offset, count) of the preview raster that changed
+    update_raster = QtCore.pyqtSignal(int, int)
+
+    def __init__(self, raster_file, filename, n_clusters, method='full',
+                 n_samples=100000, n_init=10, tile_rows=256, filter_size=3,
+                 connectivity=4, compress='DEFLATE', overviews=False,
+                 vector_driver='GPKG', polygonize_workers=1,
+                 clusters_file=None, preview_interval=2.0):
         util.Worker.__init__(self)
-        self.rst_ds = rst_ds
+        self.raster_file = raster_file
+        self.filename = filename
         self.n_clusters = int(n_clusters)
+        self.method = method
+        self.n_samples = int(n_samples)
+        self.n_init = int(n_init)
+        self.tile_rows = int(tile_rows)
+        self.filter_size = int(filter_size)
+        self.connectivity = int(connectivity)
+        self.compress = compress
+        self.overviews = overviews
+        # None skips polygonization
+        self.vector_driver = vector_driver
+        # > 1 polygonizes strips in a process pool
+        self.polygonize_workers = polygonize_workers
+        self.vector_file = None
+        # cluster raster of the preview, a temporary file if None
+        self.clusters_file = clusters_file
+        # seconds between previews, 0 disables them
+        self.preview_interval = preview_interval
+        self.dirty = None
+        self.last_preview = 0
+
+    def update_preview(self, yoff, yend, force=False):
+        """Mark rows [yoff, yend) of the cluster raster as changed, notifying
+        the task at most once every preview_interval seconds, or now if
+        `force` is set, of every row changed since the last notification."""
+        if yend <= yoff:
+            if not (force and self.dirty):
+                return
+            yoff, yend = self.dirty
+        elif self.dirty:
+            yoff = min(yoff, self.dirty[0])
+            yend = max(yend, self.dirty[1])
+        self.dirty = (yoff, yend)
+        now = time.time()
+        if force or now - self.last_preview >= self.preview_interval:
+            self.last_preview = now
+            self.dirty = None
+            self.update_raster.emit(yoff, yend - yoff)
 
     @util.error_handler
     def run(self):
-        rst_x = self.rst_ds.RasterXSize
-        rst_y = self.rst_ds.RasterYSize
-        bands = self.rst_ds.RasterCount
-        data_rst = self.rst_ds.ReadAsArray()
+        start = time.time()
         self.log.emit('each step may take a few minutes')
-
-        kmeans = KMeans(n_clusters=self.n_clusters, init='k-means++', n_init=10)
-        if self.abort:
+        result = pipeline.segment(
+            self.raster_file, self.n_clusters, self.filename, self.method,
+            self.n_samples, self.n_init, self.tile_rows, self.filter_size,
+            self.connectivity, self.compress, self.overviews,
+            self.vector_driver, self.polygonize_workers,
+            clusters_file=self.clusters_file,
+            progress=self.report_progress, status=self.status.emit,
+            log=self.log.emit,
+            preview=self.preview_interval and self.update_preview or None)
+        if result is None:
             self.finished.emit(False, 'Terminated.')
             return
-        self.status.emit('clustering data... ')
-        clusters = kmeans.fit_predict(data_rst.reshape(6, rst_y*rst_x).T)
-        clusters = clusters.reshape(rst_y, rst_x)
-        self.progress.emit(15)
-        self.update_raster.emit(pickle.dumps(clusters))
-
-        self.status.emit('applying mode filter...')
-        step = 0
-        for i in range(1,rst_y-1):
-            for j in range(1,rst_x-1):
-                if self.abort:
-                    self.finished.emit(False, 'Terminated.')
-                    return
-                retorno = stats.mode(clusters[i-1:i+2,j-1:j+2], axis=None)
-                clusters[i][j]=retorno[0]
-            step += 1
-            if step % 10 == 0:
-                self.calculate_progress(step, rst_y, 15, 50)
-                self.update_raster.emit(pickle.dumps(clusters))
-
-        self.status.emit('labelling connected components')
-        segments = np.zeros(shape=(rst_y, rst_x), dtype=np.int32)
-        components = 0
-        step = 0
-        for i in np.unique(clusters):
-            if self.abort:
-                self.finished.emit(False, 'Terminated.')
-                return
-            tmp = np.where(clusters==i, 1, 0).reshape(rst_y, rst_x)
-            lbl, comp = ndimage.label(tmp)
-            segments += np.ma.masked_equal(lbl, 0) + components
-            components += comp
-            step += 1
-            self.calculate_progress(step, self.n_clusters, 65, 35)
-
-        pickle_segments = pickle.dumps(segments)
-        self.update_raster.emit(pickle_segments)
-        self.output = pickle.dumps(pickle_segments)
+        _, self.vector_file, n_segments = result
+        self.log.emit('compute: %.2fs' % (time.time() - start))
+        self.output = str(n_segments)
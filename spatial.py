@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Columnar segment tables and bulk loaded bounding box index
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+from collections import OrderedDict
+
+import numpy as np
+
+# geometries kept in memory by default, about 1GB for segments of a few
+# hundred vertices
+CACHE_SIZE = 250000
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # NULL attributes
+        return np.nan
+
+
+def float_columns(rows, n_cols=None):
+    """(n, n_cols) float64 matrix of attribute rows, NULL (or otherwise
+    non numeric) values as NaN."""
+    if not len(rows):
+        return np.zeros((0, n_cols or 0))
+    try:
+        return np.array(rows, dtype=np.float64).reshape(len(rows), -1)
+    except (TypeError, ValueError):
+        return np.array([[_float(v) for v in row] for row in rows],
+                        dtype=np.float64).reshape(len(rows), -1)
+
+
+class BoxIndex(object):
+    """Static index of (n, 4) bounding boxes, (xmin, ymin, xmax, ymax).
+
+    Bulk loaded by sort-tile-recursive packing: boxes are sorted by centre
+    x into about sqrt(n / leaf) slices, by centre y within each slice, and
+    packed in leaves of `leaf` boxes. A query tests the extents of every
+    leaf, then the boxes of the leaves hit, both as array operations.
+    Boxes with NaN coordinates (empty geometries) are never returned.
+    """
+
+    def __init__(self, boxes, leaf=64):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        n = len(boxes)
+        self.leaf = leaf
+        n_leaves = max((n + leaf - 1) // leaf, 1)
+        per_slice = int(np.ceil(np.sqrt(n_leaves))) * leaf
+        cx = boxes[:, 0] + boxes[:, 2]
+        cy = boxes[:, 1] + boxes[:, 3]
+        rank = np.empty(n, dtype=np.int64)
+        rank[np.argsort(cx, kind='mergesort')] = np.arange(n)
+        self.order = np.lexsort((cy, rank // per_slice))
+        self.boxes = boxes[self.order]
+        self.starts = np.arange(0, n, leaf)
+        if n:
+            with np.errstate(invalid='ignore'):
+                self.extents = np.column_stack([
+                    np.fmin.reduceat(self.boxes[:, 0], self.starts),
+                    np.fmin.reduceat(self.boxes[:, 1], self.starts),
+                    np.fmax.reduceat(self.boxes[:, 2], self.starts),
+                    np.fmax.reduceat(self.boxes[:, 3], self.starts),
+                ])
+        else:
+            self.extents = np.zeros((0, 4))
+
+    def __len__(self):
+        return len(self.order)
+
+    @staticmethod
+    def _overlaps(boxes, xmin, ymin, xmax, ymax):
+        with np.errstate(invalid='ignore'):
+            return ((boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) &
+                    (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin))
+
+    def intersects(self, xmin, ymin, xmax, ymax):
+        """Rows, in input order, of the boxes intersecting a query box."""
+        hit = np.flatnonzero(self._overlaps(self.extents, xmin, ymin,
+                                            xmax, ymax))
+        if not len(hit):
+            return np.zeros(0, dtype=np.int64)
+        # positions of the boxes of every leaf hit
+        starts = self.starts[hit]
+        sizes = np.minimum(starts + self.leaf, len(self.order)) - starts
+        offsets = np.repeat(starts - np.cumsum(sizes) + sizes, sizes)
+        positions = np.arange(sizes.sum()) + offsets
+        found = self._overlaps(self.boxes[positions], xmin, ymin, xmax, ymax)
+        return np.sort(self.order[positions[found]])
+
+
+class GeometryCache(object):
+    """Store of up to `size` geometries by fid, least recently used first
+    out. A size of 0 disables it."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, fid, geom):
+        if not self.size:
+            return
+        self.items[fid] = geom
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def get(self, fid):
+        geom = self.items.pop(fid, None)
+        if geom is None:
+            self.misses += 1
+            return None
+        self.items[fid] = geom
+        self.hits += 1
+        return geom
@@ -29,17 +29,20 @@ import time
 
 from qgis.core import *
 
-import numpy as np
-from osgeo import gdal
-from osgeo import ogr
-
+import pipeline
+import store
 import util
+import zonal
 
 
 class Task(util.Task):
     def setup(self, *args):
         # unpack arguments
-        stats_raster, stats_segm = args
+        stats_raster, stats_segm, stats_labels = args[0:3]
+        use_range, use_pct, use_shape, use_texture, levels = args[3:8]
+        error = args[8]
+        batch_size, workers, tile_rows, incremental = args[9:13]
+        self.write_fields = args[13]
         try:
             self.seg_layer = self.parent.get_layer(QgsMapLayer.VectorLayer,
                                                    stats_segm)
@@ -49,13 +52,35 @@ class Task(util.Task):
             self.valid = False
             self.invalid = 'Please, set raster and segmented images.'
             return
-        # # open images
-        rst_ds = gdal.Open(self.rst_layer.source(), gdal.GA_ReadOnly)
+        if not self.write_fields and not store.store_path(
+                self.seg_layer.source()):
+            self.valid = False
+            self.invalid = ('The segments layer is not a file, statistics '
+                            'can only be written to its fields.')
+            return
+        # optional label raster of the segments
+        labels_file = None
+        if stats_labels:
+            labels_file = self.parent.get_layer(QgsMapLayer.RasterLayer,
+                                                stats_labels).source()
+        # feature families, in field order
+        selected = {'range': use_range, 'percentiles': use_pct,
+                    'texture': use_texture, 'shape': use_shape}
+        families = ['basic'] + [f for f in zonal.FAMILIES if selected.get(f)]
         # setup worker
-        self.worker = Worker(self.seg_layer, self.rst_layer, rst_ds)
+        self.worker = Worker(self.seg_layer, self.rst_layer.source(),
+                             labels_file, families, int(levels),
+                             float(error), int(batch_size), int(workers),
+                             int(tile_rows), incremental, self.write_fields)
 
     def post_run(self, obj):
         feat_count = obj
+        if not self.write_fields:
+            self.completed = ('completed successfully. Features of <i>%s</i> '
+                              'segments of <b>%s</b> stored.' % (
+                                feat_count,
+                                self.parent.stats_segm_ipt.currentText()))
+            return
         self.completed = ('completed successfully. '
                           + 'Layer <b>%s</b> updated with <i>%s</i> fields.'
                           % (self.parent.stats_segm_ipt.currentText(),
@@ -65,94 +90,105 @@ class Task(util.Task):
 
 
 class Worker(util.Worker):
-    def __init__(self, seg_layer, rst_layer, rst_ds):
+    def __init__(self, seg_layer, raster_file, labels_file=None,
+                 families=zonal.DEFAULT_FAMILIES, levels=32, error=0.0,
+                 batch_size=10000, workers=1, tile_rows=1024,
+                 incremental=False, write_fields=True):
         util.Worker.__init__(self)
         self.seg_layer = seg_layer
-        self.rst_layer = rst_layer
-        self.rst_ds = rst_ds
-
-    @util.error_handler
-    def run(self):
-        # to-do, move to init, notify user of more than 1 field
-        # if len(self.seg_layer.fields) > 2:
-        #     self.__log('zonal stats might already be present')
-        #     # zonal stats are probably present
-        #     return
-
-        # open images, moved to task, crashed qgis
-        # rst_ds = gdal.Open(self.rst_layer.source())
-        rst_ds = self.rst_ds
+        self.raster_file = raster_file
+        # label raster of the segments, on the grid of the raster
+        self.labels_file = labels_file
+        # zonal feature families and texture grey levels
+        self.families = families
+        self.levels = levels
+        # error bound of the quantiles of large segments, 0 for exact
+        self.error = error
+        # features per changeAttributeValues call
+        self.batch_size = batch_size
+        # processes computing the features, by strips of tile_rows rows
+        self.workers = workers
+        self.tile_rows = tile_rows
+        # only recompute segments edited since the last run
+        self.incremental = incremental
+        # also write the features to the layer, besides the feature store
+        self.write_fields = write_fields
+
+    def write_stats(self, pairs, total, stats, field_idx):
+        """Write the statistics of each (fid, segment id) pair to its
+        fields, one changeAttributeValues call per batch of features."""
         seg_dp = self.seg_layer.dataProvider()
-        # create temporary raster off segmented image
-        self.status.emit('temporary rasterizing segments.')
-        time.sleep(0.5)
-        args = ('', rst_ds.RasterXSize, rst_ds.RasterYSize, 1, gdal.GDT_UInt16)
-        segr_ds = gdal.GetDriverByName('MEM').Create(*args)
-        segr_ds.SetGeoTransform(rst_ds.GetGeoTransform())
-        segr_bd = segr_ds.GetRasterBand(1)
-        segr_bd.Fill(0) #initialise raster with zeros
-        segr_bd.SetNoDataValue(0)
-        # rasterize arguments
-        seg_ds = ogr.Open(self.seg_layer.source())
-        # gets the first field on seg layer to burn pixels
-        attrs = ['ATTRIBUTE=%s' % seg_dp.fields()[0].name()]
-        err = gdal.RasterizeLayer(segr_ds, [1], seg_ds.GetLayer(),
-                                  options=attrs)
-        if err:
-            raise Exception("error rasterizing segments layer: %s" % err)
-        self.progress.emit(15)
-        segr_ds.FlushCache()
-
-        self.status.emit('setting data up.')
-        time.sleep(0.5)
-        # read arrays
-        data_img = rst_ds.ReadAsArray()
-        data_seg = segr_ds.ReadAsArray()
-
-        # transpose img information into a vector of band-dimensional vectors
-        img_vector = data_img.transpose(1,2,0).reshape(data_seg.size,6)
-
-        # get indices for each segment in a 1d vector
-        u, indices = np.unique(data_seg, return_inverse=True)
-
-        self.progress.emit(30)
-
+        n_zones = len(stats) - 1
+        missing = [None] * len(field_idx)
+        updates = {}
+        n_iter = 0
+        for fid, segment_id in pairs:
+            if segment_id is not None and 0 < segment_id <= n_zones:
+                values = stats[segment_id].tolist()
+            else:
+                # not rasterized (smaller than a pixel)
+                values = missing
+            updates[fid] = dict(zip(field_idx, values))
+            n_iter += 1
+            if len(updates) >= self.batch_size:
+                seg_dp.changeAttributeValues(updates)
+                updates = {}
+                self.calculate_progress(n_iter, total, 65, 35)
+        if updates:
+            seg_dp.changeAttributeValues(updates)
+        return n_iter
+
+    def write_layer(self, names, stats, changed, ids):
+        """Write the statistics to the fields of the segments layer, creating
+        the missing ones, in a single edit command. `ids` maps fids to
+        segment ids, when known."""
+        seg_dp = self.seg_layer.dataProvider()
+        feat_count = seg_dp.featureCount()
         self.seg_layer.beginEditCommand("Statistics generation")
         try:
-            # create fields
-            field_names = ['avg', 'mdn', 'var']
+            # reuse fields of a previous run, create the others
             # type: QVariant.Double
-            fields = [QgsField('_'.join([str(b+1), i]), 6, 'Real', 15, 5)
-                        for b in range(rst_ds.RasterCount)
-                        for i in field_names]
-            seg_dp.addAttributes(fields)
-            self.progress.emit(40)
-            # iterate through each feature in the shp file (segment),
-            # calculate zonal statistics and write to shp field
-            func_names = [np.average, np.median, np.std]
-            feat_count = seg_dp.featureCount()
-            n_iter = 0
-            self.status.emit('calculating...')
-            for feat in seg_dp.getFeatures():
-                segment_id = feat.attributes()[0]
-                mat = np.multiply(img_vector.T, (indices == segment_id-1))
-                mat = (mat.T[np.all(mat.T > 0, axis=1)]).T # filter 0 values
-                stats = np.array([np.apply_over_axes(f, mat, [1]).flatten()
-                                  for f in func_names]).T.flatten()
-                seg_dp.changeAttributeValues({
-                        feat.id(): dict(zip(range(len(feat.attributes())),
-                                            [segment_id] + stats.tolist()))
-                    })
-                # feat.setAttributes([segment_id] + stats.tolist())
-
-                n_iter += 1
-                self.progress.emit(n_iter * 60 / feat_count + 40)
+            fields = [QgsField(name, 6, 'Real', 15, 5) for name in names
+                      if seg_dp.fieldNameIndex(name) < 0]
+            if fields:
+                seg_dp.addAttributes(fields)
+            field_idx = [seg_dp.fieldNameIndex(name) for name in names]
+            start = time.time()
+            if changed is None and ids is not None:
+                n_iter = self.write_stats(ids.items(), feat_count, stats,
+                                          field_idx)
+            elif changed is None:
+                request = QgsFeatureRequest()
+                request.setFlags(QgsFeatureRequest.NoGeometry)
+                request.setSubsetOfAttributes([0])
+                pairs = ((f.id(), f.attributes()[0])
+                         for f in seg_dp.getFeatures(request))
+                n_iter = self.write_stats(pairs, feat_count, stats,
+                                          field_idx)
+            else:
+                n_iter = self.write_stats([(fid, ids[fid]) for fid in changed],
+                                          len(changed), stats, field_idx)
+            self.log.emit('write-back of %s features in %.2fs' % (
+                            n_iter, time.time() - start))
         except Exception, e:
             self.seg_layer.destroyEditCommand()
             raise e
         else:
             self.seg_layer.endEditCommand()
 
-        self.output = str(feat_count)
+    @util.error_handler
+    def run(self):
+        # the steps are those of the command line and Processing; only the
+        # fields are written through the layer, so QGIS sees the edit
+        result = pipeline.statistics(
+            self.raster_file, self.labels_file, self.seg_layer.source(),
+            self.families, self.levels, self.error, self.tile_rows,
+            self.workers, incremental=self.incremental,
+            fields=self.write_fields and self.write_layer or None,
+            progress=self.report_progress, status=self.status.emit,
+            log=self.log.emit)
+        if result is None:
+            self.finished.emit(False, 'Terminated.')
+            return
+        self.output = str(self.seg_layer.dataProvider().featureCount())
         self.status.emit('Statistics generation done.')
-
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Columnar store of segment features, next to the segments layer
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+# A store is a folder holding features.npy, a float64 matrix with a row per
+# segment id (row 0 and the ids of segments without pixels being NaN) and a
+# column per feature, and manifest.json, with the feature names and the
+# provenance of the statistics: raster, settings and when they were written.
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import vectorize
+
+DATA = 'features.npy'
+MANIFEST = 'manifest.json'
+VERSION = 1
+
+
+def store_path(source):
+    """Store folder of a segments layer source, next to its file; None if
+    it is not file based."""
+    vector_file, layer = vectorize.split_source(source)
+    if not os.path.isfile(vector_file):
+        return None
+    return '%s.%s.features' % (vector_file, layer)
+
+
+def save(path, stats, names, provenance):
+    """Write the (max id + 1, len(names)) features of the segments as a new
+    store, through a temporary folder so readers never see a partial one."""
+    stats = np.asarray(stats, dtype=np.float64)
+    if stats.ndim != 2 or stats.shape[1] != len(names):
+        raise ValueError('%s features for %s names' % (stats.shape[-1],
+                                                       len(names)))
+    part = path + '.part'
+    if os.path.isdir(part):
+        shutil.rmtree(part)
+    os.makedirs(part)
+    np.save(os.path.join(part, DATA), stats)
+    manifest = {'version': VERSION, 'names': list(names),
+                'rows': len(stats), 'provenance': provenance,
+                'written': time.time()}
+    with open(os.path.join(part, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    remove(path)
+    os.rename(part, path)
+
+
+def load_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if manifest.get('version') != VERSION:
+        return None
+    return manifest
+
+
+def load(path, mode='r'):
+    """(features, manifest) of a store, the features memory mapped; None if
+    there is no (readable) store at `path`."""
+    manifest = path and load_manifest(path)
+    if not manifest:
+        return None
+    try:
+        data = np.load(os.path.join(path, DATA), mmap_mode=mode)
+    except (IOError, OSError, ValueError):
+        return None
+    if data.shape != (manifest['rows'], len(manifest['names'])):
+        return None
+    return data, manifest
+
+
+def update(path, segment_ids, values, provenance):
+    """Overwrite the features of some segments in place. False, leaving the
+    store as it was, if it has no row for one of them."""
+    stored = load(path, 'r+')
+    if stored is None:
+        return False
+    data, manifest = stored
+    segment_ids = np.asarray(segment_ids, dtype=np.int64)
+    if len(segment_ids) and (segment_ids.min() < 0 or
+                             segment_ids.max() >= len(data)):
+        return False
+    data[segment_ids] = values
+    data.flush()
+    del data
+    manifest.update(provenance=provenance, written=time.time())
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return True
+
+
+def remove(path):
+    if path and os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def lookup(data, segment_ids):
+    """(n, features) rows of the segment ids, as floats, NaN for ids that
+    are NaN or beyond the store."""
+    segment_ids = np.asarray(segment_ids, dtype=np.float64)
+    out = np.full((len(segment_ids), data.shape[1]), np.nan)
+    with np.errstate(invalid='ignore'):
+        valid = (segment_ids >= 0) & (segment_ids < len(data))
+    rows = segment_ids[valid].astype(np.int64)
+    if len(rows) and (np.diff(rows) == 1).all():
+        # consecutive ids, as the segmentation numbers them: one slice
+        out[valid] = data[rows[0]:rows[-1] + 1]
+    else:
+        out[valid] = data[rows]
+    return out
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Windowed (strip by strip) raster reading and writing
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+import sys
+
+import numpy as np
+from osgeo import gdal
+from osgeo import gdal_array
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+
+def tile_rows(ds, rows=256):
+    """Round `rows` up to a multiple of the dataset natural block height, so
+    strips never split a GDAL block."""
+    block = ds.GetRasterBand(1).GetBlockSize()[1] or 1
+    rows = max(int(rows), 1)
+    return min(((rows + block - 1) // block) * block, ds.RasterYSize)
+
+
+def strips(n_rows, rows, halo=0):
+    """Yield (yoff, ysize, top, bottom) windows covering `n_rows` rows by
+    strips of `rows`. top/bottom are the number of halo rows included above
+    and below the strip, clipped at the image borders; the strip to read is
+    (yoff - top, ysize + top + bottom)."""
+    for yoff in range(0, n_rows, rows):
+        ysize = min(rows, n_rows - yoff)
+        top = min(halo, yoff)
+        bottom = min(halo, n_rows - yoff - ysize)
+        yield yoff, ysize, top, bottom
+
+
+def read_pixels(ds, yoff, ysize, dtype=np.float32):
+    """Read a full width strip as a (pixels, bands) matrix, keeping the
+    raster type if dtype is None."""
+    data = ds.ReadAsArray(0, yoff, ds.RasterXSize, ysize)
+    data = data.reshape(ds.RasterCount, ysize * ds.RasterXSize)
+    if dtype is None:
+        return data.T
+    return data.T.astype(dtype)
+
+
+def iter_pixels(ds, rows, dtype=np.float32):
+    """Yield (yoff, ysize, pixels) for every strip of the dataset."""
+    for yoff, ysize, _, _ in strips(ds.RasterYSize, rows):
+        yield yoff, ysize, read_pixels(ds, yoff, ysize, dtype)
+
+
+# smallest GDAL type, with its numpy counterpart, holding values up to
+# each bound; larger ids are kept exact as Float64 (up to 2**53)
+INT_TYPES = [
+    (2**8 - 1, gdal.GDT_Byte, np.uint8),
+    (2**16 - 1, gdal.GDT_UInt16, np.uint16),
+    (2**32 - 1, gdal.GDT_UInt32, np.uint32),
+]
+
+
+def raster_type(max_value):
+    """(gdal type, numpy dtype) of the smallest type holding max_value."""
+    for bound, gdal_type, dtype in INT_TYPES:
+        if max_value <= bound:
+            return gdal_type, dtype
+    return gdal.GDT_Float64, np.float64
+
+
+def creation_options(gdal_type, compress='DEFLATE', tiled=True, block=256):
+    """GTiff creation options for label rasters."""
+    options = ['BIGTIFF=IF_SAFER']
+    if tiled:
+        options += ['TILED=YES', 'BLOCKXSIZE=%s' % block,
+                    'BLOCKYSIZE=%s' % block]
+    if compress:
+        options.append('COMPRESS=%s' % compress)
+        if compress in ('DEFLATE', 'LZW'):
+            # horizontal differencing for integers, floating point otherwise
+            predictor = gdal_type == gdal.GDT_Float64 and 3 or 2
+            options.append('PREDICTOR=%s' % predictor)
+    return options
+
+
+def create_raster(filename, like, max_value, compress='DEFLATE', tiled=True):
+    """Create a single band GTiff on the grid of dataset `like`, with the
+    smallest integer type holding max_value."""
+    gdal_type = raster_type(max_value)[0]
+    driver = gdal.GetDriverByName('GTiff')
+    ds = driver.Create(filename, like.RasterXSize, like.RasterYSize, 1,
+                       gdal_type, creation_options(gdal_type, compress, tiled))
+    ds.SetGeoTransform(like.GetGeoTransform())
+    ds.SetProjection(like.GetProjection())
+    return ds
+
+
+def pixel_window(ds, xmin, ymin, xmax, ymax, margin=1):
+    """(xoff, yoff, xsize, ysize) of the pixels of a north up dataset
+    covering a map extent, plus `margin` pixels, clipped to the raster."""
+    gt = ds.GetGeoTransform()
+    cols = sorted([(xmin - gt[0]) / gt[1], (xmax - gt[0]) / gt[1]])
+    rows = sorted([(ymin - gt[3]) / gt[5], (ymax - gt[3]) / gt[5]])
+    x0 = max(int(np.floor(cols[0])) - margin, 0)
+    y0 = max(int(np.floor(rows[0])) - margin, 0)
+    x1 = min(int(np.ceil(cols[1])) + margin, ds.RasterXSize)
+    y1 = min(int(np.ceil(rows[1])) + margin, ds.RasterYSize)
+    return x0, y0, max(x1 - x0, 0), max(y1 - y0, 0)
+
+
+def window_grid(ds, xoff, yoff, xsize, ysize, gdal_type=gdal.GDT_Byte):
+    """Empty in memory dataset on a window of the grid of `ds`."""
+    gt = list(ds.GetGeoTransform())
+    gt[0] += xoff * gt[1] + yoff * gt[2]
+    gt[3] += xoff * gt[4] + yoff * gt[5]
+    grid = gdal.GetDriverByName('MEM').Create('', xsize, ysize, 1,
+                                              gdal_type)
+    grid.SetGeoTransform(gt)
+    grid.SetProjection(ds.GetProjection())
+    return grid
+
+
+def write_array(ds, array, rows=256):
+    """Write a 2d array on the first band of `ds`, strip by strip, casting
+    each strip to the band type."""
+    for yoff, ysize, _, _ in strips(array.shape[0], rows):
+        write_rows(ds, array[yoff:yoff+ysize], yoff)
+    ds.GetRasterBand(1).FlushCache()
+
+
+def read_rows(ds, yoff, ysize, dtype=None):
+    """Rows [yoff, yoff + ysize) of the first band of `ds`, as `dtype` if
+    set."""
+    data = ds.GetRasterBand(1).ReadAsArray(0, yoff, ds.RasterXSize, ysize)
+    if dtype is None:
+        return data
+    return data.astype(dtype)
+
+
+def write_rows(ds, array, yoff):
+    """Write the rows of a 2d array on the first band of `ds` from row
+    `yoff`, cast to the band type."""
+    band = ds.GetRasterBand(1)
+    dtype = gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)
+    band.WriteArray(array.astype(dtype), 0, yoff)
+
+
+def build_overviews(ds, resampling='NEAREST', min_size=256):
+    """Build power of two overviews down to about min_size pixels."""
+    levels = []
+    level = 2
+    while max(ds.RasterXSize, ds.RasterYSize) // level >= min_size:
+        levels.append(level)
+        level *= 2
+    if levels:
+        ds.BuildOverviews(resampling, levels)
+    return levels
+
+
+def peak_rss():
+    """Peak resident set size of the current process, in MB, or None when
+    it cannot be measured."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on os x, kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return rss / 1024.0 / 1024.0
+    return rss / 1024.0
@@ -47,6 +47,25 @@ def error_handler(run_fn):
     return wrapped
 
 
+def show_table(parent, title, headers, rows):
+    """Show rows of values in a table, in a dialog kept by `parent` until
+    the next one."""
+    dialog = QtGui.QDialog(parent)
+    dialog.setWindowTitle(title)
+    table = QtGui.QTableWidget(len(rows), len(headers), dialog)
+    table.setHorizontalHeaderLabels(headers)
+    table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+    for i, row in enumerate(rows):
+        for j, value in enumerate(row):
+            table.setItem(i, j, QtGui.QTableWidgetItem(str(value)))
+    table.resizeColumnsToContents()
+    layout = QtGui.QVBoxLayout(dialog)
+    layout.addWidget(table)
+    dialog.resize(480, 320)
+    parent.table_dialog = dialog
+    dialog.show()
+
+
 class Task(QtCore.QObject):
     def __init__(self, parent, *args):
         self.parent = parent
@@ -134,6 +153,7 @@ class Worker(QtCore.QObject):
         QtCore.QObject.__init__(self)
         self.abort = False
         self.output = None
+        self.last_progress = None
 
     def setup(self, *args, **kwargs):
         pass
@@ -145,5 +165,14 @@ class Worker(QtCore.QObject):
         self.abort = True
 
     def calculate_progress(self, step, total_steps, offset, weight):
-        self.progress.emit(offset + step * weight / total_steps)
+        # only emit when the value changes, at most ~100 signals per run
+        value = offset + step * weight / total_steps
+        if value != self.last_progress:
+            self.last_progress = value
+            self.progress.emit(value)
+
+    def report_progress(self, fraction):
+        # progress callback of the pipeline functions: False stops them
+        self.calculate_progress(int(fraction * 100), 100, 0, 100)
+        return not self.abort
 
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Segment raster polygonization and rasterization
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+import glob
+import hashlib
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+from osgeo import gdal
+from osgeo import ogr
+from osgeo import osr
+
+import pools
+import tiles
+
+# output extension of each supported driver
+DRIVERS = {
+    'GPKG': '.gpkg',
+    'ESRI Shapefile': '.shp',
+}
+
+
+def vector_filename(raster_file, driver='GPKG'):
+    return os.path.splitext(raster_file)[0] + DRIVERS[driver]
+
+
+def vector_driver(filename):
+    """Supported driver of a vector file name, by its extension; a
+    ValueError for any other."""
+    ext = os.path.splitext(filename)[1].lower()
+    for driver, driver_ext in DRIVERS.items():
+        if ext == driver_ext:
+            return driver
+    raise ValueError('%s: unsupported vector format, use one of %s' % (
+                        filename, ', '.join(sorted(DRIVERS.values()))))
+
+
+def create_layer(filename, srs_wkt, driver='GPKG', max_id=0,
+                 fields=(), geom_type=ogr.wkbPolygon):
+    """Create a polygon layer whose first field, 'id', holds segment ids,
+    as the statistics and classification steps expect, followed by
+    `fields`, (name, ogr type) pairs."""
+    drv = ogr.GetDriverByName(driver)
+    if os.path.exists(filename):
+        drv.DeleteDataSource(filename)
+    ds = drv.CreateDataSource(filename)
+    srs = None
+    if srs_wkt:
+        srs = osr.SpatialReference()
+        srs.ImportFromWkt(srs_wkt)
+    name = os.path.splitext(os.path.basename(filename))[0]
+    layer = ds.CreateLayer(name, srs, geom_type)
+    field_type = max_id < 2**31 and ogr.OFTInteger or ogr.OFTInteger64
+    layer.CreateField(ogr.FieldDefn('id', field_type))
+    for field_name, field_type in fields:
+        layer.CreateField(ogr.FieldDefn(field_name, field_type))
+    return ds, layer
+
+
+class Batch(object):
+    """Groups layer writes in transactions of `size` features (when the
+    driver supports them)."""
+
+    def __init__(self, layer, size=10000):
+        self.layer = layer
+        self.size = size
+        self.pending = 0
+        self.enabled = bool(layer.TestCapability(ogr.OLCTransactions))
+        if self.enabled:
+            layer.StartTransaction()
+
+    def commit(self, restart=True):
+        if self.enabled:
+            self.layer.CommitTransaction()
+            if restart:
+                self.layer.StartTransaction()
+        self.pending = 0
+
+    def add(self, n=1):
+        self.pending += n
+        if self.pending >= self.size:
+            self.commit()
+
+    def close(self):
+        self.commit(restart=False)
+
+
+def polygonize(raster_file, filename, driver='GPKG', connectivity=4,
+               max_id=None, batch_rows=256, progress=None):
+    """Polygonize the first band of `raster_file` in a single streamed pass
+    of gdal.Polygonize, committing the output every `batch_rows` rows.
+
+    `progress(fraction)` is called as rows are processed; returning False
+    stops the process. `max_id`, if known, saves a pass over the raster to
+    pick the id field type. Returns the number of features written.
+    """
+    src_ds = gdal.Open(raster_file, gdal.GA_ReadOnly)
+    band = src_ds.GetRasterBand(1)
+    if max_id is None:
+        max_id = band.ComputeRasterMinMax(False)[1]
+    dst_ds, layer = create_layer(filename, src_ds.GetProjection(), driver,
+                                 max_id)
+    batch = Batch(layer, batch_rows)
+
+    def callback(complete, message, data):
+        # called once per row processed
+        batch.add()
+        if progress is not None and progress(complete) is False:
+            return 0
+        return 1
+
+    options = connectivity == 8 and ['8CONNECTED=8'] or []
+    gdal.Polygonize(band, None, layer, 0, options, callback=callback)
+    batch.close()
+    count = layer.GetFeatureCount()
+    dst_ds = None
+    return count
+
+
+def _polygonize_strip(args):
+    """Polygonize rows [yoff, yoff+ysize) of a raster, in a pool process.
+
+    Returns the (id, wkb) features found and the ids touching the strip
+    top or bottom rows, whose polygons may continue in the next strip.
+    """
+    raster_file, yoff, ysize, connectivity = args
+    src_ds = gdal.Open(raster_file, gdal.GA_ReadOnly)
+    data = src_ds.GetRasterBand(1).ReadAsArray(0, yoff, src_ds.RasterXSize,
+                                               ysize)
+    gt = list(src_ds.GetGeoTransform())
+    gt[0] += yoff * gt[2]
+    gt[3] += yoff * gt[5]
+    mem = gdal.GetDriverByName('MEM').Create('', data.shape[1], ysize, 1,
+                                             src_ds.GetRasterBand(1).DataType)
+    mem.SetGeoTransform(gt)
+    mem.GetRasterBand(1).WriteArray(data)
+    vds = ogr.GetDriverByName('Memory').CreateDataSource('')
+    layer = vds.CreateLayer('strip', None, ogr.wkbPolygon)
+    layer.CreateField(ogr.FieldDefn('id', ogr.OFTReal))
+    options = connectivity == 8 and ['8CONNECTED=8'] or []
+    gdal.Polygonize(mem.GetRasterBand(1), None, layer, 0, options)
+    features = [(int(f.GetField(0)), f.GetGeometryRef().ExportToWkb())
+                for f in layer]
+    seam_ids = set(np.unique(data[0]).tolist())
+    seam_ids.update(np.unique(data[-1]).tolist())
+    return features, seam_ids
+
+
+def polygonize_tiles(raster_file, filename, driver='GPKG', connectivity=4,
+                     max_id=None, rows=1024, workers=None, batch_size=10000,
+                     progress=None):
+    """Polygonize strips of `rows` rows in a process pool (see pools, in
+    this process when disabled).
+
+    Polygons touching a strip seam are kept aside and, once every strip is
+    done, merged with the parts sharing their id on the other side of the
+    seam. Everything else is written as soon as its strip is done, in
+    transactions of `batch_size` features. Returns the number of features
+    written.
+    """
+    src_ds = gdal.Open(raster_file, gdal.GA_ReadOnly)
+    n_rows = src_ds.RasterYSize
+    if max_id is None:
+        max_id = src_ds.GetRasterBand(1).ComputeRasterMinMax(False)[1]
+    dst_ds, layer = create_layer(filename, src_ds.GetProjection(), driver,
+                                 max_id)
+    src_ds = None
+    defn = layer.GetLayerDefn()
+    batch = Batch(layer, batch_size)
+
+    def write(segment_id, geom):
+        feat = ogr.Feature(defn)
+        feat.SetField(0, segment_id)
+        feat.SetGeometry(geom)
+        layer.CreateFeature(feat)
+        batch.add()
+
+    jobs = [(raster_file, yoff, ysize, connectivity)
+            for yoff, ysize, _, _ in tiles.strips(n_rows, rows)]
+    pool = pools.pool(workers or multiprocessing.cpu_count())
+    if pool is None:
+        strips = (_polygonize_strip(job) for job in jobs)
+    else:
+        strips = pool.imap(_polygonize_strip, jobs)
+    count = 0
+    seams = {}
+    try:
+        for step, (features, seam_ids) in enumerate(strips):
+            for segment_id, wkb in features:
+                if segment_id in seam_ids:
+                    seams.setdefault(segment_id, []).append(wkb)
+                else:
+                    write(segment_id, ogr.CreateGeometryFromWkb(wkb))
+                    count += 1
+            if progress is not None and \
+                    progress(float(step + 1) / len(jobs)) is False:
+                if pool is not None:
+                    pool.terminate()
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    # merge polygons split by the seams
+    for segment_id, parts in sorted(seams.items()):
+        geom = ogr.CreateGeometryFromWkb(parts[0])
+        for wkb in parts[1:]:
+            geom = geom.Union(ogr.CreateGeometryFromWkb(wkb))
+        write(segment_id, geom)
+        count += 1
+    batch.close()
+    dst_ds = None
+    return count
+
+
+def split_source(source):
+    """(file name, layer) of a QGIS OGR layer source, such as
+    'segments.gpkg|layername=segments'. layer is a name or an index."""
+    parts = source.split('|')
+    layer = 0
+    for part in parts[1:]:
+        key, _, value = part.partition('=')
+        if key == 'layername':
+            layer = value
+        elif key == 'layerid':
+            layer = int(value)
+    return parts[0], layer
+
+
+def source_mtime(vector_file):
+    """Last modification time of a vector file, including a pending sqlite
+    write-ahead log (GeoPackage edits), or None if it is not a file."""
+    files = [f for f in (vector_file, vector_file + '-wal')
+             if os.path.isfile(f)]
+    return files and max(os.path.getmtime(f) for f in files) or None
+
+
+def same_grid(ds, like):
+    return ((ds.RasterXSize, ds.RasterYSize) ==
+            (like.RasterXSize, like.RasterYSize) and
+            np.allclose(ds.GetGeoTransform(), like.GetGeoTransform()))
+
+
+def same_srs(wkt, srs):
+    """Whether a projection WKT and an OGR spatial reference (or None) are
+    the same, both missing included."""
+    if not wkt or srs is None:
+        return not wkt and srs is None
+    other = osr.SpatialReference()
+    other.ImportFromWkt(wkt)
+    return bool(other.IsSame(srs))
+
+
+def matches_layer(ds, vector_file, layer=0):
+    """Whether raster dataset `ds` has the projection of a vector layer and
+    the same extent, within a pixel, as its polygonization gives."""
+    vds = ogr.Open(vector_file)
+    lyr = vds and vds.GetLayer(layer)
+    if lyr is None or not lyr.GetFeatureCount() or \
+            not same_srs(ds.GetProjection(), lyr.GetSpatialRef()):
+        return False
+    gt = ds.GetGeoTransform()
+    xs = sorted([gt[0], gt[0] + ds.RasterXSize * gt[1]])
+    ys = sorted([gt[3], gt[3] + ds.RasterYSize * gt[5]])
+    tolerance = max(abs(gt[1]), abs(gt[5]))
+    extent = lyr.GetExtent()
+    return np.allclose(extent, xs + ys, rtol=0, atol=tolerance)
+
+
+def sibling_raster(vector_file, like=None, layer=0):
+    """Label raster the segmentation wrote next to `vector_file`, if the
+    polygons were not modified after it (see sync_mtime), it matches their
+    `layer` (see matches_layer) and it is on the grid of dataset `like`
+    (when given); None otherwise."""
+    filename = os.path.splitext(vector_file)[0] + '.tif'
+    mtime = source_mtime(vector_file)
+    if mtime is None or not os.path.isfile(filename) or \
+            os.path.getmtime(filename) < mtime:
+        return None
+    ds = gdal.Open(filename, gdal.GA_ReadOnly)
+    if ds is None or not matches_layer(ds, vector_file, layer):
+        return None
+    if like is not None and not same_grid(ds, like):
+        return None
+    return filename
+
+
+def sync_mtime(raster_file, vector_file):
+    """Mark a label raster as up to date with its polygons, after writes
+    that do not move them (polygonization, attribute updates)."""
+    mtime = max(source_mtime(vector_file), os.path.getmtime(raster_file))
+    os.utime(raster_file, (mtime, mtime))
+
+
+def cache_filename(vector_file, layer, like, cache_dir=None):
+    """Cache file of the rasterization of a vector layer on the grid of
+    dataset `like`, keyed by the vector file, its modification time and the
+    grid, or None if the layer is not file based. Files of the same layer
+    share a prefix (see clear_cache)."""
+    mtime = source_mtime(vector_file)
+    if mtime is None:
+        return None
+    source = [os.path.abspath(vector_file), layer]
+    key = [mtime, like.RasterXSize, like.RasterYSize, like.GetGeoTransform(),
+           like.GetProjection()]
+    prefix = hashlib.md5(repr(source).encode('utf-8')).hexdigest()[:16]
+    digest = hashlib.md5(repr(source + key).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir or tempfile.gettempdir(),
+                        'segments_%s_%s.tif' % (prefix, digest))
+
+
+def clear_cache(filename):
+    """Remove the other cache files of the layer of cache file `filename`,
+    left by earlier versions of it or other grids, so there is at most one
+    per layer."""
+    folder, name = os.path.split(filename)
+    prefix = name.rsplit('_', 1)[0]
+    for other in glob.glob(os.path.join(folder, prefix + '_*')):
+        if other != filename:
+            try:
+                os.remove(other)
+            except OSError:
+                # in use by another run
+                pass
+
+
+def rasterize(vector_file, layer, like, filename=''):
+    """Burn the first field (segment ids) of a vector layer on the grid of
+    dataset `like`, with the smallest integer type holding the largest id;
+    pixels outside any polygon are 0.
+
+    Written to a GTiff `filename` or, when empty, kept in memory. Returns
+    the dataset.
+    """
+    vds = ogr.Open(vector_file)
+    lyr = vds.GetLayer(layer)
+    field = lyr.GetLayerDefn().GetFieldDefn(0).GetName()
+    sql = vds.ExecuteSQL('SELECT MAX("%s") FROM "%s"' % (field, lyr.GetName()))
+    max_id = sql.GetNextFeature().GetField(0) or 0
+    vds.ReleaseResultSet(sql)
+    if filename:
+        ds = tiles.create_raster(filename, like, max_id)
+    else:
+        gdal_type = tiles.raster_type(max_id)[0]
+        ds = gdal.GetDriverByName('MEM').Create('', like.RasterXSize,
+                                                like.RasterYSize, 1, gdal_type)
+        ds.SetGeoTransform(like.GetGeoTransform())
+        ds.SetProjection(like.GetProjection())
+    band = ds.GetRasterBand(1)
+    band.Fill(0)
+    band.SetNoDataValue(0)
+    err = gdal.RasterizeLayer(ds, [1], lyr, options=['ATTRIBUTE=%s' % field])
+    if err:
+        raise Exception("error rasterizing segments layer: %s" % err)
+    ds.FlushCache()
+    return ds
+
+
+def reproject(wkbs, src_wkt, dst_wkt):
+    """Geometries given as WKB, from one projection to another; as given
+    when either is unknown or they are the same."""
+    if not src_wkt or not dst_wkt:
+        return wkbs
+    src = osr.SpatialReference()
+    src.ImportFromWkt(src_wkt)
+    dst = osr.SpatialReference()
+    dst.ImportFromWkt(dst_wkt)
+    if src.IsSame(dst):
+        return wkbs
+    if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+        # x, y order with gdal 3 too
+        src.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        dst.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transform = osr.CoordinateTransformation(src, dst)
+    out = []
+    for wkb in wkbs:
+        geom = ogr.CreateGeometryFromWkb(wkb)
+        geom.Transform(transform)
+        out.append(geom.ExportToWkb())
+    return out
+
+
+def burn_layer(wkbs, srs_wkt=''):
+    """In memory (datasource, layer) of polygons given as WKB, with their
+    position 1..n in field 'burn', ready for gdal.RasterizeLayer."""
+    ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+    srs = None
+    if srs_wkt:
+        srs = osr.SpatialReference()
+        srs.ImportFromWkt(srs_wkt)
+    layer = ds.CreateLayer('burn', srs, ogr.wkbUnknown)
+    layer.CreateField(ogr.FieldDefn('burn', ogr.OFTInteger))
+    defn = layer.GetLayerDefn()
+    for value, wkb in enumerate(wkbs, 1):
+        feat = ogr.Feature(defn)
+        feat.SetField(0, value)
+        feat.SetGeometry(ogr.CreateGeometryFromWkb(wkb))
+        layer.CreateFeature(feat)
+    return ds, layer
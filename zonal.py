@@ -0,0 +1,732 @@
+# -*- coding: utf-8 -*-
+
+#***********************************************************************
+#
+# Image Analysis
+# ----------------------------------------------------------------------
+# Zonal statistics of raster values grouped by segment id
+#
+# Vitor Hirota (vitor.hirota [at] gmail.com), INPE 2013
+#
+# This source is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This code is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# A copy of the GNU General Public License is available on the World
+# Wide Web at <http://www.gnu.org/copyleft/gpl.html>. You can also
+# obtain it by writing to the Free Software Foundation, Inc., 59 Temple
+# Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+#***********************************************************************
+
+# This module must not import PyQt4 or qgis.
+
+import time
+
+import numpy as np
+from osgeo import gdal
+
+import pools
+import tiles
+
+# field suffixes, in order, of the statistics of each band. 'var' holds
+# the standard deviation, as it always did.
+FIELDS = ['avg', 'mdn', 'var']
+
+# feature families, in field order. All but 'shape' are computed per band.
+FAMILIES = ['basic', 'range', 'percentiles', 'texture', 'shape']
+DEFAULT_FAMILIES = ['basic']
+PERCENTILES = [10, 25, 75, 90]
+BAND_FIELDS = {
+    'basic': FIELDS,
+    'range': ['min', 'max'],
+    'percentiles': ['p%s' % q for q in PERCENTILES],
+    # contrast, dissimilarity and homogeneity of the grey level
+    # co-occurrence of horizontal and vertical neighbours
+    'texture': ['con', 'dis', 'hom'],
+}
+# pixel count, area, perimeter (map units) and compactness, 4*pi*A/P**2
+SHAPE_FIELDS = ['count', 'area', 'perim', 'compact']
+# families whose features come from the value histogram of each zone
+SORTED = set(['basic', 'range', 'percentiles'])
+# zones with more valid pixels than this (in a block) get approximate
+# quantiles when an error bound is set
+EXACT_PIXELS = 4096
+# timings reported, in order: building and merging the histograms, then
+# the rest of each family
+TIMINGS = ['sort', 'merge'] + FAMILIES
+
+
+def field_names(n_bands, families=DEFAULT_FAMILIES):
+    band_fields = [f for family in FAMILIES if family in families
+                   for f in BAND_FIELDS.get(family, [])]
+    names = ['%s_%s' % (b+1, f) for b in range(n_bands) for f in band_fields]
+    if 'shape' in families:
+        names += SHAPE_FIELDS
+    return names
+
+
+def timing_report(timings):
+    return ', '.join('%s %.2fs' % (name, timings[name]) for name in TIMINGS
+                     if name in timings)
+
+
+def valid_mask(values, zones):
+    """Pixels inside a segment (id > 0) with a positive value on every band;
+    the others were never taken into account."""
+    return (zones > 0) & np.all(values > 0, axis=1)
+
+
+def valid_pixels(values, zones):
+    """Drop pixels outside any segment (id 0) or with a non-positive value
+    on any band, which the statistics never took into account."""
+    valid = valid_mask(values, zones)
+    return values[valid], zones[valid]
+
+
+def group_starts(counts):
+    return np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+
+def histogram(zones, values, counts=None):
+    """Sparse histogram of `values` per zone: (zones, values, counts) of
+    every distinct pair, sorted by zone then value. Given `counts`, the
+    input is itself a histogram, e.g. the concatenation of several, and
+    repeated pairs are summed."""
+    if values.dtype.kind in 'iu' and len(values):
+        # integer bands: a single sort of zone * span + value, much faster
+        # than a lexsort
+        low = int(values.min())
+        span = int(values.max()) - low + 1
+        if (int(zones.max()) + 1) * span < 2**62:
+            keys = zones.astype(np.int64) * span + (values - low)
+            if counts is None:
+                keys.sort()
+            else:
+                # merged histograms are concatenations of sorted runs
+                order = keys.argsort(kind='mergesort')
+                keys = keys[order]
+                counts = counts[order]
+            starts = _runs(keys)
+            zones = keys[starts] // span
+            values = (keys[starts] % span + low).astype(values.dtype)
+            return zones, values, _run_counts(starts, len(keys), counts)
+    order = np.lexsort((values, zones))
+    zones = zones[order]
+    values = values[order]
+    if counts is not None:
+        counts = counts[order]
+    starts = _runs(zones, values)
+    return (zones[starts], values[starts],
+            _run_counts(starts, len(zones), counts))
+
+
+def _runs(*keys):
+    """Start of every run of equal items of sorted arrays."""
+    if not len(keys[0]):
+        return np.zeros(0, dtype=np.int64)
+    new = np.zeros(len(keys[0]), dtype=bool)
+    new[0] = True
+    for k in keys:
+        new[1:] |= k[1:] != k[:-1]
+    return np.flatnonzero(new)
+
+
+def _run_counts(starts, n, counts=None):
+    if counts is None:
+        return np.diff(np.append(starts, n))
+    if not len(starts):
+        return counts[:0]
+    return np.add.reduceat(counts, starts)
+
+
+def histogram_quantiles(hist, counts, quantiles):
+    """Quantiles (in percent, interpolated as numpy.percentile does) of
+    every zone from its histogram, given the pixel count of each zone.
+    Returns an array of shape (len(counts), len(quantiles)), NaN for empty
+    zones. Quantiles 0 and 100 are the range."""
+    values, bins = hist[1], np.cumsum(hist[2])
+    out = np.full((len(counts), len(quantiles)), np.nan)
+    has = counts > 0
+    starts = group_starts(counts)[has]
+    last = counts[has] - 1
+    for k, q in enumerate(quantiles):
+        pos = last * (q / 100.0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        # value of the bin holding each rank
+        a = values[np.searchsorted(bins, starts + lo, side='right')]
+        b = values[np.searchsorted(bins, starts + hi, side='right')]
+        a = a.astype(np.float64)
+        out[has, k] = a + (b - a) * (pos - lo)
+    return out
+
+
+def group_medians(values, zones, counts):
+    """Median of `values` per zone, given the pixel count of each zone."""
+    hist = histogram(zones, values)
+    return histogram_quantiles(hist, counts, [50])[:, 0]
+
+
+def coarsen(values, zones, counts, error, exact=EXACT_PIXELS):
+    """Round the values of zones with more than `exact` pixels to the centre
+    of bins of width 2*error, so their histograms have a bounded number of
+    bins and their quantiles are off by at most `error`."""
+    large = counts[zones] > exact
+    if error <= 0 or not large.any():
+        return values
+    if values.dtype.kind in 'iu':
+        # integer centres keep the fast integer sort
+        width = int(2 * error)
+        if width <= 1:
+            return values
+        out = values.astype(np.int64)
+        out[large] = out[large] // width * width + width // 2
+        return out
+    width = 2.0 * error
+    out = values.astype(np.float64)
+    out[large] = (np.floor(out[large] / width) + 0.5) * width
+    return out
+
+
+def quantize(band, levels, low, high):
+    """Map band values in [low, high] to grey levels 0..levels-1."""
+    scale = levels / max(float(high) - low, 1e-12)
+    q = ((band - low) * scale).astype(np.int64)
+    return np.clip(q, 0, levels - 1)
+
+
+def neighbour_pairs(grid, rows=None):
+    """Horizontal and vertical neighbour pairs (a, b) of a 2d array, with a
+    in its first `rows` rows (all by default)."""
+    rows = rows or grid.shape[0]
+    return [(grid[:rows, :-1], grid[:rows, 1:]),
+            (grid[:-1][:rows], grid[1:][:rows])]
+
+
+def texture_sums(levels, zones, valid, length, rows=None):
+    """Per zone sums over the pairs of valid neighbours within the zone:
+    columns are the pair count and the sums of (i-j)**2, |i-j| and
+    1/(1+(i-j)**2), where i, j are the pair grey levels (2d arrays).
+
+    Only pairs starting on the first `rows` rows are counted, so a block
+    may carry one halo row of the next block."""
+    sums = np.zeros((length, 4))
+    for (la, lb), (za, zb), (va, vb) in zip(neighbour_pairs(levels, rows),
+                                            neighbour_pairs(zones, rows),
+                                            neighbour_pairs(valid, rows)):
+        same = (za == zb) & va & vb
+        z = za[same]
+        d = (la[same] - lb[same]).astype(np.float64)
+        sq = d * d
+        sums[:, 0] += np.bincount(z, minlength=length)
+        sums[:, 1] += np.bincount(z, weights=sq, minlength=length)
+        sums[:, 2] += np.bincount(z, weights=np.abs(d), minlength=length)
+        sums[:, 3] += np.bincount(z, weights=1 / (1 + sq), minlength=length)
+    return sums
+
+
+def texture_features(sums):
+    """(contrast, dissimilarity, homogeneity) from texture_sums."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums[:, 1:] / sums[:, :1]
+
+
+def shape_sums(zones, pixel_size, length, rows=None, first=True):
+    """Per zone pixel count and perimeter, in map units, of a 2d array of
+    zones; the image border counts as perimeter.
+
+    As in texture_sums, a block of `rows` rows may carry one halo row of
+    the next block; without it, the block ends at the image bottom. `first`
+    tells the block starts at the image top."""
+    width, height = pixel_size
+    rows = rows or zones.shape[0]
+    outside = np.zeros((1, zones.shape[1]), dtype=zones.dtype)
+    parts = [zones]
+    if first:
+        parts.insert(0, outside)
+    if zones.shape[0] == rows:
+        parts.append(outside)
+    padded = np.pad(np.vstack(parts), ((0, 0), (1, 1)), mode='constant')
+    top = first and 1 or 0
+    counts = np.bincount(zones[:rows].ravel(), minlength=length)
+    perimeter = np.zeros(length)
+    # vertical edges between horizontal neighbours and the other way around
+    pairs = neighbour_pairs(padded[top:], rows)[:1] + \
+        neighbour_pairs(padded, rows + top)[1:]
+    for (a, b), edge in zip(pairs, (height, width)):
+        border = a != b
+        perimeter += np.bincount(a[border], minlength=length) * edge
+        perimeter += np.bincount(b[border], minlength=length) * edge
+    return counts, perimeter
+
+
+def shape_features(counts, perimeter, pixel_size):
+    """Columns of SHAPE_FIELDS from shape_sums, NaN for empty zones."""
+    area = counts * float(pixel_size[0] * pixel_size[1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        compact = 4 * np.pi * area / perimeter ** 2
+    table = np.column_stack([counts, area, perimeter, compact])
+    table[counts == 0] = np.nan
+    return table
+
+
+def value_ranges(values, zones):
+    """(bands, 2) min and max of the valid pixels of every band, NaN if
+    there is none."""
+    values = valid_pixels(values, zones)[0]
+    if not len(values):
+        return np.full((values.shape[1], 2), np.nan)
+    return np.column_stack([values.min(axis=0), values.max(axis=0)])
+
+
+def partial_features(values, zones, families, shape, rows=None, first=True,
+                     pixel_size=(1.0, 1.0), levels=32, ranges=None,
+                     error=0.0, exact=EXACT_PIXELS):
+    """Mergeable aggregates of the zonal features over a block of pixels.
+
+    values: (pixels, bands) array and zones: (pixels,) segment ids, on a
+    grid of `shape` (rows, cols). Only the first `rows` rows are aggregated;
+    a further row is a halo for the neighbour pairs with the next block
+    (see shape_sums). `ranges` are the (bands, 2) value ranges quantized
+    for the texture, from the valid pixels of the block by default. With
+    an `error` bound, the histograms of zones with more than `exact` pixels
+    are coarsened (see coarsen).
+
+    Returns a dict of arrays indexed by segment id (see merge_partials):
+    valid pixel 'counts', per band 'sum' and 'm2' (sum of squared
+    deviations) for the mean and deviation, per band 'hist' histograms for
+    the median, range and percentiles, 'texture' and 'shape' sums, and the
+    seconds spent per family in 'timings'.
+    """
+    unknown = set(families) - set(FAMILIES)
+    if unknown:
+        raise ValueError('unknown feature families: %s' % sorted(unknown))
+    timings = {}
+    clock = [time.time()]
+
+    def lap(name):
+        now = time.time()
+        timings[name] = timings.get(name, 0.0) + now - clock[0]
+        clock[0] = now
+
+    rows = rows or shape[0]
+    length = len(zones) and int(zones.max()) + 1 or 1
+    n_bands = values.shape[1]
+    own = rows * shape[1]
+    # the halo row only takes part in the neighbour pairs
+    paired = valid_mask(values, zones)
+    valid = paired.copy()
+    valid[own:] = False
+    valid_zones = zones[valid]
+    counts = np.bincount(valid_zones, minlength=length)
+    partial = {'counts': counts, 'timings': timings}
+    if set(families) & SORTED:
+        partial['hist'] = []
+    if 'basic' in families:
+        partial['sum'] = np.zeros((n_bands, length))
+        partial['m2'] = np.zeros((n_bands, length))
+    if 'texture' in families:
+        partial['texture'] = np.zeros((n_bands, length, 4))
+        if ranges is None:
+            ranges = value_ranges(values[:own], zones[:own])
+    lap('basic')
+    for b in range(n_bands):
+        band = values[valid, b]
+        if 'hist' in partial:
+            partial['hist'].append(histogram(
+                valid_zones, coarsen(band, valid_zones, counts, error, exact)))
+            lap('sort')
+        if 'basic' in families:
+            fband = band.astype(np.float64)
+            total = np.bincount(valid_zones, weights=fband, minlength=length)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total / counts
+            dev = (fband - mean[valid_zones]) ** 2
+            partial['sum'][b] = total
+            partial['m2'][b] = np.bincount(valid_zones, weights=dev,
+                                           minlength=length)
+            lap('basic')
+        if 'texture' in families:
+            low, high = ranges[b]
+            grey = np.zeros(len(zones), dtype=np.int64)
+            if not np.isnan(low):
+                grey[paired] = quantize(values[paired, b], levels, low, high)
+            partial['texture'][b] = texture_sums(grey.reshape(shape),
+                                                 zones.reshape(shape),
+                                                 paired.reshape(shape),
+                                                 length, rows)
+            lap('texture')
+    if 'shape' in families:
+        partial['shape'] = shape_sums(zones.reshape(shape), pixel_size,
+                                      length, rows, first)
+        lap('shape')
+    return partial
+
+
+def _pad(a, length, axis=-1):
+    """Zero pad an axis of `a` to `length` items."""
+    missing = length - a.shape[axis]
+    if not missing:
+        return a
+    width = [(0, 0)] * a.ndim
+    width[axis] = (0, missing)
+    return np.pad(a, width, mode='constant')
+
+
+def _histograms(hist):
+    """List of the histograms of a block or of merged blocks."""
+    return isinstance(hist, list) and hist or [hist]
+
+
+def merge_histograms(hists):
+    """Single histogram out of several, summing the counts of common bins."""
+    if len(hists) == 1:
+        return hists[0]
+    return histogram(*[np.concatenate(parts) for parts in zip(*hists)])
+
+
+def _collapse(hists):
+    """Merge a list of histograms down to a few: largest first, the last
+    two are merged while the last is at least half the size of the one
+    before. Each bin is thus merged again only a logarithmic number of
+    times, and the list stays as short."""
+    hists = sorted(hists, key=lambda h: -len(h[0]))
+    while len(hists) > 1 and 2 * len(hists[-1][0]) >= len(hists[-2][0]):
+        last = hists.pop()
+        hists[-1] = merge_histograms([hists[-1], last])
+        hists.sort(key=lambda h: -len(h[0]))
+    return hists
+
+
+def merge_partials(a, b):
+    """Combine the aggregates of two blocks, exactly: counts and sums add
+    up, histograms are merged bin by bin and deviations are combined with
+    the pairwise update of Chan et al."""
+    start = time.time()
+    length = max(len(a['counts']), len(b['counts']))
+    na = _pad(a['counts'], length)
+    nb = _pad(b['counts'], length)
+    merged = {'counts': na + nb}
+    if 'sum' in a:
+        sa, sb = _pad(a['sum'], length), _pad(b['sum'], length)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = np.nan_to_num(sb / nb - sa / na)
+            weight = np.nan_to_num(na * nb / (na + nb).astype(np.float64))
+        merged['sum'] = sa + sb
+        merged['m2'] = (_pad(a['m2'], length) + _pad(b['m2'], length) +
+                        delta ** 2 * weight)
+    if 'hist' in a:
+        # bins of common values add up as strips are merged, instead of
+        # piling up until finalize_features
+        merged['hist'] = [_collapse(_histograms(ha) + _histograms(hb))
+                          for ha, hb in zip(a['hist'], b['hist'])]
+    if 'texture' in a:
+        merged['texture'] = (_pad(a['texture'], length, 1) +
+                             _pad(b['texture'], length, 1))
+    if 'shape' in a:
+        merged['shape'] = tuple(_pad(x, length) + _pad(y, length)
+                                for x, y in zip(a['shape'], b['shape']))
+    timings = dict(a['timings'])
+    for name, seconds in b['timings'].items():
+        timings[name] = timings.get(name, 0.0) + seconds
+    timings['merge'] = timings.get('merge', 0.0) + time.time() - start
+    merged['timings'] = timings
+    return merged
+
+
+def finalize_features(partial, n_bands, families, pixel_size=(1.0, 1.0),
+                      n_zones=None):
+    """(counts, table) of zonal_features from merged aggregates."""
+    timings = partial['timings']
+    clock = [time.time()]
+
+    def lap(name):
+        now = time.time()
+        timings[name] = timings.get(name, 0.0) + now - clock[0]
+        clock[0] = now
+
+    length = max(len(partial['counts']), (n_zones or 0) + 1)
+    counts = _pad(partial['counts'], length)
+    columns = {}
+    for b in range(n_bands):
+        prefix = '%s_' % (b+1)
+        hist = None
+        if 'hist' in partial:
+            hist = merge_histograms(_histograms(partial['hist'][b]))
+            lap('merge')
+        if 'basic' in families:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                columns[prefix + 'avg'] = _pad(partial['sum'][b],
+                                               length) / counts
+                columns[prefix + 'var'] = np.sqrt(_pad(partial['m2'][b],
+                                                       length) / counts)
+            median = histogram_quantiles(hist, counts, [50])[:, 0]
+            columns[prefix + 'mdn'] = median
+            lap('basic')
+        if 'range' in families:
+            table = histogram_quantiles(hist, counts, [0, 100])
+            columns[prefix + 'min'], columns[prefix + 'max'] = table.T
+            lap('range')
+        if 'percentiles' in families:
+            table = histogram_quantiles(hist, counts, PERCENTILES)
+            for name, column in zip(BAND_FIELDS['percentiles'], table.T):
+                columns[prefix + name] = column
+            lap('percentiles')
+        if 'texture' in families:
+            sums = _pad(partial['texture'][b], length, 0)
+            for name, column in zip(BAND_FIELDS['texture'],
+                                    texture_features(sums).T):
+                columns[prefix + name] = column
+            lap('texture')
+    if 'shape' in families:
+        pixels, perimeter = [_pad(x, length) for x in partial['shape']]
+        table = shape_features(pixels, perimeter, pixel_size)
+        for name, column in zip(SHAPE_FIELDS, table.T):
+            columns[name] = column
+        lap('shape')
+    names = field_names(n_bands, families)
+    table = np.column_stack([columns[name] for name in names])
+    table[0] = np.nan
+    return counts, table
+
+
+def zonal_features(values, zones, n_zones, families=DEFAULT_FAMILIES,
+                   shape=None, pixel_size=(1.0, 1.0), levels=32,
+                   timings=None, error=0.0, exact=EXACT_PIXELS, ranges=None):
+    """Features of every zone, for any number of bands, in a single pass.
+
+    values: (pixels, bands) array; zones: (pixels,) segment ids in
+    [0, n_zones]. families: any of FAMILIES; pixels are sorted once per
+    band into zone histograms for the median, range and percentiles, the
+    rest are bincount sums. 'texture' and 'shape' need the grid `shape`
+    (rows, cols) of the pixels and the `pixel_size` (width, height); bands
+    are quantized to `levels` grey levels for the texture, over their
+    valid value `ranges` (see value_ranges).
+
+    Median, range and percentiles are exact unless `error` is set: zones
+    with more than `exact` pixels then get them within `error`, with a
+    bounded histogram (see coarsen).
+
+    Returns (counts, table), counts being the valid pixels per zone and
+    table of shape (n_zones+1, len(field_names(bands, families))), indexed
+    by segment id, NaN where a feature is undefined. If given, the dict
+    `timings` is updated with the seconds spent on each of TIMINGS.
+    """
+    spatial = 'texture' in families or 'shape' in families
+    if spatial and shape is None:
+        raise ValueError('texture and shape features need the grid shape')
+    partial = partial_features(values, zones, families,
+                               shape or (len(zones), 1),
+                               pixel_size=pixel_size, levels=levels,
+                               ranges=ranges, error=error, exact=exact)
+    result = finalize_features(partial, values.shape[1], families,
+                               pixel_size, n_zones)
+    if timings is not None:
+        timings.update(partial['timings'])
+    return result
+
+
+def zonal_stats(values, zones, n_zones):
+    """Mean, median and standard deviation of every band per zone.
+
+    values: (pixels, bands) array; zones: (pixels,) segment ids in
+    [0, n_zones]. Pixels are grouped once, with bincount sums for the mean
+    and (two pass) deviation and a single sort per band for the median.
+
+    Returns (counts, stats), with counts of shape (n_zones+1,) and stats of
+    shape (n_zones+1, bands, len(FIELDS)), indexed by segment id; empty
+    segments get NaN.
+    """
+    counts, table = zonal_features(values, zones, n_zones, ['basic'])
+    return counts, table.reshape(n_zones + 1, values.shape[1], len(FIELDS))
+
+
+def _read_block(image_file, labels_file, yoff, ysize, halo):
+    """(values, zones, shape) of rows [yoff, yoff+ysize), plus `halo` rows
+    below when the image has them."""
+    img_ds = gdal.Open(image_file, gdal.GA_ReadOnly)
+    seg_ds = gdal.Open(labels_file, gdal.GA_ReadOnly)
+    ysize = min(ysize + halo, img_ds.RasterYSize - yoff)
+    values = tiles.read_pixels(img_ds, yoff, ysize, dtype=None)
+    zones = seg_ds.GetRasterBand(1).ReadAsArray(0, yoff, seg_ds.RasterXSize,
+                                                ysize)
+    if zones.dtype.kind not in 'iu':
+        # ids beyond 2**32 come as Float64
+        zones = zones.astype(np.int64)
+    return values, zones.ravel(), zones.shape
+
+
+def _block_ranges(args):
+    image_file, labels_file, yoff, ysize = args
+    values, zones, _ = _read_block(image_file, labels_file, yoff, ysize, 0)
+    return value_ranges(values, zones)
+
+
+def _block_features(args):
+    (image_file, labels_file, yoff, ysize, families, pixel_size, levels,
+     ranges, error, exact) = args
+    spatial = 'texture' in families or 'shape' in families
+    values, zones, shape = _read_block(image_file, labels_file, yoff, ysize,
+                                       spatial and 1 or 0)
+    return partial_features(values, zones, families, shape, ysize, yoff == 0,
+                            pixel_size, levels, ranges, error, exact)
+
+
+def _imap(pool, fn, jobs):
+    """Results of fn over jobs as they are done, in this process without a
+    pool."""
+    if pool is None:
+        return (fn(job) for job in jobs)
+    return pool.imap_unordered(fn, jobs)
+
+
+def _windows(image_file, rows):
+    ds = gdal.Open(image_file, gdal.GA_ReadOnly)
+    return [(yoff, ysize) for yoff, ysize, _, _ in
+            tiles.strips(ds.RasterYSize, rows)]
+
+
+def tiled_ranges(image_file, labels_file, rows=1024, workers=1,
+                 progress=None):
+    """value_ranges of an image over a label raster on the same grid, read
+    by strips as in tiled_features. Returns None if stopped."""
+    jobs = [(image_file, labels_file, yoff, ysize)
+            for yoff, ysize in _windows(image_file, rows)]
+    pool = pools.pool(workers, threads=True)
+    ranges = None
+    try:
+        for step, block in enumerate(_imap(pool, _block_ranges, jobs)):
+            ranges = block if ranges is None else np.column_stack([
+                np.fmin(ranges[:, 0], block[:, 0]),
+                np.fmax(ranges[:, 1], block[:, 1])])
+            if progress is not None and \
+                    progress(float(step + 1) / len(jobs)) is False:
+                return None
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return ranges
+
+
+def tiled_features(image_file, labels_file, families=DEFAULT_FAMILIES,
+                   pixel_size=(1.0, 1.0), levels=32, rows=1024, workers=1,
+                   progress=None, timings=None, error=0.0,
+                   exact=EXACT_PIXELS, ranges=None):
+    """zonal_features of an image and a label raster on the same grid,
+    read by strips of `rows` rows.
+
+    Memory holds a strip per worker and the sums of every segment, plus,
+    for the median, range and percentiles, a (zone, value, count) bin per
+    distinct value of each segment and band: up to 24 bytes per pixel and
+    band with exact quantiles on 16 bit or floating point images, where
+    values rarely repeat, and up to twice that while the last histograms
+    are merged. 8 bit images repeat values, and an `error` bound limits
+    the bins of large segments (see coarsen).
+
+    Strips are aggregated in a pool of `workers` processes, or threads
+    inside QGIS (GDAL reads and numpy sorts release the GIL, see pools), in
+    this thread when 1, and merged as they are done, so segments spanning
+    several strips get exactly the same features. The texture `ranges` take
+    a first pass over the strips when not given. `progress(fraction)` is
+    called after each strip; returning False stops and returns None.
+    """
+    ds = gdal.Open(image_file, gdal.GA_ReadOnly)
+    n_bands = ds.RasterCount
+    ds = None
+    windows = _windows(image_file, rows)
+    share = 1.0
+    if 'texture' in families and ranges is None:
+        # grey levels span the valid values of the whole image
+        share = 0.5
+        scaled = progress and (lambda fraction: progress(fraction * share))
+        ranges = tiled_ranges(image_file, labels_file, rows, workers, scaled)
+        if ranges is None:
+            return None
+    jobs = [(image_file, labels_file, yoff, ysize, families, pixel_size,
+             levels, ranges, error, exact) for yoff, ysize in windows]
+    pool = pools.pool(workers, threads=True)
+    partial = None
+    try:
+        for step, block in enumerate(_imap(pool, _block_features, jobs)):
+            partial = block if partial is None else \
+                merge_partials(partial, block)
+            fraction = 1 - share + share * (step + 1) / len(jobs)
+            if progress is not None and progress(fraction) is False:
+                return None
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    result = finalize_features(partial, n_bands, families, pixel_size)
+    if timings is not None:
+        timings.update(partial['timings'])
+    return result
+
+
+def burn_counts(labels_file, layer, rows=1024, progress=None):
+    """Pixel count of every zone of a label raster, and the histogram
+    (zones, values, counts) of OGR `layer` rasterized on its grid, over the
+    pixels it covers. `layer` burns its integer field 'burn' (see
+    vectorize.burn_layer); both are read by strips of `rows` rows.
+    `progress(fraction)` is called after each strip; returning False stops
+    and returns None."""
+    ds = gdal.Open(labels_file, gdal.GA_ReadOnly)
+    band = ds.GetRasterBand(1)
+    cols = ds.RasterXSize
+    gdal_type = tiles.raster_type(layer.GetFeatureCount())[0]
+    sizes = np.zeros(1, dtype=np.int64)
+    hists = []
+    windows = list(tiles.strips(ds.RasterYSize, rows))
+    for step, (yoff, ysize, _, _) in enumerate(windows):
+        zones = band.ReadAsArray(0, yoff, cols, ysize).ravel()
+        if zones.dtype.kind not in 'iu':
+            zones = zones.astype(np.int64)
+        grid = tiles.window_grid(ds, 0, yoff, cols, ysize, gdal_type)
+        gdal.RasterizeLayer(grid, [1], layer, options=['ATTRIBUTE=burn'])
+        values = grid.ReadAsArray().ravel()
+        strip_sizes = np.bincount(zones)
+        length = max(len(sizes), len(strip_sizes))
+        sizes = _pad(sizes, length) + _pad(strip_sizes, length)
+        covered = (values > 0) & (zones > 0)
+        if covered.any():
+            hists.append(histogram(zones[covered], values[covered]))
+        if progress is not None and \
+                progress(float(step + 1) / len(windows)) is False:
+            return None
+    if not hists:
+        empty = np.zeros(0, dtype=np.int64)
+        return sizes, (empty, empty, empty)
+    return sizes, merge_histograms(hists)
+
+
+def zone_majority(hist, sizes, lut=None, majority=0.5, overlap=0.0):
+    """Majority value of every zone from its histogram (see burn_counts),
+    with values mapped through `lut` first, if given.
+
+    Only zones where the majority value holds at least `majority` of the
+    covered pixels, and the covered pixels at least `overlap` of the zone,
+    are kept. Ties go to the smallest value. Returns the zones, their
+    majority value, its share and the covered fraction of each zone.
+    """
+    zones, values, counts = hist
+    if lut is not None and len(values):
+        zones, values, counts = histogram(zones, lut[values], counts)
+    if not len(zones):
+        return zones, values, np.zeros(0), np.zeros(0)
+    order = np.lexsort((values, -counts, zones))
+    zones, values, counts = zones[order], values[order], counts[order]
+    starts = _runs(zones)
+    covered = np.add.reduceat(counts, starts).astype(np.float64)
+    zones, values = zones[starts], values[starts]
+    share = counts[starts] / covered
+    cover = covered / sizes[zones]
+    keep = (share >= majority) & (cover >= overlap)
+    return zones[keep], values[keep], share[keep], cover[keep]